@@ -8,7 +8,7 @@ from datetime import datetime
 from tqdm import tqdm
 from scipy import signal
 from modules.brams_wav_2 import BramsWavFile
-from modules.psd.psd import SSB_noise
+from modules.psd.psd import SSB_noise, find_stable_ridge
 
 
 default_dir = 'recordings/'
@@ -99,28 +99,14 @@ def find_calibrator(
     fmin=1350,
     fmax=1650
 ):
-    same_index = 0
-    previous_index = 0
-    index = 0
-    min_row = round(fmin / frequency_resolution)
-    max_row = round(fmax / frequency_resolution)
-
-    # print(f'Searching direct signal between {fmin} Hz and {fmax} Hz...')
-
-    while not same_index == 50 and index < search_length:
-        max_column_index = Pxx[min_row:max_row, index].argmax()
-
-        if max_column_index in [
-            previous_index - 1, previous_index, previous_index + 1
-        ]:
-            same_index += 1
-        else:
-            same_index = 0
-            previous_index = max_column_index
-
-        index += 1
+    ridge = find_stable_ridge(
+        Pxx,
+        round(fmin / frequency_resolution),
+        round(fmax / frequency_resolution),
+        n_columns=search_length,
+    )
 
-    if same_index < 50:
+    if ridge is None:
         # print(
         #     'Calibrator signal was not found, therefore psd cannot be '
         #     'calculated.'
@@ -129,9 +115,9 @@ def find_calibrator(
 
     # print(
     #     'Direct signal was found around '
-    #     f'{(previous_index + min_row) * frequency_resolution} Hz.'
+    #     f'{ridge[1] * frequency_resolution} Hz.'
     # )
-    return (previous_index + min_row) * frequency_resolution
+    return ridge[1] * frequency_resolution
 
 
 def arguments():
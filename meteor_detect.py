@@ -1,9 +1,10 @@
 import argparse
 import math
 import numpy as np
-import geopy.distance as geo
+import modules.database.database as db
 import modules.database.system as sys
 import modules.database.file as fil
+import modules.database.interval_index as interval_index
 import modules.meteor_detect.csv as csv
 
 # from modules.brams_wav_2 import BramsWavFile
@@ -77,12 +78,79 @@ def get_interval(string_date='2022-04-29T000000'):
     }
 
 
+def get_wav_loader(
+    directory: str = default_dir,
+    is_wav: bool = False,
+    cache: Union[dict, None] = None,
+    cache_size: Union[int, None] = None
+):
+    """
+    Function creates the default wav file loader, which reads the files
+    from the given directory (or from the archive).
+
+    Parameters
+    ----------
+    directory : str, optional
+        Directory where the files are located, by default default_dir
+    is_wav : bool, optional
+        Indicates if the wav files are located in tar files (False) or
+        not (True), by default False
+    cache : Union[dict, None], optional
+        Dictionary keeping the loaded files from the least to the most
+        recently used one, detection times close to each other often fall
+        in the same files, by default None
+    cache_size : Union[int, None], optional
+        Maximum number of files kept in the cache, the least recently used
+        files are removed first, by default None (no limit)
+
+    Returns
+    -------
+    function
+        loader taking the date, the location code and the system code
+        ('SYS001', ...) of a file and returning the BramsWavFile, it raises
+        a BramsError if the file cannot be read
+    """
+    from_archive = directory == default_dir
+
+    def load_wav(date, location_code, system_code):
+        key = (date, location_code, system_code)
+
+        if cache is not None and key in cache:
+            # the file becomes the most recently used one
+            wav = cache.pop(key)
+            cache[key] = wav
+            return wav
+
+        wav = BramsWavFile(
+            date,
+            location_code,
+            system_code,
+            respect_date=True,
+            parent_directory=directory,
+            is_wav=is_wav,
+            from_archive=from_archive,
+        )
+
+        if cache is not None:
+            cache[key] = wav
+
+            while cache_size is not None and len(cache) > cache_size:
+                del cache[next(iter(cache))]
+
+        return wav
+
+    return load_wav
+
+
 def get_meteor_coords(
     stations: dict,
     interval: dict,
-    is_wav: bool,
-    directory: str,
-    from_archive: bool
+    is_wav: bool = False,
+    directory: str = default_dir,
+    from_archive: bool = True,
+    wav_loader=None,
+    roi_margin: Union[float, None] = None,
+    lean: bool = False
 ):
     """
     Function gets all the meteors from the inputted interval.
@@ -93,14 +161,27 @@ def get_meteor_coords(
         Stations to get files from and search meteors on
     interval : dict
         Interval to search meteors in between
-    is_wav : bool
+    is_wav : bool, optional
         Indicates if the wav files are located in tar files (False) or
-        not (True)
-    directory : str
-        Directory where the files are located
-    from_archive : bool
+        not (True), by default False
+    directory : str, optional
+        Directory where the files are located, by default default_dir
+    from_archive : bool, optional
         Indicates if the files are located in the archive (True) or in another
-        directory (False)
+        directory (False), by default True
+    wav_loader : function, optional
+        Function loading the wav files (see get_wav_loader), replaces the
+        is_wav, directory and from_archive arguments, by default None
+    roi_margin : Union[float, None], optional
+        Seconds of signal before and after the interval the spectrogram is
+        calculated on, by default None (the whole file). The spectrogram of
+        a region of interest is normalized by its own maximum and the
+        transmitter signal is searched from its first column, so the
+        detections can differ from those of the whole file; 15 seconds is
+        enough for the broad interval and the transmitter search
+    lean : bool, optional
+        Store the spectrograms as float32 and calculate their dB values
+        only where needed (see Spectrogram), by default False
 
     Returns
     -------
@@ -118,6 +199,18 @@ def get_meteor_coords(
     kernel[-1, 3] = 50
     kernel[-2, 3] = 50
 
+    if wav_loader is None:
+        def wav_loader(date, location_code, system_code):
+            return BramsWavFile(
+                date,
+                location_code,
+                system_code,
+                respect_date=True,
+                parent_directory=directory,
+                is_wav=is_wav,
+                from_archive=from_archive,
+            )
+
     # for each relevant wav file
     for location in stations.keys():
         for antenna in stations[location]['sys'].keys():
@@ -127,45 +220,55 @@ def get_meteor_coords(
 
                 try:
                     # read the wav file
-                    wav = BramsWavFile(
+                    wav = wav_loader(
                         datetime.strptime(date, '%Y%m%d%H%M')
                         .replace(tzinfo=timezone.utc),
                         location,
                         f"SYS{antenna.rjust(3, '0')}",
-                        respect_date=True,
-                        parent_directory=directory,
-                        is_wav=is_wav,
-                        from_archive=from_archive,
                     )
                 except BramsError:
                     continue
 
-                # generate the spectrogram
+                # generate the spectrogram of the whole file, or of the
+                # interval only with margins for the broad interval and the
+                # retrieval of the transmitter signal
+                time_range = None
+                if roi_margin is not None:
+                    time_range = (
+                        (interval['start_time'] - system_file['start'])
+                        / 1000000 - roi_margin,
+                        (interval['end_time'] - system_file['start'])
+                        / 1000000 + roi_margin,
+                    )
+
                 spectrogram = Spectrogram(
                     wav.Isamples,
-                    sample_frequency=wav.fs
+                    sample_frequency=wav.fs,
+                    time_range=time_range,
+                    lean=lean,
                 )
 
                 # calculate the time resolution of the spectrogram
-                # by comparing the time length of the spectrogram and the time
-                # length in microseconds
-                spectrogram_length = len(spectrogram.times)
+                # by comparing the time length of the whole spectrogram and
+                # the time length in microseconds
+                spectrogram_length = spectrogram.n_frames
                 time_length = system_file['end'] - system_file['start']
                 spectrogram_res = spectrogram_length / time_length
                 # time_res = time_length / spectrogram_length
 
                 # get the start index of the interval on the spectrogram
+                # (relative to the calculated frames)
                 interval_start = math.floor(
                     (interval['start_time'] - system_file['start'])
                     * spectrogram_res
-                )
+                ) - spectrogram.column_offset
                 broad_interval_start = interval_start - 23
 
                 # get the end index of the interval on the spectrogram
                 interval_end = math.ceil(
                     (interval['end_time'] - system_file['start'])
                     * spectrogram_res
-                )
+                ) - spectrogram.column_offset
                 broad_interval_end = interval_end + 23
 
                 # filter the spectrogram in order to find meteors
@@ -243,6 +346,8 @@ def get_close(stations, reference_station_code=None):
         for location in stations.keys():
             stations[location]['distance'] = None
     else:
+        import geopy.distance as geo
+
         ref_station = stations[reference_station_code]
         for location in stations.keys():
             # for each station in the stations dict, calculate the distance
@@ -296,58 +401,259 @@ def generate_filename(
     return f'{basis}{date}{station}'
 
 
-def main(args):
+def get_system_ids(
+    stations: Union[list, None] = None,
+    connection=None
+):
     """
-    This function is the entrypoint of the program,
-    it is the link between all the functions and generates the final
-    result
+    Function gets the system ids of the requested location codes.
 
     Parameters
     ----------
-    args : object
-        arguments and options the user provided to the program
-    """
-    # get the interval in which to detect meteors
-    interval = get_interval(args.detection_time[0])
-    systems = []
-    system_ids = []
+    stations : Union[list, None], optional
+        location codes, all the systems are taken if the list is empty or
+        None, by default None
+    connection : MySQLConnection, optional
+        open connection to use instead of a new one, by default None
 
+    Returns
+    -------
+    list
+        system ids of the requested locations
+    """
     # check if the stations argument has been given
-    if len(args.stations) == 0:
-        systems = sys.get_station_ids()
+    if not stations:
+        systems = sys.get_station_ids(connection=connection)
     else:
-        systems = sys.get_station_ids(args.stations, False)
+        systems = sys.get_station_ids(stations, False, connection)
 
     # restructure the system ids in a simple list instead of dictionary
-    for lcode in systems.keys():
-        for antenna in systems[lcode].keys():
-            system_ids.append(systems[lcode][antenna])
+    return [
+        systems[lcode][antenna]
+        for lcode in systems.keys()
+        for antenna in systems[lcode].keys()
+    ]
 
-    stations = fil.get_file_by_interval(system_ids, interval)
+
+def find_meteors(
+    interval: dict,
+    system_ids: list,
+    wav_loader,
+    reference_station: Union[str, None] = None,
+    connection=None,
+    stations: Union[dict, None] = None,
+    lean: bool = False,
+    roi_margin: Union[float, None] = None
+):
+    """
+    Function finds the meteors of an interval on the files of the given
+    systems.
+
+    Parameters
+    ----------
+    interval : dict
+        Interval to search meteors in between (see get_interval)
+    system_ids : list
+        ids of the systems to search meteors on
+    wav_loader : function
+        Function loading the wav files (see get_wav_loader)
+    reference_station : Union[str, None], optional
+        Location code of the station where the meteor signal was detected
+        , by default None
+    connection : MySQLConnection, optional
+        open connection to use instead of a new one, by default None
+    stations : Union[dict, None], optional
+        files overlapping the interval, already looked up (see
+        interval_index.FileIndex.get_files), by default None
+    lean : bool, optional
+        Use the memory-lean spectrograms (see get_meteor_coords)
+        , by default False
+    roi_margin : Union[float, None], optional
+        Calculate the spectrograms around the interval only, with this
+        margin in seconds (see get_meteor_coords), by default None
+
+    Returns
+    -------
+    dict
+        the stations with their files and the meteors found in them (see
+        get_meteor_coords), empty if no file contains the interval
+    """
+    if stations is None:
+        stations = fil.get_file_by_interval(system_ids, interval, connection)
 
     # if no files were found for the given interval
     if stations == {}:
-        print('No files were found for those stations at that time.')
-        return
-
-    if args.file_directory == default_dir:
-        from_archive = True
-    else:
-        from_archive = False
+        return stations
 
     # get distance between stations and reference stations
     # ! add try except clause below in case the file for the specified
     # ! station does not exist
-    stations = get_close(stations, args.reference_station)
+    stations = get_close(stations, reference_station)
     # get all the meteors of the given interval
-    stations = get_meteor_coords(
+    return get_meteor_coords(
         stations,
         interval,
-        args.wav,
-        args.file_directory,
-        from_archive
+        wav_loader=wav_loader,
+        roi_margin=roi_margin,
+        lean=lean,
     )
 
+
+def detect_meteors(
+    detection_times: list,
+    stations: Union[list, None] = None,
+    reference_station: Union[str, None] = None,
+    directory: str = default_dir,
+    is_wav: bool = False,
+    connection=None,
+    wav_loader=None,
+    cache: Union[dict, None] = None,
+    lean: bool = False,
+    roi_margin: Union[float, None] = None
+):
+    """
+    Function searches the meteors around many detection times. It can be
+    called by a long-lived process to serve many requests: the connection,
+    the wav loader and the wav cache can be kept between calls.
+
+    Parameters
+    ----------
+    detection_times : list
+        detection times, as strings (see get_interval) or timezone aware
+        datetimes
+    stations : Union[list, None], optional
+        location codes of the stations where to look for the meteor
+        signals, all the stations if empty or None, by default None
+    reference_station : Union[str, None], optional
+        Location code of the station where the meteor signals were detected
+        , by default None
+    directory : str, optional
+        Directory where the files are located, by default default_dir
+    is_wav : bool, optional
+        Indicates if the wav files are located in tar files (False) or
+        not (True), by default False
+    connection : MySQLConnection, optional
+        open connection to use instead of new ones, it should be in
+        autocommit mode to see the files added between calls
+        , by default None
+    wav_loader : function, optional
+        Function loading the wav files (see get_wav_loader), replaces the
+        directory, is_wav and cache arguments, by default None
+    cache : Union[dict, None], optional
+        Mapping keeping the loaded wav files between detection times (and
+        calls), by default None
+    lean : bool, optional
+        Use the memory-lean spectrograms (see get_meteor_coords)
+        , by default False
+    roi_margin : Union[float, None], optional
+        Calculate the spectrograms around the detection times only, with
+        this margin in seconds (see get_meteor_coords), by default None
+
+    Returns
+    -------
+    list
+        one dictionary per found meteor, with the detection time and the
+        csv columns as keys (see csv.HEADER)
+    """
+    if wav_loader is None:
+        wav_loader = get_wav_loader(directory, is_wav, cache)
+
+    system_ids = get_system_ids(stations, connection)
+    records = []
+    intervals = [
+        get_interval(
+            detection_time.strftime('%Y%m%dT%H%M%S')
+            if isinstance(detection_time, datetime)
+            else detection_time
+        )
+        for detection_time in detection_times
+    ]
+
+    # look the files of all the intervals up at once, with one index (one
+    # query) per day
+    days = {}
+    for position, interval in enumerate(intervals):
+        days.setdefault(
+            int(interval['occurence_time'] // 86400000000), []
+        ).append(position)
+
+    files = [None] * len(intervals)
+    for positions in days.values():
+        day_intervals = [intervals[position] for position in positions]
+        index = interval_index.FileIndex.load(
+            system_ids,
+            datetime.fromtimestamp(
+                min(interval['start_time'] for interval in day_intervals)
+                / 1000000,
+                tz=timezone.utc
+            ),
+            datetime.fromtimestamp(
+                max(interval['end_time'] for interval in day_intervals)
+                / 1000000,
+                tz=timezone.utc
+            ),
+            connection=connection,
+        )
+
+        for position, interval_files in zip(
+            positions, index.get_files(day_intervals)
+        ):
+            files[position] = interval_files
+
+    for interval, interval_files in zip(intervals, files):
+        meteors = find_meteors(
+            interval,
+            system_ids,
+            wav_loader,
+            reference_station,
+            connection,
+            interval_files,
+            lean,
+            roi_margin,
+        )
+        occurence_time = datetime.fromtimestamp(
+            interval['occurence_time'] / 1000000,
+            tz=timezone.utc
+        )
+
+        for record in csv.get_records(meteors):
+            records.append({
+                'detection_time': occurence_time,
+                **dict(zip(csv.HEADER, record)),
+            })
+
+    return records
+
+
+def main(args):
+    """
+    This function is the entrypoint of the program,
+    it is the link between all the functions and generates the final
+    result
+
+    Parameters
+    ----------
+    args : object
+        arguments and options the user provided to the program
+    """
+    # get the interval in which to detect meteors
+    interval = get_interval(args.detection_time[0])
+    system_ids = get_system_ids(args.stations)
+
+    stations = find_meteors(
+        interval,
+        system_ids,
+        get_wav_loader(args.file_directory, args.wav),
+        args.reference_station,
+        lean=args.lean,
+        roi_margin=args.roi_margin,
+    )
+
+    # if no files were found for the given interval
+    if stations == {}:
+        print('No files were found for those stations at that time.')
+        return
+
     # generate a csv file with the results
     csv.write_csv(
         stations,
@@ -485,6 +791,38 @@ def arguments():
         """,
         action='store_true'
     )
+    parser.add_argument(
+        '-m', '--mirror',
+        help="""
+            Path of a local mirror of the database (see
+            utility/sync_mirror.py). If this argument is set, the systems
+            and the files are read from the mirror instead of the database.
+        """,
+        default=None
+    )
+    parser.add_argument(
+        '-l', '--lean',
+        help="""
+            Stores the spectrograms as float32 and only calculates their dB
+            values where they are needed, to use less memory when many files
+            are processed at the same time. The results can differ slightly
+            from the default float64 spectrograms.
+        """,
+        action='store_true'
+    )
+    parser.add_argument(
+        '--roi-margin',
+        help="""
+            Only calculates the spectrograms around the detection time, with
+            this margin in seconds (15 is enough for the search). It is
+            faster, but the spectrogram is then normalized by the maximum of
+            that region and the transmitter signal is searched from its
+            start, so the meteors found can differ from those of the whole
+            file. By default, the whole file is used.
+        """,
+        type=float,
+        default=None
+    )
 
     args = parser.parse_args()
     return args
@@ -494,5 +832,7 @@ if __name__ == '__main__':
     # main_test()
     # exit()
     args = arguments()
+    if args.mirror:
+        db.set_backend('sqlite', args.mirror)
     main(args)
     print('Exiting...')
@@ -12,8 +12,6 @@ import os
 import numpy as np
 import tarfile
 
-from scipy.signal import windows
-from scipy.fft import rfft, rfftfreq
 from datetime import datetime, timedelta, timezone
 
 
@@ -514,6 +512,10 @@ class BramsWavFile:
         ):
             return self.fft_freq, self.fft, self.fft_fbin
 
+        # scipy is only imported when a fft is needed (slow import)
+        from scipy.signal import windows
+        from scipy.fft import rfft, rfftfreq
+
         # get the length of all the audio samples
         nsamples = Isamples.size
 
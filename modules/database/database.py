@@ -1,38 +1,472 @@
 import mysql.connector
+import mysql.connector.pooling
 import os
+import re
+import sqlite3
+import threading
+import time
 
+from contextlib import contextmanager
 from dotenv import load_dotenv
 
 
-def get_cursor_connection():
+# connection information and connection pool, created on first use and
+# shared by all the functions of the database modules
+config = None
+pool = None
+pool_lock = threading.Lock()
+
+# backend of the read functions ('mysql' or 'sqlite' for the local mirror,
+# see mirror.py) and path of the mirror, read from the DB_BACKEND and
+# MIRROR_PATH environnement variables unless set with set_backend
+BACKENDS = ('mysql', 'sqlite')
+backend_config = None
+
+# columns of the tables of the mysql database, read on first use so the
+# functions writing optional columns (added by the migrations) work on a
+# database that was not migrated yet
+table_columns = {}
+# columns of the unique keys of the tables of the mysql database
+table_unique_keys = {}
+
+
+def get_config():
     """
-    Function makes a connection to a mysql database
-    with connection information if finds in a environnement file
-    ant returns the database connection and cursor
+    Function reads the connection information from the environnement (and
+    the .env file) once and returns it.
 
     Returns
     -------
-    MySQLConnection, MySQLCursor
-        Returns the database connection and cursor
+    dict
+        host, user, password and database of the mysql database
+    """
+    global config
+
+    if config is None:
+        # load the .env file
+        load_dotenv()
+
+        config = {
+            'host': os.getenv('HOST'),
+            'user': os.getenv('DB_USER'),
+            'password': os.getenv('PASSWORD'),
+            'database': os.getenv('DATABASE'),
+        }
+
+    return config
+
+
+def set_backend(backend, mirror_path=None):
+    """
+    Function sets the default backend of the read functions.
+
+    Parameters
+    ----------
+    backend : str
+        'mysql' for the database server, 'sqlite' for the local mirror
+    mirror_path : str, optional
+        path of the local mirror, by default the MIRROR_PATH environnement
+        variable or brams_mirror.db
     """
-    # load the .env file
+    global backend_config
+
+    if backend not in BACKENDS:
+        raise ValueError(f'Unknown database backend : {backend}')
+
     load_dotenv()
+    backend_config = {
+        'backend': backend,
+        'mirror_path': (
+            mirror_path or os.getenv('MIRROR_PATH', 'brams_mirror.db')
+        ),
+    }
+
+
+def get_backend(backend=None, connection=None):
+    """
+    Function determines the backend a read function has to use.
+
+    Parameters
+    ----------
+    backend : str, optional
+        backend asked by the caller, by default None (the default backend)
+    connection : MySQLConnection or sqlite3.Connection, optional
+        connection given by the caller, its type takes precedence,
+        by default None
+
+    Returns
+    -------
+    str
+        'mysql' or 'sqlite'
+    """
+    if isinstance(connection, sqlite3.Connection):
+        return 'sqlite'
+
+    if connection is not None:
+        return 'mysql'
+
+    if backend is not None:
+        if backend not in BACKENDS:
+            raise ValueError(f'Unknown database backend : {backend}')
 
-    # connect to the database with values coming from the .env file
-    db = mysql.connector.connect(
-        host=os.getenv('HOST'),
-        user=os.getenv('DB_USER'),
-        password=os.getenv('PASSWORD'),
-        database=os.getenv('DATABASE'),
-    )
+        return backend
 
-    return db, db.cursor()
+    if backend_config is None:
+        load_dotenv()
+        set_backend(os.getenv('DB_BACKEND', 'mysql'))
 
+    return backend_config['backend']
 
-def close_connection(connection, cursor):
+
+def get_mirror_path():
+    """
+    Function returns the path of the local mirror.
+
+    Returns
+    -------
+    str
+        path of the sqlite file
+    """
+    if backend_config is None:
+        get_backend()
+
+    return backend_config['mirror_path']
+
+
+def to_sqlite(sql_query):
+    """
+    Function converts the parameter markers of a mysql query ('%s' and
+    '%(name)s') to the sqlite ones ('?' and ':name').
+
+    Parameters
+    ----------
+    sql_query : str
+        mysql query
+
+    Returns
+    -------
+    str
+        sqlite query
+    """
+    sql_query = re.sub(r'%\((\w+)\)s', r':\1', sql_query)
+    sql_query = sql_query.replace('%s', '?')
+
+    return sql_query.replace('%%', '%')
+
+
+def get_columns(table, connection=None, backend=None):
+    """
+    Function returns the columns of a table. The columns of the mysql
+    tables are read once and kept for the next calls.
+
+    Parameters
+    ----------
+    table : str
+        name of the table
+    connection : MySQLConnection or sqlite3.Connection, optional
+        open connection to use instead of a new one, by default None
+    backend : str, optional
+        'mysql' or 'sqlite', by default the default backend
+        (see get_backend)
+
+    Returns
+    -------
+    set
+        names of the columns of the table
+    """
+    backend = get_backend(backend, connection)
+
+    if backend == 'sqlite':
+        with get_cursor(connection, backend) as (connection, cursor):
+            cursor.execute(f"PRAGMA table_info(`{table}`)")
+
+            return {row[1] for row in cursor.fetchall()}
+
+    if table not in table_columns:
+        with get_cursor(connection) as (connection, cursor):
+            cursor.execute(
+                "SELECT column_name\n"
+                "FROM information_schema.columns\n"
+                "WHERE table_schema = DATABASE()\n"
+                "AND table_name = %s",
+                (table,)
+            )
+            # some servers return the names of information_schema as bytes
+            table_columns[table] = {
+                column.decode() if isinstance(column, (bytes, bytearray))
+                else column
+                for (column,) in cursor
+            }
+
+    return table_columns[table]
+
+
+def has_column(table, column, connection=None, backend=None):
+    """
+    Function checks wether a table has a column (see get_columns).
+
+    Parameters
+    ----------
+    table : str
+        name of the table
+    column : str
+        name of the column
+    connection : MySQLConnection or sqlite3.Connection, optional
+        open connection to use instead of a new one, by default None
+    backend : str, optional
+        'mysql' or 'sqlite', by default the default backend
+        (see get_backend)
+
+    Returns
+    -------
+    bool
+        True if the table has the column
+    """
+    return column in get_columns(table, connection, backend)
+
+
+def get_unique_keys(table, connection=None):
+    """
+    Function returns the columns of the unique keys (the primary key
+    included) of a mysql table. They are read once and kept for the next
+    calls.
+
+    Parameters
+    ----------
+    table : str
+        name of the table
+    connection : MySQLConnection, optional
+        open connection to use instead of a new one, by default None
+
+    Returns
+    -------
+    set
+        columns of each unique key, as frozensets
+    """
+    if table not in table_unique_keys:
+        with get_cursor(connection) as (connection, cursor):
+            cursor.execute(
+                "SELECT index_name, column_name\n"
+                "FROM information_schema.statistics\n"
+                "WHERE table_schema = DATABASE()\n"
+                "AND table_name = %s\n"
+                "AND non_unique = 0",
+                (table,)
+            )
+            keys = {}
+
+            for index_name, column in cursor:
+                # some servers return the names of information_schema as
+                # bytes
+                if isinstance(column, (bytes, bytearray)):
+                    column = column.decode()
+
+                keys.setdefault(index_name, set()).add(column)
+
+            table_unique_keys[table] = {
+                frozenset(columns) for columns in keys.values()
+            }
+
+    return table_unique_keys[table]
+
+
+def has_unique_key(table, columns, connection=None):
+    """
+    Function checks wether a mysql table has a unique key on exactly some
+    columns (see get_unique_keys).
+
+    Parameters
+    ----------
+    table : str
+        name of the table
+    columns : tuple
+        names of the columns of the key
+    connection : MySQLConnection, optional
+        open connection to use instead of a new one, by default None
+
+    Returns
+    -------
+    bool
+        True if the table has the unique key
+    """
+    return frozenset(columns) in get_unique_keys(table, connection)
+
+
+def get_pool():
+    """
+    Function creates the connection pool on first use and returns it. The
+    size of the pool can be set with the POOL_SIZE environnement variable,
+    it defaults to 5 connections.
+
+    Returns
+    -------
+    MySQLConnectionPool
+        the connection pool
+    """
+    global pool
+
+    with pool_lock:
+        if pool is None:
+            db_config = get_config()
+            pool = mysql.connector.pooling.MySQLConnectionPool(
+                pool_name='brams',
+                pool_size=int(os.getenv('POOL_SIZE', 5)),
+                pool_reset_session=True,
+                **db_config
+            )
+
+    return pool
+
+
+def get_connection(timeout=30.0):
+    """
+    Function takes a connection from the pool, waiting for one to be
+    returned if they are all in use. The connection is checked (and
+    reconnected if the server closed it) before it is returned.
+
+    Parameters
+    ----------
+    timeout : float, optional
+        maximum number of seconds to wait for a connection, by default 30
+
+    Returns
+    -------
+    PooledMySQLConnection
+        a connection of the pool, closing it returns it to the pool
+
+    Raises
+    ------
+    mysql.connector.errors.PoolError
+        if no connection was returned to the pool within the timeout
+    """
+    deadline = time.monotonic() + timeout
+
+    while True:
+        try:
+            db = get_pool().get_connection()
+            break
+        except mysql.connector.errors.PoolError:
+            if time.monotonic() >= deadline:
+                raise
+            time.sleep(0.1)
+
+    # health check, idle connections may have been closed by the server
+    try:
+        db.ping(reconnect=True, attempts=3, delay=1)
+    except mysql.connector.Error:
+        # closing a pooled connection would return the dead connection to
+        # the pool, its slot is returned disconnected instead so the pool
+        # opens a new connection the next time it is taken
+        cnx = db._cnx
+        db._cnx = None
+
+        try:
+            cnx.disconnect()
+        except mysql.connector.Error:
+            pass
+
+        get_pool().add_connection(cnx)
+        raise
+
+    return db
+
+
+@contextmanager
+def connection():
+    """
+    Context manager taking a connection from the pool and returning it to
+    the pool when the block ends, even on errors.
+
+    Yields
+    ------
+    PooledMySQLConnection
+        a connection of the pool
+    """
+    db = get_connection()
+
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@contextmanager
+def get_cursor(db=None, backend='mysql'):
+    """
+    Context manager opening a cursor, on the given connection or on a
+    connection of the pool. The cursor is closed and the connection of the
+    pool is returned when the block ends, even on errors.
+
+    Parameters
+    ----------
+    db : MySQLConnection, optional
+        connection opened by the caller, it is left open, by default None
+    backend : str, optional
+        'mysql' or 'sqlite', a connection to the local mirror is opened
+        instead of taking one from the pool with 'sqlite',
+        by default 'mysql'
+
+    Yields
+    ------
+    MySQLConnection, MySQLCursor
+        the connection and the cursor
+    """
+    if db is None and backend == 'sqlite':
+        db = sqlite3.connect(get_mirror_path())
+
+        try:
+            with get_cursor(db) as (db, cursor):
+                yield db, cursor
+        finally:
+            db.close()
+        return
+
+    if db is not None:
+        cursor = db.cursor()
+
+        try:
+            yield db, cursor
+        finally:
+            cursor.close()
+        return
+
+    with connection() as db:
+        cursor = db.cursor()
+
+        try:
+            yield db, cursor
+        finally:
+            cursor.close()
+
+
+def get_cursor_connection(connection=None):
+    """
+    Function takes a connection from the connection pool and returns the
+    database connection and cursor. Prefer the get_cursor context manager,
+    which always returns the connection to the pool.
+
+    Parameters
+    ----------
+    connection : MySQLConnection, optional
+        connection opened by the caller, if given no connection is taken
+        from the pool and only a cursor is opened on it, by default None
+
+    Returns
+    -------
+    MySQLConnection, MySQLCursor
+        Returns the database connection and cursor
+    """
+    if connection is None:
+        connection = get_connection()
+
+    return connection, connection.cursor()
+
+
+def close_connection(connection, cursor, keep_open=False):
     """
     Function closes the database connection and cursor it
-    receives as arguments.
+    receives as arguments. Closing a connection of the pool returns it to
+    the pool.
 
     Parameters
     ----------
@@ -40,6 +474,11 @@ def close_connection(connection, cursor):
         the mysql database connection object
     cursor : MySQLCursor
         the mysql database cursor object
+    keep_open : bool, optional
+        only close the cursor, the connection belongs to the caller,
+        by default False
     """
     cursor.close()
-    connection.close()
+
+    if not keep_open:
+        connection.close()
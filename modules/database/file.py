@@ -1,52 +1,376 @@
 import mysql.connector
+import numpy as np
+import sqlite3
+import time
 
 from . import database as db
-from datetime import timezone
+from . import mirror
+from datetime import datetime, timedelta, timezone
 
 
-def insert_psd(psd_data):
+# ways insert_psd can store the psd values
+WRITE_STRATEGIES = ('update', 'staging', 'upsert')
+
+# maximum duration of a file, the files are 5 minutes long
+MAX_FILE_DURATION = timedelta(minutes=10)
+
+# files with their system, the start is stored in UTC so the difference
+# with the epoch is a unix timestamp
+FILE_QUERY = (
+    "SELECT\n"
+    "   location_code,\n"
+    "   antenna,\n"
+    "   precise_start,\n"
+    "   precise_end,\n"
+    "   TIMESTAMPDIFF(SECOND, '1970-01-01', file.start),\n"
+    "   longitude,\n"
+    "   latitude,\n"
+    "   path\n"
+    "FROM file\n"
+    "JOIN `system` on file.system_id = system.id\n"
+    "JOIN location on system.location_id = location.id\n"
+)
+
+
+def insert_psd(
+    psd_data,
+    verbose=True,
+    connection=None,
+    strategy='update',
+    chunk_size=1000,
+    backend=None
+):
     """
     Function inserts and/or updates the noise psd value of a set of files.
     The files it modifies depends on the values received in the
     psd_data array it receives as argument.
+    The values are stored by chunks, each chunk is committed on its own:
+
+        - 'update' executes one UPDATE per value (one round trip per value)
+        - 'staging' inserts the chunk in a temporary table with a single
+          multi-row INSERT and updates the files with a single joined
+          UPDATE (requires the CREATE TEMPORARY TABLES privilege)
+        - 'upsert' uses a single multi-row INSERT ... ON DUPLICATE KEY
+          UPDATE, it requires a unique key on (system_id, start) (it is
+          refused without it, see check_write_strategy) and inserts a row
+          for the values of unknown files, only use it when every file is
+          known to exist
 
     Parameters
     ----------
     psd_data : array
         Array which contains dictionaries. Each dictionary is composed of
-        the psd value, a system_id and the start time of the file.
+        the psd value, a system_id, the start time of the file and the
+        version of the psd calculation (psd_version, the values without
+        version are stored as stale). The version is only stored if the
+        file table has the psd_version column (see
+        migrations/001_psd_version.sql).
+    verbose : bool, optional
+        wether to print a message before saving the values, by default True
+    connection : MySQLConnection, optional
+        open connection to use instead of a new one, by default None
+    strategy : str, optional
+        'update', 'staging' or 'upsert', by default 'update'
+    chunk_size : int, optional
+        number of values stored and committed at once, by default 1000
+    backend : str, optional
+        'mysql' or 'sqlite' to write to a local mirror (benchmarks and
+        offline tests, only the 'update' strategy is available),
+        by default the default backend (see database.get_backend)
 
     Returns
     -------
     boolean
-        Returns True on success, False on fail
+        Returns True on success, False on fail (the chunks before the
+        failing one stay stored)
     """
-    connection, cursor = db.get_cursor_connection()
-    print('Saving values in the database...')
+    backend = db.get_backend(backend, connection)
+    check_write_strategy(strategy, connection, backend)
+
+    if verbose:
+        print('Saving values in the database...')
+
+    # rows coming from older json files have no version
+    psd_data = [{'psd_version': None, **row} for row in psd_data]
+    write_start = time.monotonic()
+
+    if backend == 'sqlite':
+        # the mirror stores the start in seconds since the epoch and does
+        # not store decimals
+        psd_data = [
+            {
+                **row,
+                'time': mirror.get_timestamp(
+                    datetime.strptime(row['time'], '%Y-%m-%d %H:%M')
+                ),
+                'noise_psd': to_float(row['noise_psd']),
+                'calibrator_psd': to_float(row['calibrator_psd']),
+            }
+            for row in psd_data
+        ]
+
+    with db.get_cursor(connection, backend) as (connection, cursor):
+        # execute and commit the values chunk by chunk
+        try:
+            versioned = db.has_column(
+                'file', 'psd_version', connection, backend
+            )
+
+            if strategy == 'staging':
+                # the temporary table only exists for this session
+                cursor.execute(
+                    "CREATE TEMPORARY TABLE IF NOT EXISTS psd_staging (\n"
+                    "   system_id INT NOT NULL,\n"
+                    "   start DATETIME NOT NULL,\n"
+                    "   noise DOUBLE NULL,\n"
+                    "   calibrator DOUBLE NULL,\n"
+                    "   psd_version SMALLINT UNSIGNED NULL,\n"
+                    "   PRIMARY KEY (system_id, start)\n"
+                    ") ENGINE=MEMORY"
+                )
+
+            for chunk_start in range(0, len(psd_data), chunk_size):
+                chunk = psd_data[chunk_start:chunk_start + chunk_size]
+
+                if strategy == 'update':
+                    update_psd(cursor, chunk, backend, versioned)
+                elif strategy == 'staging':
+                    stage_psd(cursor, chunk, versioned)
+                else:
+                    upsert_psd(cursor, chunk, versioned)
+
+                connection.commit()
+        except (mysql.connector.Error, sqlite3.Error) as e:
+            connection.rollback()
+            print(e)
+            return False
+
+    if verbose:
+        duration = time.monotonic() - write_start
+        print(
+            f'Stored {len(psd_data)} psd values in {duration:.2f} s '
+            f'({len(psd_data) / max(duration, 1e-9):.0f} rows/s)'
+        )
+
+    return True
+
+
+def check_write_strategy(strategy, connection=None, backend=None):
+    """
+    Function checks that psd values can be stored with a write strategy
+    (see insert_psd). Without a unique key on (system_id, start), the
+    'upsert' strategy would insert a new file row for every value.
+
+    Parameters
+    ----------
+    strategy : str
+        'update', 'staging' or 'upsert'
+    connection : MySQLConnection, optional
+        open connection to use instead of a new one, by default None
+    backend : str, optional
+        'mysql' or 'sqlite', by default the default backend
+        (see database.get_backend)
+
+    Raises
+    ------
+    ValueError
+        if the strategy is unknown or cannot be used with the database
+    """
+    if strategy not in WRITE_STRATEGIES:
+        raise ValueError(f'Unknown write strategy : {strategy}')
+
+    backend = db.get_backend(backend, connection)
+    if backend == 'sqlite' and strategy != 'update':
+        raise ValueError(f'Write strategy {strategy} requires mysql')
+
+    if strategy == 'upsert' and not db.has_unique_key(
+        'file', ('system_id', 'start'), connection
+    ):
+        raise ValueError(
+            'Write strategy upsert requires a unique key on file '
+            '(system_id, start)'
+        )
+
+
+def to_float(value):
+    """
+    Function converts a psd value to a float, keeping unknown values.
+
+    Parameters
+    ----------
+    value : decimal.Decimal, float or None
+        the psd value
+
+    Returns
+    -------
+    float or None
+        the psd value as a float
+    """
+    return None if value is None else float(value)
+
+
+def get_psd_values(chunk, versioned=True):
+    """
+    Function generates the multi-row VALUES clause of a chunk of psd values
+    and its arguments.
+
+    Parameters
+    ----------
+    chunk : list
+        psd values (see insert_psd)
+    versioned : bool, optional
+        wether the values include the psd version, by default True
+
+    Returns
+    -------
+    tuple
+        the VALUES clause and its arguments
+    """
+    columns = ('system_id', 'time', 'noise_psd', 'calibrator_psd')
+    if versioned:
+        columns += ('psd_version',)
+
+    row_values = f"   ({', '.join('%s' for column in columns)})"
+    values = ',\n'.join(row_values for row in chunk)
+    sql_args = [row[column] for row in chunk for column in columns]
+
+    return values, sql_args
+
+
+def update_psd(cursor, chunk, backend='mysql', versioned=True):
+    """
+    Function updates the psd values of the files one by one.
+
+    Parameters
+    ----------
+    cursor : MySQLCursor
+        cursor of the transaction
+    chunk : list
+        psd values (see insert_psd)
+    backend : str, optional
+        'mysql' or 'sqlite', by default 'mysql'
+    versioned : bool, optional
+        wether to store the psd version, by default True
+    """
+    assignments = [
+        "   noise = %(noise_psd)s",
+        "   calibrator = %(calibrator_psd)s",
+    ]
+    if versioned:
+        assignments.append("   psd_version = %(psd_version)s")
 
     # sql query to update the database values
     sql_query = (
         "UPDATE file\n"
         "SET\n"
-        "   noise = %(noise_psd)s,\n"
-        "   calibrator = %(calibrator_psd)s\n"
-        "WHERE\n"
+        + ',\n'.join(assignments)
+        + "\nWHERE\n"
         "   system_id = %(system_id)s\n"
         "   AND start = %(time)s\n"
     )
 
-    # execute and commit the values
-    try:
-        cursor.executemany(sql_query, psd_data)
-        connection.commit()
-        return_value = True
-    except mysql.connector.Error as e:
-        connection.rollback()
-        print(e)
-        return_value = False
+    if backend == 'sqlite':
+        sql_query = db.to_sqlite(sql_query)
 
-    db.close_connection(connection, cursor)
-    return return_value
+    cursor.executemany(sql_query, chunk)
+
+
+def get_set_clause(source, versioned=True, target='{}'):
+    """
+    Function generates the assignments of the psd values of a multi-row
+    statement.
+
+    Parameters
+    ----------
+    source : str
+        format of the new value of a column, for instance 'VALUES({})' or
+        'psd_staging.{}'
+    versioned : bool, optional
+        wether to store the psd version, by default True
+    target : str, optional
+        format of the assigned column, by default '{}'
+
+    Returns
+    -------
+    str
+        the assignments, separated by commas
+    """
+    columns = ['noise', 'calibrator']
+    if versioned:
+        columns.append('psd_version')
+
+    return ',\n'.join(
+        f"   {target.format(column)} = {source.format(column)}"
+        for column in columns
+    )
+
+
+def stage_psd(cursor, chunk, versioned=True):
+    """
+    Function updates the psd values of the files through the psd_staging
+    temporary table: one INSERT and one UPDATE per chunk.
+
+    Parameters
+    ----------
+    cursor : MySQLCursor
+        cursor of the transaction
+    chunk : list
+        psd values (see insert_psd)
+    versioned : bool, optional
+        wether to store the psd version, by default True
+    """
+    values, sql_args = get_psd_values(chunk)
+
+    cursor.execute("DELETE FROM psd_staging")
+    # the last value of a file wins, as with one UPDATE per value
+    cursor.execute(
+        "INSERT INTO psd_staging\n"
+        "   (system_id, start, noise, calibrator, psd_version)\n"
+        f"VALUES\n{values}\n"
+        "ON DUPLICATE KEY UPDATE\n"
+        + get_set_clause('VALUES({})'),
+        sql_args
+    )
+    cursor.execute(
+        "UPDATE file\n"
+        "JOIN psd_staging\n"
+        "   ON file.system_id = psd_staging.system_id\n"
+        "   AND file.start = psd_staging.start\n"
+        "SET\n"
+        + get_set_clause('psd_staging.{}', versioned, 'file.{}')
+    )
+
+
+def upsert_psd(cursor, chunk, versioned=True):
+    """
+    Function stores the psd values of the files with a single multi-row
+    INSERT ... ON DUPLICATE KEY UPDATE. The values of files that are not
+    in the file table are not ignored: a new row, with only the system,
+    the start and the psd values, is inserted for each of them. Only use
+    it when every file is known to exist (see insert_psd).
+
+    Parameters
+    ----------
+    cursor : MySQLCursor
+        cursor of the transaction
+    chunk : list
+        psd values (see insert_psd)
+    versioned : bool, optional
+        wether to store the psd version, by default True
+    """
+    values, sql_args = get_psd_values(chunk, versioned)
+    columns = 'system_id, start, noise, calibrator'
+    if versioned:
+        columns += ', psd_version'
+
+    cursor.execute(
+        "INSERT INTO file\n"
+        f"   ({columns})\n"
+        f"VALUES\n{values}\n"
+        "ON DUPLICATE KEY UPDATE\n"
+        + get_set_clause('VALUES({})', versioned),
+        sql_args
+    )
 
 
 def insert_calibrator(psd_data):
@@ -158,15 +482,28 @@ def get_previous_noise_psd(stations, start_date, end_date):
 
         psd[sys_id][start].append(psd_val)
 
-    db.close_connection(cursor, connection)
+    db.close_connection(connection, cursor)
 
     return psd
 
 
-def get_previous_all_psd(stations, start_date, end_date, interval):
+def get_previous_all_psd(
+    stations,
+    start_date,
+    end_date,
+    interval,
+    cache=None,
+    connection=None,
+    backend=None
+):
     """
     Function gets all the previous psd values from a given start date to a
-    given end date and respecting a given interval in between each file
+    given end date and respecting a given interval in between each file.
+    If a cache is given, only the psd values outside of the range covered
+    by the cache for each system are fetched from the database, together
+    with the cached values of an older psd version that were recalculated
+    since. They are merged into the cache and the requested values are
+    taken from the cache.
 
     Parameters
     ----------
@@ -178,72 +515,374 @@ def get_previous_all_psd(stations, start_date, end_date, interval):
         date upto which to take psd values
     interval : int
         interval between each file
+    cache : PsdCache, optional
+        local cache of the psd values with the same interval,
+        by default None
+    connection : MySQLConnection, optional
+        open connection to use instead of a new one, by default None
+    backend : str, optional
+        'mysql' or 'sqlite' to read from the local mirror, by default the
+        default backend (see database.get_backend)
 
     Returns
     -------
-    list
-        list with all the psd values structures by station and by date
+    dict
+        psd values of each system with at least one value, as arrays
+        ordered by date (see group_by_system)
+    """
+    if cache is None:
+        return select_previous_psd(
+            stations, start_date, end_date, interval, connection, backend
+        )
+
+    # group the systems by the dates between which values have to be
+    # fetched, the stale values are fetched again only if they were
+    # recalculated
+    fetches = {}
+    for sys_id in stations:
+        for dates in cache.get_gaps(sys_id, start_date, end_date):
+            fetches.setdefault((dates, None), []).append(sys_id)
+
+        dates = cache.get_stale_range(sys_id, start_date, end_date)
+        if dates is not None:
+            fetches.setdefault((dates, cache.version), []).append(sys_id)
+
+    batches = []
+    for ((fetch_start, fetch_end), min_version), sys_ids in fetches.items():
+        for batch in iter_previous_psd(
+            sys_ids,
+            fetch_start,
+            fetch_end,
+            interval,
+            connection=connection,
+            backend=backend,
+            versions=True,
+            min_version=min_version,
+        ):
+            # the cache takes dates instead of seconds since the epoch
+            batches.append(
+                batch[:1] + (batch[1].astype('datetime64[s]'),) + batch[2:]
+            )
+
+    cache.add(batches)
+    for sys_id in stations:
+        cache.extend(sys_id, start_date, end_date)
+
+    return cache.get(stations, start_date, end_date)
+
+
+def select_previous_psd(
+    stations,
+    start_date,
+    end_date,
+    interval,
+    connection=None,
+    backend=None
+):
+    """
+    Function queries the database for the psd values of some systems
+    between 2 dates, respecting a given interval in between each file
+    (see get_previous_all_psd).
+
+    Parameters
+    ----------
+    stations : list
+        list with all the station ids to take psd values from
+    start_date : datetime.datetime
+        date from which to take psd values
+    end_date : datetime.datetime
+        date upto which to take psd values
+    interval : int
+        interval between each file
+    connection : MySQLConnection, optional
+        open connection to use instead of a new one, by default None
+    backend : str, optional
+        'mysql' or 'sqlite' to read from the local mirror, by default the
+        default backend (see database.get_backend)
+
+    Returns
+    -------
+    dict
+        psd values of each system with at least one value, as arrays
+        ordered by date (see group_by_system)
+    """
+    return group_by_system(iter_previous_psd(
+        stations,
+        start_date,
+        end_date,
+        interval,
+        connection=connection,
+        backend=backend,
+    ))
+
+
+def iter_previous_psd(
+    stations,
+    start_date,
+    end_date,
+    interval,
+    batch_size=10000,
+    connection=None,
+    backend=None,
+    versions=False,
+    min_version=None
+):
+    """
+    Function streams the psd values of some systems between 2 dates,
+    respecting a given interval in between each file, in batches of numpy
+    arrays. The rows are read from an unbuffered cursor, so only one batch
+    is held in memory at a time.
+
+    Parameters
+    ----------
+    stations : list
+        list with all the station ids to take psd values from
+    start_date : datetime.datetime
+        date from which to take psd values
+    end_date : datetime.datetime
+        date upto which to take psd values
+    interval : int
+        interval between each file
+    batch_size : int, optional
+        number of rows fetched at once, by default 10000
+    connection : MySQLConnection, optional
+        open connection to use instead of a new one, by default None
+    backend : str, optional
+        'mysql' or 'sqlite' to read from the local mirror, by default the
+        default backend (see database.get_backend)
+    versions : bool, optional
+        wether to also yield the psd versions, by default False
+    min_version : int, optional
+        only take the psd values of this version of the psd calculation or
+        of a newer one, by default None (any version)
+
+    Yields
+    ------
+    tuple
+        arrays with the system ids (int64), the start dates in seconds
+        since the epoch (int64), the noise and the calibrator psd values
+        (float64, nan for unknown values) of a batch of files, followed by
+        their psd versions (int64, 0 for unknown versions) with versions
+    """
+    backend = db.get_backend(backend, connection)
+
+    with db.get_cursor(connection, backend) as (connection, cursor):
+        versioned = backend == 'sqlite' or db.has_column(
+            'file', 'psd_version', connection
+        )
+
+        # the versions are unknown before migrations/001_psd_version.sql
+        if min_version is not None and not versioned:
+            return
+
+        sql_query, sql_args = get_previous_psd_query(
+            stations,
+            start_date,
+            end_date,
+            interval,
+            backend,
+            backend == 'sqlite' or db.has_column(
+                'file', 'start_minute', connection
+            ),
+            version=(
+                ('psd_version' if versioned else 'NULL')
+                if versions else None
+            ),
+            min_version=min_version,
+        )
+        cursor.execute(sql_query, tuple(sql_args))
+
+        try:
+            while True:
+                rows = cursor.fetchmany(batch_size)
+
+                if not len(rows):
+                    break
+
+                # decimals are converted to floats and nulls to nan
+                values = np.array(rows, dtype=np.float64)
+                batch = (
+                    values[:, 0].astype(np.int64),
+                    values[:, 1].astype(np.int64),
+                    values[:, 2],
+                    values[:, 3],
+                )
+
+                if versions:
+                    batch += (
+                        np.nan_to_num(values[:, 4]).astype(np.int64),
+                    )
+
+                yield batch
+        finally:
+            # the iteration may have been stopped before the last row
+            if getattr(connection, 'unread_result', False):
+                connection.consume_results()
+
+
+def get_previous_psd_query(
+    stations,
+    start_date,
+    end_date,
+    interval,
+    backend='mysql',
+    start_minute=True,
+    version=None,
+    min_version=None
+):
+    """
+    Function builds the query selecting the psd values of some systems
+    between 2 dates, one value per slot of 'interval' minutes (see
+    iter_previous_psd). The slots start at start_date, as the slots of a
+    monitoring run. They are selected with integer arithmetic on the
+    indexed start_minute column (minutes since the epoch, see
+    migrations/002_indexes.sql), so the query is a range scan of the
+    (system_id, start_minute) index for each system. Without this column,
+    the minutes are computed from the start of the files.
+
+    Parameters
+    ----------
+    stations : list
+        list with all the station ids to take psd values from
+    start_date : datetime.datetime
+        date from which to take psd values
+    end_date : datetime.datetime
+        date upto which to take psd values
+    interval : int
+        interval between each file
+    backend : str, optional
+        'mysql' or 'sqlite', by default 'mysql'
+    start_minute : bool, optional
+        wether the mysql file table has the start_minute column,
+        by default True
+    version : str, optional
+        expression of the psd version selected after the psd values
+        ('psd_version', or 'NULL' if the column is missing), by default
+        None (not selected)
+    min_version : int, optional
+        only select the psd values of this version or of a newer one,
+        by default None
+
+    Returns
+    -------
+    tuple
+        the query and its arguments
     """
     arguments = ['%s' for i in range(len(stations))]
-    sql_args = [
-        '%Y-%m-%d %H:%i',
-        start_date.strftime('%Y-%m-%d %H:%M'),
-        end_date.strftime('%Y-%m-%d %H:%M')
-    ] + stations
-    sql_args.append(interval)
-    psd = {}
-    connection, cursor = db.get_cursor_connection()
+    # the seconds of the dates are ignored
+    start_slot = mirror.get_timestamp(start_date) // 60
+    end_slot = mirror.get_timestamp(end_date) // 60
+
+    if backend == 'sqlite':
+        # the mirror stores the start in seconds since the epoch
+        minute = 'start / 60'
+        bounds = ('start', start_slot * 60, end_slot * 60)
+    elif start_minute:
+        minute = 'start_minute'
+        bounds = ('start_minute', start_slot, end_slot)
+    else:
+        minute = "TIMESTAMPDIFF(MINUTE, '1970-01-01 00:00:00', start)"
+        bounds = ('start',) + tuple(
+            datetime.fromtimestamp(slot * 60, tz=timezone.utc)
+            .strftime('%Y-%m-%d %H:%M')
+            for slot in (start_slot, end_slot)
+        )
+
+    columns = [
+        'system_id',
+        'start' if backend == 'sqlite' else f'{minute} * 60',
+        'noise',
+        'calibrator',
+    ]
+    if version is not None:
+        columns.append(version)
 
-    # get the last calibrator psd value for the requested systems (stations)
     sql_query = (
-        "SELECT\n"
-        "   system_id,\n"
-        "   DATE_FORMAT(start, %s) as start,\n"
-        "   calibrator,\n"
-        "   noise\n"
+        f"SELECT {', '.join(columns)}\n"
         "FROM file\n"
-        "WHERE (\n"
+        f"WHERE system_id in ({', '.join(arguments)})\n"
+        f"AND {bounds[0]} >= %s\n"
+        f"AND {bounds[0]} < %s\n"
+        # ignore the psd values calculated in between the slots
+        # (adaptive mode)
+        f"AND ({minute} - %s) %% %s = 0\n"
+        "AND (\n"
         "   calibrator is not null\n"
         "   OR noise is not null\n"
         ")\n"
-        "AND start >= %s\n"
-        "AND start < %s\n"
     )
 
-    # filter system ids if asked
-    sql_query += (
-        "AND system_id in (%s)\n"
-        % ', '.join(arguments)
-    )
+    sql_args = (bounds[1], bounds[2], start_slot, interval)
 
-    # https://stackoverflow.com/questions/34270918/mysql-select-interval-of-every-2-hours-from-timestamp-column
-    sql_query += (
-        "GROUP BY\n"
-        "   system_id,\n"
-        "   DATE(start),\n"
-        "   HOUR(start),\n"
-        "   MINUTE(start) DIV %s\n"
-    )
+    if min_version is not None:
+        sql_query += "AND psd_version >= %s\n"
+        sql_args += (min_version,)
 
-    cursor.execute(sql_query, tuple(sql_args))
+    if backend == 'sqlite':
+        sql_query = db.to_sqlite(sql_query)
 
-    # structure the data received from the database into a dictionary of
-    # arrays
-    for (sys_id, start, psd_cal, psd_noise) in cursor:
-        if sys_id not in psd:
-            psd[sys_id] = {}
+    return sql_query, tuple(stations) + sql_args
 
-        psd[sys_id][start] = {
-            "noise": psd_noise,
-            "calibrator": psd_cal
-        }
 
-    db.close_connection(cursor, connection)
+def group_by_system(batches):
+    """
+    Function groups batches of psd values by system.
+
+    Parameters
+    ----------
+    batches : iterable
+        batches of system id, start, noise and calibrator arrays
+        (see iter_previous_psd)
+
+    Returns
+    -------
+    dict
+        dictionary where the keys are the system ids and the values
+        dictionaries with the 'start' dates (seconds since the epoch), the
+        'noise' and the 'calibrator' psd values of the system, as arrays
+        ordered by date, only the first value of a system and a date is
+        kept
+    """
+    batches = list(batches)
+    psd = {}
+
+    if not len(batches):
+        return psd
+
+    system_id, start, noise, calibrator = (
+        np.concatenate(column) for column in zip(*batches)
+    )
+    order = np.lexsort((start, system_id))
+
+    # keep one value per system and date
+    keep = np.ones(len(order), dtype=bool)
+    keep[1:] = (
+        (np.diff(system_id[order]) != 0) | (np.diff(start[order]) != 0)
+    )
+    order = order[keep]
+    system_id = system_id[order]
+    sys_ids, first_index = np.unique(system_id, return_index=True)
+    last_index = np.append(first_index[1:], len(system_id))
+
+    for sys_id, first, last in zip(
+        sys_ids.tolist(), first_index, last_index
+    ):
+        index = order[first:last]
+        psd[sys_id] = {
+            'start': start[index],
+            'noise': noise[index],
+            'calibrator': calibrator[index],
+        }
 
     return psd
 
 
-def get_file_by_interval(stations, interval):
+def get_file_by_interval(
+    stations,
+    interval,
+    connection=None,
+    backend=None
+):
     """
     Function gets files that contain the interval passed as argument
     and were produced by one of the systems passed in the stations
@@ -259,6 +898,11 @@ def get_file_by_interval(stations, interval):
     interval : dict
         dict with the start_time and the end_time if the interval as a
         timestamp
+    connection : MySQLConnection, optional
+        open connection to use instead of a new one, by default None
+    backend : str, optional
+        'mysql' or 'sqlite' to read from the local mirror, by default the
+        default backend (see database.get_backend)
 
     Returns
     -------
@@ -266,46 +910,36 @@ def get_file_by_interval(stations, interval):
         dictionary with all the data from the database, structured by
         antenna id and location code
     """
-    arguments = ['%s' for i in range(len(stations))]
-    files = {}
-    connection, cursor = db.get_cursor_connection()
+    return group_files(iter_file_by_interval(
+        stations, interval, connection=connection, backend=backend
+    ))
 
-    # get the files that are contain the interval
-    sql_query = (
-        "SELECT\n"
-        "   location_code,\n"
-        "   antenna,\n"
-        "   precise_start,\n"
-        "   precise_end,\n"
-        "   file.start,\n"
-        "   longitude,\n"
-        "   latitude,\n"
-        "   path\n"
-        "FROM file\n"
-        "JOIN `system` on file.system_id = system.id\n"
-        "JOIN location on system.location_id = location.id\n"
-        "WHERE (\n"
-        "   (\n"
-        "       precise_start <= %(start_time)s\n"
-        "       AND precise_end >= %(start_time)s\n"
-        "   ) OR (\n"
-        "       precise_end >= %(end_time)s\n"
-        "       AND precise_start <= %(end_time)s\n"
-        "   )\n"
-        ")\n"
-    )
 
-    # add the system_id condition
-    where_clause = "AND file.system_id in (%s)\n" % ', '.join(arguments)
-    where_clause = where_clause % tuple(stations)
-    sql_query += where_clause
+def group_files(rows):
+    """
+    Function structures files in a dict where the first layer keys are the
+    location codes and the second key layer the antenna numbers
+    (see get_file_by_interval).
 
-    cursor.execute(sql_query, interval)
+    Parameters
+    ----------
+    rows : iterable
+        files as returned by iter_file_by_interval
+
+    Returns
+    -------
+    dict
+        dictionary with the files, structured by antenna id and location
+        code
+    """
+    files = {}
 
     # structure all the data received from the database in a dictionary
     # where the location codes and teh antennas are the keys
-    for (code, antenna, start, end, date, longitude, latitude, path) in cursor:
-        date = date.replace(tzinfo=timezone.utc)
+    for (
+        code, antenna, start, end, date, longitude, latitude, path
+    ) in rows:
+        date = datetime.fromtimestamp(date, tz=timezone.utc)
         if code not in files.keys():
             files[code] = {
                 'longitude': longitude,
@@ -323,6 +957,410 @@ def get_file_by_interval(stations, interval):
             'file_path': path
         }
 
-    db.close_connection(cursor, connection)
+    return files
+
+
+def iter_file_by_interval(
+    stations,
+    interval,
+    batch_size=1000,
+    connection=None,
+    backend=None
+):
+    """
+    Function streams the files that overlap the interval passed as argument
+    and were produced by one of the systems passed in the stations
+    argument (see get_file_by_interval).
+
+    Parameters
+    ----------
+    stations : list
+        list with the station ids to take files from
+    interval : dict
+        dict with the start_time and the end_time if the interval as a
+        timestamp
+    batch_size : int, optional
+        number of rows fetched at once, by default 1000
+    connection : MySQLConnection, optional
+        open connection to use instead of a new one, by default None
+    backend : str, optional
+        'mysql' or 'sqlite' to read from the local mirror, by default the
+        default backend (see database.get_backend)
+
+    Yields
+    ------
+    tuple
+        location code, antenna, precise start and end (microseconds since
+        the epoch), start (seconds since the epoch), longitude, latitude
+        and path of a file
+    """
+    sql_query, sql_args = get_file_by_interval_query(stations, interval)
+
+    yield from iter_files(
+        sql_query, sql_args, batch_size, connection, backend
+    )
+
+
+def get_file_by_interval_query(stations, interval):
+    """
+    Function builds the query selecting the files that overlap an interval
+    (see iter_file_by_interval). The files cannot start more than
+    MAX_FILE_DURATION before the interval, so the query is a range scan of
+    the (system_id, precise_start, precise_end) index for each system.
+
+    Parameters
+    ----------
+    stations : list
+        list with the station ids to take files from
+    interval : dict
+        dict with the start_time and the end_time if the interval as a
+        timestamp
+
+    Returns
+    -------
+    tuple
+        the query and its arguments
+    """
+    arguments = ['%s' for i in range(len(stations))]
+
+    # get the files that overlap the interval, including the files lying
+    # strictly inside it
+    sql_query = FILE_QUERY + (
+        "WHERE precise_start >= %(min_start_time)s\n"
+        "AND precise_start <= %(end_time)s\n"
+        "AND precise_end >= %(start_time)s\n"
+    )
+
+    # add the system_id condition
+    where_clause = "AND file.system_id in (%s)\n" % ', '.join(arguments)
+    where_clause = where_clause % tuple(stations)
+    sql_query += where_clause
+
+    return sql_query, {
+        **interval,
+        'min_start_time': (
+            interval['start_time']
+            - MAX_FILE_DURATION.total_seconds() * 1000000
+        ),
+    }
+
+
+def iter_file_by_date(
+    stations,
+    start_date,
+    end_date,
+    batch_size=10000,
+    connection=None,
+    backend=None
+):
+    """
+    Function streams the files produced by some systems whose start (the
+    start column, rounded to the minute) lies between 2 dates. It is used to
+    load the files of a whole period at once (see interval_index.FileIndex).
+    The files without precise start or end are skipped.
+
+    Parameters
+    ----------
+    stations : list
+        list with the station ids to take files from
+    start_date : datetime.datetime
+        date from which to take files
+    end_date : datetime.datetime
+        date upto which to take files
+    batch_size : int, optional
+        number of rows fetched at once, by default 10000
+    connection : MySQLConnection, optional
+        open connection to use instead of a new one, by default None
+    backend : str, optional
+        'mysql' or 'sqlite' to read from the local mirror, by default the
+        default backend (see database.get_backend)
+
+    Yields
+    ------
+    tuple
+        system id of the file followed by the columns of
+        iter_file_by_interval
+    """
+    arguments = ['%s' for i in range(len(stations))]
+    backend = db.get_backend(backend, connection)
+    sql_args = [
+        start_date.strftime('%Y-%m-%d %H:%M:%S'),
+        end_date.strftime('%Y-%m-%d %H:%M:%S'),
+    ] + list(stations)
+
+    if backend == 'sqlite':
+        sql_args[:2] = [
+            mirror.get_timestamp(date) for date in (start_date, end_date)
+        ]
+
+    sql_query = FILE_QUERY.replace(
+        "SELECT\n", "SELECT\n   file.system_id,\n", 1
+    ) + (
+        "WHERE file.start >= %s\n"
+        "AND file.start <= %s\n"
+        f"AND file.system_id in ({', '.join(arguments)})\n"
+        # files without precise dates (bare rows) cannot overlap an interval
+        "AND precise_start IS NOT NULL\n"
+        "AND precise_end IS NOT NULL\n"
+    )
+
+    yield from iter_files(
+        sql_query, tuple(sql_args), batch_size, connection, backend
+    )
+
+
+def iter_files(sql_query, sql_args, batch_size, connection, backend):
+    """
+    Function executes a query on the files (see FILE_QUERY) and streams its
+    rows.
+
+    Parameters
+    ----------
+    sql_query : str
+        mysql query
+    sql_args : tuple or dict
+        arguments of the query
+    batch_size : int
+        number of rows fetched at once
+    connection : MySQLConnection
+        open connection to use instead of a new one, can be None
+    backend : str
+        'mysql', 'sqlite' or None for the default backend
+
+    Yields
+    ------
+    tuple
+        a row of the query
+    """
+    backend = db.get_backend(backend, connection)
+    if backend == 'sqlite':
+        # the mirror stores the start in seconds since the epoch
+        sql_query = db.to_sqlite(sql_query.replace(
+            "TIMESTAMPDIFF(SECOND, '1970-01-01', file.start)", "file.start"
+        ))
+
+    with db.get_cursor(connection, backend) as (connection, cursor):
+        cursor.execute(sql_query, sql_args)
+
+        try:
+            while True:
+                rows = cursor.fetchmany(batch_size)
+
+                if not len(rows):
+                    break
+
+                yield from rows
+        finally:
+            # the iteration may have been stopped before the last row
+            if getattr(connection, 'unread_result', False):
+                connection.consume_results()
+
+
+def get_new_files(stations, since, connection=None):
+    """
+    Function gets the files produced by the given systems since a given date
+    and for which the psd values have not been calculated yet.
+
+    Parameters
+    ----------
+    stations : list
+        list with the station ids to take files from
+    since : datetime.datetime
+        date from which to take the files
+    connection : MySQLConnection, optional
+        open connection to use instead of a new one, by default None
+
+    Returns
+    -------
+    list
+        list of dictionaries with the system id and the start date of each
+        file, ordered by start date
+    """
+    arguments = ['%s' for i in range(len(stations))]
+    files = []
+
+    # get the files without psd values
+    sql_query = (
+        "SELECT system_id, start\n"
+        "FROM file\n"
+        "WHERE noise is null\n"
+        "AND start >= %s\n"
+    )
+
+    # filter system ids
+    sql_query += (
+        "AND system_id in (%s)\n"
+        % ', '.join(arguments)
+    )
+    sql_query += "ORDER BY start\n"
+
+    with db.get_cursor(connection) as (connection, cursor):
+        cursor.execute(
+            sql_query,
+            tuple([since.strftime('%Y-%m-%d %H:%M')] + stations)
+        )
+
+        for (sys_id, start) in cursor:
+            files.append({
+                'system_id': sys_id,
+                'start': start.replace(tzinfo=timezone.utc),
+            })
+
+    return files
+
+
+def get_stale_filter(stations, version, start_date=None, end_date=None):
+    """
+    Function generates the sql condition selecting the files whose psd
+    values were calculated by an older version of the psd calculation.
+
+    Parameters
+    ----------
+    stations : list
+        list with the station ids to take files from
+    version : int
+        current version of the psd calculation
+    start_date : datetime.datetime, optional
+        date from which to take files, by default None
+    end_date : datetime.datetime, optional
+        date upto which to take files, by default None
+
+    Returns
+    -------
+    tuple
+        the sql condition and its arguments
+    """
+    arguments = ['%s' for i in range(len(stations))]
+    sql_args = [version]
+    sql_query = (
+        "WHERE (\n"
+        "   noise is not null\n"
+        "   OR calibrator is not null\n"
+        ")\n"
+        "AND (\n"
+        "   psd_version is null\n"
+        "   OR psd_version < %s\n"
+        ")\n"
+    )
+
+    if start_date is not None:
+        sql_query += "AND start >= %s\n"
+        sql_args.append(start_date.strftime('%Y-%m-%d %H:%M'))
+
+    if end_date is not None:
+        sql_query += "AND start < %s\n"
+        sql_args.append(end_date.strftime('%Y-%m-%d %H:%M'))
+
+    # filter system ids
+    sql_query += (
+        "AND system_id in (%s)\n"
+        % ', '.join(arguments)
+    )
+
+    return sql_query, sql_args + list(stations)
+
+
+def get_stale_files(
+    stations,
+    version,
+    start_date=None,
+    end_date=None,
+    limit=None,
+    connection=None
+):
+    """
+    Function gets the files whose psd values were calculated by an older
+    version of the psd calculation, the most recent files first.
+
+    Parameters
+    ----------
+    stations : list
+        list with the station ids to take files from
+    version : int
+        current version of the psd calculation
+    start_date : datetime.datetime, optional
+        date from which to take files, by default None
+    end_date : datetime.datetime, optional
+        date upto which to take files, by default None
+    limit : int, optional
+        maximum number of files, by default None (no limit)
+    connection : MySQLConnection, optional
+        open connection to use instead of a new one, by default None
+
+    Returns
+    -------
+    list
+        list of dictionaries with the system id and the start date of each
+        file, ordered from the most recent file
+    """
+    files = []
+
+    where_clause, sql_args = get_stale_filter(
+        stations, version, start_date, end_date
+    )
+    sql_query = (
+        "SELECT system_id, start\n"
+        "FROM file\n"
+        + where_clause
+        + "ORDER BY start DESC\n"
+    )
+
+    if limit is not None:
+        sql_query += "LIMIT %s\n"
+        sql_args.append(limit)
+
+    with db.get_cursor(connection) as (connection, cursor):
+        cursor.execute(sql_query, tuple(sql_args))
+
+        for (sys_id, start) in cursor:
+            files.append({
+                'system_id': sys_id,
+                'start': start.replace(tzinfo=timezone.utc),
+            })
 
     return files
+
+
+def count_stale_files(
+    stations,
+    version,
+    start_date=None,
+    end_date=None,
+    connection=None
+):
+    """
+    Function counts the files whose psd values were calculated by an older
+    version of the psd calculation (see get_stale_files).
+
+    Parameters
+    ----------
+    stations : list
+        list with the station ids to take files from
+    version : int
+        current version of the psd calculation
+    start_date : datetime.datetime, optional
+        date from which to take files, by default None
+    end_date : datetime.datetime, optional
+        date upto which to take files, by default None
+    connection : MySQLConnection, optional
+        open connection to use instead of a new one, by default None
+
+    Returns
+    -------
+    int
+        number of stale files
+    """
+    where_clause, sql_args = get_stale_filter(
+        stations, version, start_date, end_date
+    )
+
+    with db.get_cursor(connection) as (connection, cursor):
+        cursor.execute(
+            "SELECT COUNT(*)\n"
+            "FROM file\n"
+            + where_clause,
+            tuple(sql_args)
+        )
+        (count,) = cursor.fetchone()
+
+    return count
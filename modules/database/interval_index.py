@@ -0,0 +1,198 @@
+import numpy as np
+
+from . import file as fil
+
+
+class FileIndex:
+    """
+    This class is an in-memory index of the files of some systems over a
+    period (typically a day). The precise start and end of the files are
+    stored in numpy arrays sorted by system and start, so the files covering
+    many intervals are found at once with np.searchsorted instead of one
+    database query per interval.
+    """
+    def __init__(self, rows):
+        """
+        Function builds the index.
+
+        Parameters
+        ----------
+        rows : iterable
+            files as returned by file.iter_file_by_date, the files without
+            precise start or end are ignored
+        """
+        rows = [
+            row for row in rows if row[3] is not None and row[4] is not None
+        ]
+        system_id = np.array([row[0] for row in rows], dtype=np.int64)
+        start = np.array([row[3] for row in rows], dtype=np.int64)
+        end = np.array([row[4] for row in rows], dtype=np.int64)
+
+        order = np.lexsort((start, system_id))
+        self.rows = [rows[index][1:] for index in order]
+        self.start = start[order]
+        self.end = end[order]
+        # running maximum of the ends of each system: the files before the
+        # first one reaching an interval start cannot overlap the interval,
+        # even if some files end after the next one
+        self.max_end = np.empty_like(self.end)
+        self.systems = {}
+
+        system_id = system_id[order]
+        sys_ids, first_index = np.unique(system_id, return_index=True)
+        last_index = np.append(first_index[1:], len(system_id))
+
+        for sys_id, first, last in zip(
+            sys_ids.tolist(), first_index, last_index
+        ):
+            self.systems[sys_id] = (first, last)
+            self.max_end[first:last] = np.maximum.accumulate(
+                self.end[first:last]
+            )
+
+    @classmethod
+    def load(
+        cls,
+        stations,
+        start_date,
+        end_date,
+        max_duration=fil.MAX_FILE_DURATION,
+        connection=None,
+        backend=None
+    ):
+        """
+        Function loads the index of the files of some systems with one
+        query.
+
+        Parameters
+        ----------
+        stations : list
+            list with the station ids to take files from
+        start_date : datetime.datetime
+            start of the first interval that will be searched
+        end_date : datetime.datetime
+            end of the last interval that will be searched
+        max_duration : datetime.timedelta, optional
+            maximum duration of a file, files starting that long before
+            start_date (or after end_date, the start column being rounded)
+            are loaded too, by default file.MAX_FILE_DURATION
+        connection : MySQLConnection, optional
+            open connection to use instead of a new one, by default None
+        backend : str, optional
+            'mysql' or 'sqlite' to read from the local mirror, by default
+            the default backend (see database.get_backend)
+
+        Returns
+        -------
+        FileIndex
+            the index
+        """
+        return cls(fil.iter_file_by_date(
+            stations,
+            start_date - max_duration,
+            end_date + max_duration,
+            connection=connection,
+            backend=backend,
+        ))
+
+    def search(self, start_times, end_times, stations=None):
+        """
+        Function finds the files overlapping each interval, i.e. the files
+        with precise_start <= end_time and precise_end >= start_time.
+
+        Parameters
+        ----------
+        start_times : array
+            start of each interval, in microseconds since the epoch
+            (floats are compared exactly upto 2**53)
+        end_times : array
+            end of each interval, in microseconds since the epoch
+        stations : list, optional
+            ids of the systems to search, by default None (all the systems
+            of the index)
+
+        Returns
+        -------
+        list
+            indices of the files (in self.rows) overlapping each interval
+        """
+        start_times = np.asarray(start_times, dtype=np.float64)
+        end_times = np.asarray(end_times, dtype=np.float64)
+        n_intervals = len(start_times)
+
+        if stations is None:
+            stations = self.systems.keys()
+
+        intervals = []
+        indices = []
+
+        for sys_id in stations:
+            if sys_id not in self.systems:
+                continue
+
+            first, last = self.systems[sys_id]
+            # candidates are the files starting before the end of the
+            # interval and after the last file ending before its start
+            low = first + np.searchsorted(
+                self.max_end[first:last], start_times, side='left'
+            )
+            high = first + np.searchsorted(
+                self.start[first:last], end_times, side='right'
+            )
+            counts = np.maximum(high - low, 0)
+
+            if not counts.sum():
+                continue
+
+            interval = np.repeat(np.arange(n_intervals), counts)
+            offset = np.arange(len(interval)) - np.repeat(
+                np.cumsum(counts) - counts, counts
+            )
+            index = np.repeat(low, counts) + offset
+            overlap = self.end[index] >= start_times[interval]
+
+            intervals.append(interval[overlap])
+            indices.append(index[overlap])
+
+        if not len(intervals):
+            return [np.zeros(0, dtype=np.int64) for i in range(n_intervals)]
+
+        intervals = np.concatenate(intervals)
+        indices = np.concatenate(indices)
+        order = np.argsort(intervals, kind='stable')
+
+        return np.split(
+            indices[order],
+            np.cumsum(np.bincount(intervals, minlength=n_intervals))[:-1]
+        )
+
+    def get_files(self, intervals, stations=None):
+        """
+        Function finds the files overlapping each interval and structures
+        them as file.get_file_by_interval does.
+
+        Parameters
+        ----------
+        intervals : list
+            dicts with the start_time and the end_time of each interval, as
+            timestamps in microseconds
+        stations : list, optional
+            ids of the systems to search, by default None (all the systems
+            of the index)
+
+        Returns
+        -------
+        list
+            dictionary of the files of each interval, structured by antenna
+            id and location code
+        """
+        indices = self.search(
+            [interval['start_time'] for interval in intervals],
+            [interval['end_time'] for interval in intervals],
+            stations,
+        )
+
+        return [
+            fil.group_files(self.rows[index] for index in interval_indices)
+            for interval_indices in indices
+        ]
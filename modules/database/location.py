@@ -1,18 +1,25 @@
 from . import database as db
 
 
-def get_location_codes():
+def get_location_codes(connection=None, backend=None):
     """
     Function selects all the different location codes from the
     database and returns them in an array
 
+    Parameters
+    ----------
+    connection : MySQLConnection, optional
+        open connection to use instead of a new one, by default None
+    backend : str, optional
+        'mysql' or 'sqlite' to read from the local mirror, by default the
+        default backend (see database.get_backend)
+
     Returns
     -------
     list
         all the available location codes
     """
     codes = []
-    connection, cursor = db.get_cursor_connection()
 
     # get all the location codes from the location table
     sql_query = (
@@ -20,10 +27,13 @@ def get_location_codes():
         "FROM location"
     )
 
-    cursor.execute(sql_query)
+    backend = db.get_backend(backend, connection)
+
+    with db.get_cursor(connection, backend) as (connection, cursor):
+        cursor.execute(sql_query)
 
-    # store the data received in an array
-    for code in cursor:
-        codes.append(code)
+        # store the data received in an array
+        for code in cursor:
+            codes.append(code)
 
     return codes
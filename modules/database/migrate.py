@@ -0,0 +1,241 @@
+import mysql.connector
+import os
+
+from . import database as db
+from . import file as fil
+from datetime import datetime, timedelta, timezone
+
+
+# directory of the .sql migration scripts, applied in the order of their name
+MIGRATIONS_DIRECTORY = os.path.join(os.path.dirname(__file__), 'migrations')
+
+# errors of statements that were already applied by hand (duplicate column
+# and duplicate index name)
+ALREADY_APPLIED_ERRORS = (1060, 1061)
+
+# indexes the read queries are expected to use
+QUERY_INDEXES = {
+    'previous psd': ('file_system_minute',),
+    'file by interval': ('file_system_precise',),
+}
+
+
+def get_migrations(directory=MIGRATIONS_DIRECTORY):
+    """
+    Function lists the migration scripts.
+
+    Parameters
+    ----------
+    directory : str, optional
+        directory of the scripts, by default MIGRATIONS_DIRECTORY
+
+    Returns
+    -------
+    list
+        names of the .sql scripts, in the order they have to be applied
+    """
+    return sorted(
+        name for name in os.listdir(directory) if name.endswith('.sql')
+    )
+
+
+def get_statements(path):
+    """
+    Function reads the statements of a migration script. Comment lines are
+    ignored and the statements are separated by semicolons.
+
+    Parameters
+    ----------
+    path : str
+        path of the script
+
+    Returns
+    -------
+    list
+        the statements of the script
+    """
+    with open(path, 'r') as script:
+        lines = [
+            line for line in script
+            if not line.strip().startswith('--')
+        ]
+
+    return [
+        statement.strip()
+        for statement in ''.join(lines).split(';')
+        if statement.strip()
+    ]
+
+
+def get_applied(cursor):
+    """
+    Function reads the names of the applied migrations, the table keeping
+    them is created if needed.
+
+    Parameters
+    ----------
+    cursor : MySQLCursor
+        cursor on the database
+
+    Returns
+    -------
+    set
+        names of the applied scripts
+    """
+    cursor.execute(
+        "CREATE TABLE IF NOT EXISTS schema_migration (\n"
+        "   name VARCHAR(255) NOT NULL PRIMARY KEY,\n"
+        "   applied_at DATETIME NOT NULL\n"
+        ")"
+    )
+    cursor.execute("SELECT name FROM schema_migration")
+
+    return {name for (name,) in cursor}
+
+
+def apply_migrations(
+    directory=MIGRATIONS_DIRECTORY,
+    dry_run=False,
+    connection=None
+):
+    """
+    Function applies the migration scripts that were not applied yet.
+    Statements failing because their column or index already exists (a
+    script applied by hand before the runner existed) are skipped.
+
+    Parameters
+    ----------
+    directory : str, optional
+        directory of the scripts, by default MIGRATIONS_DIRECTORY
+    dry_run : bool, optional
+        only list the scripts that would be applied, by default False
+    connection : MySQLConnection, optional
+        open connection to use instead of a new one, by default None
+
+    Returns
+    -------
+    list
+        names of the scripts applied (or to apply with dry_run)
+    """
+    with db.get_cursor(connection) as (connection, cursor):
+        applied = get_applied(cursor)
+        pending = [
+            name for name in get_migrations(directory) if name not in applied
+        ]
+
+        if dry_run:
+            return pending
+
+        for name in pending:
+            print(f'Applying {name}...')
+
+            for statement in get_statements(os.path.join(directory, name)):
+                try:
+                    cursor.execute(statement)
+                except mysql.connector.Error as e:
+                    if e.errno not in ALREADY_APPLIED_ERRORS:
+                        connection.rollback()
+                        raise
+
+                    print(f'    skipped, already applied: {e.msg}')
+
+            cursor.execute(
+                "INSERT INTO schema_migration (name, applied_at)\n"
+                "VALUES (%s, %s)",
+                (name, datetime.now(tz=timezone.utc).replace(tzinfo=None))
+            )
+            connection.commit()
+
+    # the columns and the keys of the tables may have changed
+    db.table_columns.clear()
+    db.table_unique_keys.clear()
+
+    return pending
+
+
+def explain(sql_query, sql_args, connection=None):
+    """
+    Function gets the execution plan of a query.
+
+    Parameters
+    ----------
+    sql_query : str
+        the query
+    sql_args : tuple or dict
+        arguments of the query
+    connection : MySQLConnection, optional
+        open connection to use instead of a new one, by default None
+
+    Returns
+    -------
+    list
+        one dictionary per table of the plan, with the EXPLAIN columns as
+        keys
+    """
+    with db.get_cursor(connection) as (connection, cursor):
+        cursor.execute(f'EXPLAIN {sql_query}', sql_args)
+        columns = cursor.column_names
+
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def check_indexes(n_systems=5, days=7, interval=60, connection=None):
+    """
+    Function checks with EXPLAIN that the psd history and the file
+    interval queries read the file table through their index instead of
+    scanning it.
+
+    Parameters
+    ----------
+    n_systems : int, optional
+        number of systems of the checked queries, by default 5
+    days : int, optional
+        history length of the psd history query, by default 7
+    interval : int, optional
+        interval of the psd history query in minutes, by default 60
+    connection : MySQLConnection, optional
+        open connection to use instead of a new one, by default None
+
+    Returns
+    -------
+    dict
+        for each query, a tuple with a boolean (True if the file table is
+        read through one of the expected indexes) and its plan
+    """
+    with db.get_cursor(connection) as (system_connection, cursor):
+        cursor.execute(f"SELECT id FROM `system` LIMIT {int(n_systems)}")
+        stations = [sys_id for (sys_id,) in cursor]
+        start_minute = db.has_column(
+            'file', 'start_minute', system_connection
+        )
+
+    end_date = datetime.now(tz=timezone.utc)
+    detection_time = (end_date - timedelta(days=1)).timestamp() * 1000000
+    queries = {
+        'previous psd': fil.get_previous_psd_query(
+            stations,
+            end_date - timedelta(days=days),
+            end_date,
+            interval,
+            start_minute=start_minute,
+        ),
+        'file by interval': fil.get_file_by_interval_query(stations, {
+            'start_time': detection_time - 3000000,
+            'end_time': detection_time + 3000000,
+        }),
+    }
+    results = {}
+
+    for name, (sql_query, sql_args) in queries.items():
+        plan = explain(sql_query, sql_args, connection)
+        file_plan = [row for row in plan if row.get('table') == 'file']
+        results[name] = (
+            bool(file_plan) and all(
+                row.get('key') in QUERY_INDEXES[name]
+                and row.get('type') != 'ALL'
+                for row in file_plan
+            ),
+            plan,
+        )
+
+    return results
@@ -0,0 +1,13 @@
+-- Stores the version of the psd calculation (modules/psd/psd.py PSD_VERSION)
+-- with the noise and calibrator psd values of each file.
+ALTER TABLE file
+    ADD COLUMN psd_version SMALLINT UNSIGNED NULL DEFAULT NULL;
+
+-- the values stored before this migration were calculated by version 1
+UPDATE file
+SET psd_version = 1
+WHERE noise IS NOT NULL
+OR calibrator IS NOT NULL;
+
+-- stale values are searched by version, newest first
+CREATE INDEX file_psd_version ON file (psd_version, start);
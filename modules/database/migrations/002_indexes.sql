@@ -0,0 +1,17 @@
+-- Start of each file in minutes since the epoch, the psd history is
+-- selected slot by slot with integer arithmetic on this column
+-- (file.get_previous_psd_query) instead of DATE_FORMAT and GROUP BY.
+ALTER TABLE file
+    ADD COLUMN start_minute INT UNSIGNED
+        AS (TIMESTAMPDIFF(MINUTE, '1970-01-01 00:00:00', start)) STORED;
+
+-- psd history of some systems between 2 dates
+CREATE INDEX file_system_minute ON file (system_id, start_minute);
+
+-- files of some systems by date (get_new_files, psd updates, FileIndex)
+CREATE INDEX file_system_start ON file (system_id, start);
+
+-- files of some systems overlapping a detection time
+-- (file.get_file_by_interval_query)
+CREATE INDEX file_system_precise
+    ON file (system_id, precise_start, precise_end);
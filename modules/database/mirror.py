@@ -0,0 +1,366 @@
+import sqlite3
+import time
+
+from . import database as db
+from datetime import datetime, timedelta, timezone
+
+
+# columns of the mirrored tables, in the order they are selected from mysql
+LOCATION_COLUMNS = ('id', 'location_code', 'longitude', 'latitude')
+SYSTEM_COLUMNS = ('id', 'location_id', 'antenna')
+FILE_COLUMNS = (
+    'id',
+    'system_id',
+    'start',
+    'precise_start',
+    'precise_end',
+    'path',
+    'noise',
+    'calibrator',
+    'psd_version',
+)
+
+
+def get_connection(path='brams_mirror.db'):
+    """
+    Function opens the local mirror of the system, location and file tables
+    and creates its tables and indexes if needed. The start of the files is
+    stored in seconds since the epoch.
+
+    Parameters
+    ----------
+    path : str, optional
+        path of the sqlite file, by default 'brams_mirror.db'
+
+    Returns
+    -------
+    sqlite3.Connection
+        connection to the mirror
+    """
+    connection = sqlite3.connect(path)
+
+    connection.executescript(
+        "CREATE TABLE IF NOT EXISTS location (\n"
+        "   id INTEGER PRIMARY KEY,\n"
+        "   location_code TEXT NOT NULL,\n"
+        "   longitude REAL,\n"
+        "   latitude REAL\n"
+        ");\n"
+        "CREATE TABLE IF NOT EXISTS `system` (\n"
+        "   id INTEGER PRIMARY KEY,\n"
+        "   location_id INTEGER NOT NULL,\n"
+        "   antenna INTEGER NOT NULL\n"
+        ");\n"
+        "CREATE TABLE IF NOT EXISTS file (\n"
+        "   id INTEGER PRIMARY KEY,\n"
+        "   system_id INTEGER NOT NULL,\n"
+        "   start INTEGER NOT NULL,\n"
+        "   precise_start INTEGER,\n"
+        "   precise_end INTEGER,\n"
+        "   path TEXT,\n"
+        "   noise REAL,\n"
+        "   calibrator REAL,\n"
+        "   psd_version INTEGER\n"
+        ");\n"
+        "CREATE TABLE IF NOT EXISTS mirror_state (\n"
+        "   name TEXT PRIMARY KEY,\n"
+        "   value TEXT\n"
+        ");\n"
+        # indexes of the read paths: location codes to system ids, psd
+        # history by system and date, files containing an interval
+        "CREATE INDEX IF NOT EXISTS location_code_index\n"
+        "   ON location (location_code);\n"
+        "CREATE INDEX IF NOT EXISTS system_location_index\n"
+        "   ON `system` (location_id);\n"
+        "CREATE INDEX IF NOT EXISTS file_start_index\n"
+        "   ON file (system_id, start);\n"
+        "CREATE INDEX IF NOT EXISTS file_precise_index\n"
+        "   ON file (system_id, precise_start, precise_end);\n"
+        "CREATE INDEX IF NOT EXISTS file_date_index\n"
+        "   ON file (start);\n"
+    )
+
+    return connection
+
+
+def get_timestamp(date):
+    """
+    Function converts a date to seconds since the epoch, naive dates are
+    considered to be in UTC (as the dates of the database).
+
+    Parameters
+    ----------
+    date : datetime.datetime
+        the date
+
+    Returns
+    -------
+    int
+        seconds since the epoch
+    """
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+
+    return int(date.timestamp())
+
+
+def get_state(connection):
+    """
+    Function reads the state of the last synchronisation of the mirror.
+
+    Parameters
+    ----------
+    connection : sqlite3.Connection
+        connection to the mirror
+
+    Returns
+    -------
+    dict
+        last mirrored file id ('file_id'), date bounds ('start_date' and
+        'end_date', empty strings when unbounded) and date of the last
+        synchronisation ('synced_at'), missing if the mirror was never
+        synchronised
+    """
+    return dict(connection.execute("SELECT name, value FROM mirror_state"))
+
+
+def replace_rows(connection, table, columns, rows):
+    """
+    Function inserts or replaces rows of a mirrored table.
+
+    Parameters
+    ----------
+    connection : sqlite3.Connection
+        connection to the mirror
+    table : str
+        name of the table
+    columns : tuple
+        names of the columns of the rows
+    rows : list
+        rows to store
+
+    Returns
+    -------
+    int
+        number of rows stored
+    """
+    connection.executemany(
+        f"INSERT OR REPLACE INTO `{table}` ({', '.join(columns)})\n"
+        f"VALUES ({', '.join('?' for column in columns)})",
+        rows
+    )
+
+    return len(rows)
+
+
+def sync_files(
+    mirror,
+    cursor,
+    where_clause,
+    sql_args,
+    batch_size,
+    versioned=True
+):
+    """
+    Function copies the files selected by a where clause from mysql to the
+    mirror, in batches.
+
+    Parameters
+    ----------
+    mirror : sqlite3.Connection
+        connection to the mirror
+    cursor : MySQLCursor
+        cursor on the mysql database
+    where_clause : str
+        where clause selecting the files
+    sql_args : list
+        arguments of the where clause
+    batch_size : int
+        number of rows fetched and stored at once
+    versioned : bool, optional
+        wether the file table has the psd_version column (see
+        migrations/001_psd_version.sql), the versions are unknown
+        otherwise, by default True
+
+    Returns
+    -------
+    int
+        number of files copied
+    """
+    psd_version = 'psd_version' if versioned else 'NULL'
+    sql_query = (
+        "SELECT\n"
+        "   id,\n"
+        "   system_id,\n"
+        "   TIMESTAMPDIFF(SECOND, '1970-01-01', start),\n"
+        "   precise_start,\n"
+        "   precise_end,\n"
+        "   path,\n"
+        "   noise,\n"
+        "   calibrator,\n"
+        f"   {psd_version}\n"
+        "FROM file\n"
+        f"{where_clause}"
+    )
+    count = 0
+    cursor.execute(sql_query, tuple(sql_args))
+
+    while True:
+        rows = cursor.fetchmany(batch_size)
+
+        if not len(rows):
+            break
+
+        # sqlite does not store decimals
+        count += replace_rows(mirror, 'file', FILE_COLUMNS, [
+            row[:6] + tuple(
+                None if value is None else float(value)
+                for value in row[6:8]
+            ) + row[8:]
+            for row in rows
+        ])
+        mirror.commit()
+
+    return count
+
+
+def sync(
+    path='brams_mirror.db',
+    start_date=None,
+    end_date=None,
+    refresh_days=2,
+    batch_size=10000,
+    connection=None
+):
+    """
+    Function synchronises the local mirror with the mysql database. The
+    location and system tables are copied entirely. The files are copied
+    incrementally: only the files with an id above the last mirrored one
+    are fetched, together with the files of the last 'refresh_days' days
+    whose psd values may have been calculated since the last
+    synchronisation. Only the files between start_date and end_date are
+    mirrored, changing these bounds restarts the synchronisation of the
+    files.
+
+    Parameters
+    ----------
+    path : str, optional
+        path of the sqlite file, by default 'brams_mirror.db'
+    start_date : datetime.datetime, optional
+        date from which files are mirrored, by default None (no bound)
+    end_date : datetime.datetime, optional
+        date upto which files are mirrored, by default None (no bound)
+    refresh_days : int, optional
+        number of days of files copied again on each synchronisation,
+        by default 2
+    batch_size : int, optional
+        number of files fetched and stored at once, by default 10000
+    connection : MySQLConnection, optional
+        open connection to use instead of a new one, by default None
+
+    Returns
+    -------
+    dict
+        number of 'locations', 'systems', 'new_files' and
+        'refreshed_files' copied and the 'duration' in seconds
+    """
+    sync_start = time.monotonic()
+    mirror = get_connection(path)
+    state = get_state(mirror)
+    bounds = {
+        'start_date': get_timestamp(start_date) if start_date else '',
+        'end_date': get_timestamp(end_date) if end_date else '',
+    }
+    counts = {}
+
+    # the mirrored files do not match the new bounds, start over
+    if any(
+        str(value) != state.get(name, str(value))
+        for name, value in bounds.items()
+    ):
+        mirror.execute("DELETE FROM file")
+        state['file_id'] = 0
+
+    last_id = int(state.get('file_id', 0))
+    bound_clause = ''
+    bound_args = []
+    for name, operator in (('start_date', '>='), ('end_date', '<')):
+        if bounds[name] != '':
+            bound_clause += f"AND start {operator} %s\n"
+            bound_args.append(
+                datetime.fromtimestamp(bounds[name], tz=timezone.utc)
+                .strftime('%Y-%m-%d %H:%M:%S')
+            )
+
+    refresh_date = datetime.now(tz=timezone.utc) - timedelta(refresh_days)
+
+    try:
+        with db.get_cursor(connection) as (connection, cursor):
+            # the location and system tables are small
+            cursor.execute(
+                f"SELECT {', '.join(LOCATION_COLUMNS)} FROM location"
+            )
+            locations = [
+                row[:2] + tuple(
+                    None if value is None else float(value)
+                    for value in row[2:]
+                )
+                for row in cursor.fetchall()
+            ]
+            cursor.execute(
+                f"SELECT {', '.join(SYSTEM_COLUMNS)} FROM `system`"
+            )
+            systems = cursor.fetchall()
+
+            mirror.execute("DELETE FROM location")
+            mirror.execute("DELETE FROM `system`")
+            counts['locations'] = replace_rows(
+                mirror, 'location', LOCATION_COLUMNS, locations
+            )
+            counts['systems'] = replace_rows(
+                mirror, 'system', SYSTEM_COLUMNS, systems
+            )
+            mirror.commit()
+
+            # max id before copying, files added during the copy are
+            # fetched on the next synchronisation
+            cursor.execute("SELECT COALESCE(MAX(id), 0) FROM file")
+            max_id = cursor.fetchone()[0]
+            versioned = db.has_column('file', 'psd_version', connection)
+
+            counts['new_files'] = sync_files(
+                mirror,
+                cursor,
+                "WHERE id > %s\nAND id <= %s\n" + bound_clause,
+                [last_id, max_id] + bound_args,
+                batch_size,
+                versioned,
+            )
+            # the file table has no modification date, the psd values are
+            # calculated after the files are added so the recent files are
+            # copied again
+            counts['refreshed_files'] = sync_files(
+                mirror,
+                cursor,
+                "WHERE start >= %s\nAND id <= %s\n" + bound_clause,
+                [refresh_date.strftime('%Y-%m-%d %H:%M:%S'), max_id]
+                + bound_args,
+                batch_size,
+                versioned,
+            )
+
+        state = {
+            'file_id': max_id,
+            'synced_at': datetime.now(tz=timezone.utc).isoformat(),
+            **bounds,
+        }
+        replace_rows(mirror, 'mirror_state', ('name', 'value'), [
+            (name, str(value)) for name, value in state.items()
+        ])
+        mirror.commit()
+    finally:
+        mirror.close()
+
+    counts['duration'] = time.monotonic() - sync_start
+
+    return counts
@@ -0,0 +1,392 @@
+import numpy as np
+import os
+
+from .file import group_by_system
+from .mirror import get_timestamp
+from datetime import datetime, timezone
+
+
+class PsdCache:
+    """
+    This class is a local, columnar copy of the psd values of the file
+    table. It stores the system id, the date (in minutes since the epoch),
+    the noise and the calibrator psd and the version of the psd calculation
+    of each file in numpy arrays, together with the range of dates covered
+    for each system: the dates between which the psd values of that system
+    were fetched from the database. This way only the psd values outside of
+    that range, and the values of an older version that may have been
+    recalculated since, have to be fetched again.
+    The covered range of a system starts at a slot of the run that fetched
+    it, the slots of a run asking for other slots (a start date that is not
+    a whole number of intervals away) replace the cached values of the
+    system.
+    """
+    def __init__(self, path, interval, version):
+        """
+        Function loads the cache if it exists. Cache files without covered
+        ranges (written by older versions) are ignored.
+
+        Parameters
+        ----------
+        path : str
+            path of the .npz cache file
+        interval : int
+            interval in minutes between the cached psd values
+        version : int
+            current version of the psd calculation (see psd.PSD_VERSION)
+        """
+        self.path = path
+        self.interval = interval
+        self.version = version
+        self.system_id = np.zeros(0, dtype=np.int64)
+        self.slot = np.zeros(0, dtype=np.int64)
+        self.noise = np.zeros(0, dtype=np.float64)
+        self.calibrator = np.zeros(0, dtype=np.float64)
+        self.psd_version = np.zeros(0, dtype=np.int64)
+        # first slot and end slot (excluded) of each system
+        self.ranges = {}
+
+        if os.path.isfile(path):
+            with np.load(path) as data:
+                if 'range_system' in data:
+                    self.system_id = data['system_id']
+                    self.slot = data['slot']
+                    self.noise = data['noise']
+                    self.calibrator = data['calibrator']
+                    self.psd_version = data['psd_version']
+                    self.ranges = {
+                        sys_id: (first, end)
+                        for sys_id, first, end in zip(
+                            data['range_system'].tolist(),
+                            data['range_first'].tolist(),
+                            data['range_end'].tolist(),
+                        )
+                    }
+
+    def align(self, sys_id, slot):
+        """
+        Function rounds a slot up to the next slot of the covered range of a
+        system.
+
+        Parameters
+        ----------
+        sys_id : int
+            id of the system
+        slot : int
+            date in minutes since the epoch
+
+        Returns
+        -------
+        int
+            first slot of the system from the given slot
+        """
+        first = self.ranges[sys_id][0]
+
+        return slot + (first - slot) % self.interval
+
+    def get_gaps(self, sys_id, start_date, end_date):
+        """
+        Function finds the dates between which the psd values of a system
+        are missing from the cache. The cached values of the system are
+        removed if their slots do not match the slots starting at
+        start_date, or if the covered range cannot be extended to the
+        requested one without leaving a hole.
+
+        Parameters
+        ----------
+        sys_id : int
+            id of the system
+        start_date : datetime.datetime
+            date of the first requested slot
+        end_date : datetime.datetime
+            date upto which psd values are requested
+
+        Returns
+        -------
+        list
+            start and end dates of the ranges to fetch, each starting at a
+            requested slot
+        """
+        start = get_slot(start_date)
+        end = get_slot(end_date)
+
+        if sys_id in self.ranges:
+            first, last = self.ranges[sys_id]
+
+            if (
+                (first - start) % self.interval
+                or end < first
+                or start > last
+            ):
+                self.remove(sys_id)
+
+        if sys_id not in self.ranges:
+            return [(start_date, end_date)] if start < end else []
+
+        first, last = self.ranges[sys_id]
+        gaps = []
+
+        if start < first:
+            gaps.append((start, first))
+
+        last = self.align(sys_id, last)
+        if last < end:
+            gaps.append((last, end))
+
+        return [
+            (get_date(gap_start), get_date(gap_end))
+            for gap_start, gap_end in gaps
+        ]
+
+    def get_stale_range(self, sys_id, start_date, end_date):
+        """
+        Function finds the dates between which the cached psd values of a
+        system were calculated by an older version of the psd calculation,
+        they may have been recalculated since they were fetched.
+
+        Parameters
+        ----------
+        sys_id : int
+            id of the system
+        start_date : datetime.datetime
+            date of the first requested slot
+        end_date : datetime.datetime
+            date upto which psd values are requested
+
+        Returns
+        -------
+        tuple or None
+            start date (a slot of the system) and end date of the stale
+            values, None if there are none
+        """
+        if sys_id not in self.ranges:
+            return None
+
+        stale = (
+            (self.system_id == sys_id)
+            & (self.psd_version < self.version)
+            & (self.slot >= get_slot(start_date))
+            & (self.slot < get_slot(end_date))
+        )
+
+        if not stale.any():
+            return None
+
+        slots = self.slot[stale]
+
+        return get_date(slots.min()), get_date(slots.max() + 1)
+
+    def extend(self, sys_id, start_date, end_date):
+        """
+        Function extends the covered range of a system once its missing psd
+        values were added (see get_gaps).
+
+        Parameters
+        ----------
+        sys_id : int
+            id of the system
+        start_date : datetime.datetime
+            date of the first requested slot
+        end_date : datetime.datetime
+            date upto which psd values were fetched
+        """
+        start = get_slot(start_date)
+        end = get_slot(end_date)
+
+        if sys_id in self.ranges:
+            first, last = self.ranges[sys_id]
+            start, end = min(start, first), max(end, last)
+
+        self.ranges[sys_id] = (start, end)
+
+    def add(self, batches):
+        """
+        Function adds psd values to the cache. Values that are already in the
+        cache for the same system and date are replaced. All the batches are
+        merged with the cached values at once.
+
+        Parameters
+        ----------
+        batches : iterable
+            batches of system id, date, noise, calibrator and psd version
+            arrays. The dates are 'YYYY-MM-DD hh:mm' strings or
+            np.datetime64 values, the unknown psd values are None or nan
+            and the unknown versions 0.
+        """
+        batches = [batch for batch in batches if len(batch[0])]
+
+        if not len(batches):
+            return
+
+        system_id = np.concatenate([self.system_id] + [
+            np.array(batch[0], dtype=np.int64) for batch in batches
+        ])
+        slot = np.concatenate([self.slot] + [
+            np.array(batch[1], dtype='datetime64[m]').astype(np.int64)
+            for batch in batches
+        ])
+        noise = np.concatenate([self.noise] + [
+            np.array(batch[2], dtype=float) for batch in batches
+        ])
+        calibrator = np.concatenate([self.calibrator] + [
+            np.array(batch[3], dtype=float) for batch in batches
+        ])
+        psd_version = np.concatenate([self.psd_version] + [
+            np.array(batch[4], dtype=np.int64) for batch in batches
+        ])
+
+        # keep the last value of each system and date
+        keys = (system_id << 32) + slot
+        unique_keys, reversed_index = np.unique(
+            keys[::-1], return_index=True
+        )
+        index = len(keys) - 1 - reversed_index
+
+        self.system_id = system_id[index]
+        self.slot = slot[index]
+        self.noise = noise[index]
+        self.calibrator = calibrator[index]
+        self.psd_version = psd_version[index]
+
+    def get(self, stations, start_date, end_date):
+        """
+        Function gets the cached psd values between 2 dates.
+
+        Parameters
+        ----------
+        stations : list
+            list with all the station ids to take psd values from
+        start_date : datetime.datetime
+            date from which to take psd values
+        end_date : datetime.datetime
+            date upto which to take psd values
+
+        Returns
+        -------
+        dict
+            psd values of each system as arrays ordered by date, as
+            returned by file.get_previous_all_psd
+        """
+        selected = (
+            np.isin(self.system_id, list(stations))
+            & (self.slot >= get_slot(start_date))
+            & (self.slot < get_slot(end_date))
+        )
+
+        return group_by_system([(
+            self.system_id[selected],
+            self.slot[selected] * 60,
+            self.noise[selected],
+            self.calibrator[selected],
+        )])
+
+    def keep(self, kept):
+        """
+        Function keeps some of the cached psd values.
+
+        Parameters
+        ----------
+        kept : np.array
+            boolean array, True for the values to keep
+        """
+        self.system_id = self.system_id[kept]
+        self.slot = self.slot[kept]
+        self.noise = self.noise[kept]
+        self.calibrator = self.calibrator[kept]
+        self.psd_version = self.psd_version[kept]
+
+    def remove(self, sys_id):
+        """
+        Function removes the psd values and the covered range of a system.
+
+        Parameters
+        ----------
+        sys_id : int
+            id of the system
+        """
+        self.keep(self.system_id != sys_id)
+        self.ranges.pop(sys_id, None)
+
+    def prune(self, before):
+        """
+        Function removes the psd values older than a given date, the covered
+        ranges start at the first remaining slot.
+
+        Parameters
+        ----------
+        before : datetime.datetime
+            date before which the psd values are removed
+        """
+        before = get_slot(before)
+
+        self.keep(self.slot >= before)
+
+        for sys_id, (first, end) in list(self.ranges.items()):
+            first = max(first, self.align(sys_id, before))
+
+            if first < end:
+                self.ranges[sys_id] = (first, end)
+            else:
+                del self.ranges[sys_id]
+
+    def save(self):
+        """
+        Function stores the cache in its file.
+        """
+        # np.savez adds the .npz extension if it is missing
+        tmp_path = f'{self.path}.tmp.npz'
+        sys_ids = list(self.ranges.keys())
+
+        np.savez(
+            tmp_path,
+            system_id=self.system_id,
+            slot=self.slot,
+            noise=self.noise,
+            calibrator=self.calibrator,
+            psd_version=self.psd_version,
+            range_system=np.array(sys_ids, dtype=np.int64),
+            range_first=np.array(
+                [self.ranges[sys_id][0] for sys_id in sys_ids],
+                dtype=np.int64
+            ),
+            range_end=np.array(
+                [self.ranges[sys_id][1] for sys_id in sys_ids],
+                dtype=np.int64
+            ),
+        )
+        os.replace(tmp_path, self.path)
+
+
+def get_slot(date):
+    """
+    Function converts a date to minutes since the epoch, the seconds are
+    ignored and naive dates are considered to be in UTC.
+
+    Parameters
+    ----------
+    date : datetime.datetime
+        the date
+
+    Returns
+    -------
+    int
+        minutes since the epoch
+    """
+    return get_timestamp(date) // 60
+
+
+def get_date(slot):
+    """
+    Function converts minutes since the epoch to a date.
+
+    Parameters
+    ----------
+    slot : int
+        minutes since the epoch
+
+    Returns
+    -------
+    datetime.datetime
+        the date, in UTC
+    """
+    return datetime.fromtimestamp(int(slot) * 60, tz=timezone.utc)
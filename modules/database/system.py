@@ -1,7 +1,12 @@
 from . import database as db
 
 
-def get_station_ids(stations=[], get_all=True):
+def get_station_ids(
+    stations=[],
+    get_all=True,
+    connection=None,
+    backend=None
+):
     """
     Function receives location codes ('BEHAAC', 'BEGRIM', ...) as argument
     and returns the system_id(s) it finds for a location code (i.e. suppose
@@ -21,6 +26,11 @@ def get_station_ids(stations=[], get_all=True):
         determines wether to get all the station ids or only to get those
         that are part of the location_codes specified in the 'stations'
         array
+    connection : MySQLConnection, optional
+        open connection to use instead of a new one, by default None
+    backend : str, optional
+        'mysql' or 'sqlite' to read from the local mirror, by default the
+        default backend (see database.get_backend)
 
     Returns
     -------
@@ -31,7 +41,6 @@ def get_station_ids(stations=[], get_all=True):
     """
     arguments = ['%s' for i in range(len(stations))]
     ids = {}
-    connection, cursor = db.get_cursor_connection()
 
     # get system_id for each location and antenna
     sql_query = (
@@ -46,15 +55,18 @@ def get_station_ids(stations=[], get_all=True):
             % ', '.join(arguments)
         )
 
-    cursor.execute(sql_query, tuple(stations))
+    backend = db.get_backend(backend, connection)
+    if backend == 'sqlite':
+        sql_query = db.to_sqlite(sql_query)
 
-    # structure the system id's first by location code and then by antenna
-    for (sys_id, loc_code, antenna) in cursor:
-        if loc_code not in ids:
-            ids[loc_code] = {}
+    with db.get_cursor(connection, backend) as (connection, cursor):
+        cursor.execute(sql_query, tuple(stations))
 
-        ids[loc_code][str(antenna)] = sys_id
+        # structure the system id's first by location code and then by antenna
+        for (sys_id, loc_code, antenna) in cursor:
+            if loc_code not in ids:
+                ids[loc_code] = {}
 
-    db.close_connection(connection, cursor)
+            ids[loc_code][str(antenna)] = sys_id
 
     return ids
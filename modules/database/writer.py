@@ -0,0 +1,325 @@
+import mysql.connector
+import queue
+import threading
+import time
+
+from . import file as f
+
+
+class PsdWriter:
+    """
+    This class stores psd values into the database from a background thread.
+    Psd values are pushed to a bounded queue as soon as they are calculated
+    and the background thread stores them by batches, this way the database
+    latency overlaps with the psd calculation.
+    A batch is stored when it reaches a given size or when a given time has
+    passed since the previous flush. Failed flushes are retried with an
+    exponential backoff. If the background thread stops because of an
+    unexpected error, the values it did not store are moved to failed_rows
+    and push(), checkpoint() and drain() raise a RuntimeError.
+    """
+    def __init__(
+        self,
+        batch_size=500,
+        flush_interval=30.0,
+        max_queue=5000,
+        max_retries=5,
+        backoff=1.0,
+        on_checkpoint=None,
+        strategy='update',
+    ):
+        """
+        Function prepares the writer and starts its background thread.
+
+        Parameters
+        ----------
+        batch_size : int, optional
+            number of psd values stored at once, by default 500
+        flush_interval : float, optional
+            maximum number of seconds a psd value waits before being
+            stored, by default 30.0
+        max_queue : int, optional
+            maximum number of psd values waiting in the queue, pushing to a
+            full queue blocks until there is place, by default 5000
+        max_retries : int, optional
+            number of times a failed flush is retried, by default 5
+        backoff : float, optional
+            seconds to wait before the first retry, this value doubles
+            with each retry, by default 1.0
+        on_checkpoint : callable, optional
+            function called with the state given to checkpoint() once all
+            the values pushed before it are stored, by default None
+        strategy : str, optional
+            way the batches are stored (see file.insert_psd),
+            by default 'update'
+        """
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.on_checkpoint = on_checkpoint
+        self.strategy = strategy
+
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.failed_rows = []
+        self.error = None
+        self.rows_written = 0
+        self.flush_count = 0
+        self.flush_latencies = []
+        self.max_queue_depth = 0
+
+        self.thread = threading.Thread(target=self.__run, daemon=True)
+        self.thread.start()
+
+    def push(self, row):
+        """
+        Function adds a psd value to the queue of values to store. It blocks
+        if the queue is full.
+
+        Parameters
+        ----------
+        row : dict
+            psd value with its system_id and time (see file.insert_psd)
+
+        Raises
+        ------
+        RuntimeError
+            if the background thread is not running anymore
+        """
+        self.__put(('row', row))
+        self.max_queue_depth = max(self.max_queue_depth, self.queue.qsize())
+
+    def checkpoint(self, state):
+        """
+        Function asks the writer to call on_checkpoint(state) as soon as all
+        the values pushed before this call are stored in the database. The
+        callback is not called anymore once a flush failed.
+
+        Parameters
+        ----------
+        state : object
+            state to give to the on_checkpoint function
+
+        Raises
+        ------
+        RuntimeError
+            if the background thread is not running anymore
+        """
+        self.__put(('checkpoint', state))
+
+    def drain(self):
+        """
+        Function stores all the remaining values and stops the background
+        thread.
+
+        Returns
+        -------
+        boolean
+            True if all the values were stored, False otherwise
+
+        Raises
+        ------
+        RuntimeError
+            if the background thread stopped because of an unexpected error
+        """
+        self.__put(('stop', None))
+        self.thread.join()
+        self.__check_running(self.error is None)
+
+        return not len(self.failed_rows)
+
+    def __check_running(self, running=None):
+        """
+        Function raises an error if the background thread stopped because
+        of an unexpected error.
+
+        Parameters
+        ----------
+        running : boolean, optional
+            wether the thread is considered running, by default None
+            (wether the thread is alive)
+
+        Raises
+        ------
+        RuntimeError
+            if the background thread is not running
+        """
+        if running is None:
+            running = self.thread.is_alive()
+
+        if not running:
+            raise RuntimeError(
+                'The psd writer is not running anymore, '
+                f'{len(self.failed_rows)} psd values were not stored.'
+            ) from self.error
+
+    def __put(self, item):
+        """
+        Function adds an item to the queue, waiting for a place while the
+        background thread is running.
+
+        Parameters
+        ----------
+        item : tuple
+            kind and value of the item
+
+        Raises
+        ------
+        RuntimeError
+            if the background thread is not running anymore
+        """
+        while True:
+            self.__check_running()
+
+            try:
+                self.queue.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    @property
+    def metrics(self):
+        """
+        Represents the metrics of the writer
+
+        Returns
+        -------
+        dict
+            current and maximum queue depth, number of flushes, stored and
+            failed values, the mean and maximum flush latency in seconds and
+            the number of values stored per second of flush
+        """
+        latencies = self.flush_latencies
+
+        return {
+            'queue_depth': self.queue.qsize(),
+            'max_queue_depth': self.max_queue_depth,
+            'flushes': self.flush_count,
+            'rows_written': self.rows_written,
+            'rows_failed': len(self.failed_rows),
+            'mean_flush_latency': (
+                sum(latencies) / len(latencies) if len(latencies) else 0.0
+            ),
+            'max_flush_latency': max(latencies) if len(latencies) else 0.0,
+            'rows_per_second': (
+                self.rows_written / sum(latencies) if sum(latencies) else 0.0
+            ),
+        }
+
+    def __run(self):
+        """
+        Function run by the background thread. If an unexpected error stops
+        it, the values of the current batch and those still in the queue
+        are moved to the failed values.
+        """
+        batch = []
+
+        try:
+            self.__consume(batch)
+        except Exception as e:
+            print(f'The psd writer stopped: {e!r}')
+            self.error = e
+            self.failed_rows.extend(batch)
+
+            while True:
+                try:
+                    kind, value = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+
+                if kind == 'row':
+                    self.failed_rows.append(value)
+
+    def __consume(self, batch):
+        """
+        Function takes the values from the queue and stores them when the
+        batch is full or too old, until it gets the stop item.
+
+        Parameters
+        ----------
+        batch : list
+            values waiting to be stored, emptied after each flush
+        """
+        deadline = time.monotonic() + self.flush_interval
+
+        while True:
+            try:
+                kind, value = self.queue.get(
+                    timeout=max(0.0, deadline - time.monotonic())
+                )
+            except queue.Empty:
+                # the batch is waiting for too long, store it
+                self.__flush(batch)
+                batch.clear()
+                deadline = time.monotonic() + self.flush_interval
+                continue
+
+            if kind == 'row':
+                batch.append(value)
+
+                if len(batch) < self.batch_size:
+                    continue
+            elif kind == 'checkpoint':
+                # all the values before the checkpoint have to be stored
+                # before calling the callback
+                self.__flush(batch)
+                batch.clear()
+
+                if self.on_checkpoint is not None and not self.failed_rows:
+                    self.on_checkpoint(value)
+                continue
+            else:
+                self.__flush(batch)
+                return
+
+            self.__flush(batch)
+            batch.clear()
+            deadline = time.monotonic() + self.flush_interval
+
+    def __flush(self, batch):
+        """
+        Function stores a batch of psd values in the database. It retries
+        with an exponential backoff if storing fails.
+
+        Parameters
+        ----------
+        batch : list
+            psd values to store
+        """
+        if not len(batch):
+            return
+
+        for retry in range(self.max_retries + 1):
+            if retry:
+                time.sleep(self.backoff * 2 ** (retry - 1))
+
+            flush_start = time.monotonic()
+            try:
+                stored = f.insert_psd(
+                    batch,
+                    verbose=False,
+                    strategy=self.strategy,
+                    chunk_size=self.batch_size,
+                )
+            except mysql.connector.Error as e:
+                print(e)
+                stored = False
+            except Exception as e:
+                # retrying does not help if the values cannot be stored
+                print(
+                    f'{len(batch)} psd values could not be stored: {e!r}'
+                )
+                self.failed_rows.extend(batch)
+                return
+
+            if stored:
+                self.flush_latencies.append(time.monotonic() - flush_start)
+                self.flush_count += 1
+                self.rows_written += len(batch)
+                return
+
+        print(
+            f'{len(batch)} psd values could not be stored after '
+            f'{self.max_retries} retries.'
+        )
+        self.failed_rows.extend(batch)
@@ -5,28 +5,77 @@ from datetime import datetime, timezone, timedelta
 from typing import Union
 
 
+HEADER = [
+    'location_code',
+    'antenna_id',
+    'file_start',
+    'meteor_count',
+    'meteor_time',
+    'fmin',
+    'fmax',
+    'distance_km'
+]
+
+
+def get_records(data: dict):
+    """
+    Function generates one record per detected meteor, with the values of
+    the csv columns (see HEADER).
+
+    Parameters
+    ----------
+    data : dict
+        stations with the detected meteors, as returned by
+        get_meteor_coords
+
+    Yields
+    ------
+    list
+        location code, antenna, file start, number of meteors in the file,
+        meteor time, minimum and maximum frequency and distance to the
+        reference station of a meteor
+    """
+    for loc_code in data.keys():
+        for antenna in data[loc_code]['sys'].keys():
+            for date in data[loc_code]['sys'][antenna].keys():
+                file = data[loc_code]['sys'][antenna][date]
+                for meteor in file['meteors']:
+                    seconds = (
+                        file['start']
+                        + float(meteor['t']) * 1000000
+                    ) / 1000000
+                    microseconds = (seconds % 1) * 1000000
+                    meteor_date = datetime.fromtimestamp(
+                        int(seconds),
+                        tz=timezone.utc
+                    )
+                    meteor_date += timedelta(
+                        microseconds=int(microseconds))
+                    yield [
+                        loc_code,
+                        antenna,
+                        date,
+                        len(file['meteors']),
+                        meteor_date.strftime('%Y-%m-%dT%H:%M:%S:%f'),
+                        meteor['f_min'],
+                        meteor['f_max'],
+                        data[loc_code]['distance']
+                    ]
+
+
 def write_csv(
-    data: list,
+    data: dict,
     directory: Union[str, None] = None,
     filename: str = 'meteor_detect',
-    header: list = [
-        'location_code',
-        'antenna_id',
-        'file_start',
-        'meteor_count',
-        'meteor_time',
-        'fmin',
-        'fmax',
-        'distance_km'
-    ]
+    header: list = HEADER
 ):
     """
     Function writes a csv file with all the information from detected meteors
 
     Parameters
     ----------
-    data : list
-        list with all the data from the detected meteors
+    data : dict
+        stations with the detected meteors (see get_records)
     directory : Union[str, None], optional
         directory in which to store the new csv file, by default None
     filename : str, optional
@@ -71,32 +120,6 @@ def write_csv(
         csv_writer.writerow(header)
 
         # add one line per detected meteor to the csv file
-        for loc_code in data.keys():
-            for antenna in data[loc_code]['sys'].keys():
-                for date in data[loc_code]['sys'][antenna].keys():
-                    file = data[loc_code]['sys'][antenna][date]
-                    for meteor in file['meteors']:
-                        seconds = (
-                            file['start']
-                            + float(meteor['t']) * 1000000
-                        ) / 1000000
-                        microseconds = (seconds % 1) * 1000000
-                        meteor_date = datetime.fromtimestamp(
-                            int(seconds),
-                            tz=timezone.utc
-                        )
-                        meteor_date += timedelta(
-                            microseconds=int(microseconds))
-                        csv_writer.writerow(
-                            [
-                                loc_code,
-                                antenna,
-                                date,
-                                len(file['meteors']),
-                                meteor_date.strftime('%Y-%m-%dT%H:%M:%S:%f'),
-                                meteor['f_min'],
-                                meteor['f_max'],
-                                data[loc_code]['distance']
-                            ]
-                        )
+        for record in get_records(data):
+            csv_writer.writerow(record)
         print(file_path)
@@ -0,0 +1,197 @@
+import numpy as np
+
+
+def get_column_runs(binary):
+    """
+    Function finds the vertical runs of a binary spectrogram slice, i.e. the
+    objects ndimage.label finds when it labels one column at a time.
+
+    Parameters
+    ----------
+    binary : np.array
+        2D boolean array (rows are frequencies, columns are times)
+
+    Returns
+    -------
+    tuple
+        column, start row and stop row (excluded) of each run, sorted by
+        column and by start row
+    """
+    n_rows, n_columns = binary.shape
+    padded = np.zeros((n_columns, n_rows + 2), dtype=np.int8)
+    padded[:, 1:-1] = binary.T
+    edges = np.diff(padded, axis=1)
+
+    columns, starts = np.nonzero(edges == 1)
+    stops = np.nonzero(edges == -1)[1]
+
+    return columns, starts, stops
+
+
+def get_runs_mask(shape, columns, starts, stops):
+    """
+    Function builds the mask of some vertical runs by marking their start
+    and stop rows and taking the cumulative sum of each column.
+
+    Parameters
+    ----------
+    shape : tuple
+        shape of the spectrogram slice
+    columns : np.array
+        column of each run
+    starts : np.array
+        start row of each run
+    stops : np.array
+        stop row (excluded) of each run
+
+    Returns
+    -------
+    np.array
+        boolean array, True for the pixels of the runs
+    """
+    # the runs of a column are separated by at least 1 row, so a start and a
+    # stop never fall on the same pixel
+    edges = np.zeros((shape[0] + 1, shape[1]), dtype=np.int8)
+    edges[starts, columns] = 1
+    edges[stops, columns] = -1
+
+    return np.cumsum(edges, axis=0, dtype=np.int8)[:-1].astype(bool)
+
+
+def set_column_runs(
+    spectrogram,
+    treshold,
+    value,
+    shorter_than=None,
+    taller_than=None
+):
+    """
+    Function sets the value of the vertical runs above a treshold, column by
+    column, depending on their height. The spectrogram slice is modified in
+    place.
+
+    Parameters
+    ----------
+    spectrogram : np.array
+        spectrogram slice
+    treshold : float
+        binarization treshold, values strictly above it belong to a run
+    value : float
+        new value of the selected runs
+    shorter_than : float, optional
+        select the runs with a height strictly smaller than this value
+        , by default None
+    taller_than : float, optional
+        select the runs with a height strictly greater than this value
+        , by default None
+    """
+    columns, starts, stops = get_column_runs(spectrogram > treshold)
+    heights = stops - starts
+    selected = np.ones(len(heights), dtype=bool)
+
+    if shorter_than is not None:
+        selected &= heights < shorter_than
+
+    if taller_than is not None:
+        selected &= heights > taller_than
+
+    if not selected.any():
+        return
+
+    spectrogram[get_runs_mask(
+        spectrogram.shape,
+        columns[selected],
+        starts[selected],
+        stops[selected],
+    )] = value
+
+
+def filter_columns_by_percentile(spectrogram, percentile, value=0.001):
+    """
+    Function sets the values of each column of a spectrogram slice that are
+    below the given percentile of their column. The percentiles of all the
+    columns are computed at once and the slice is modified in place.
+
+    Parameters
+    ----------
+    spectrogram : np.array
+        spectrogram slice
+    percentile : float
+        percentile below which values are filtered
+    value : float, optional
+        new value of the filtered values, by default 0.001
+    """
+    if not spectrogram.size:
+        return
+
+    column_percentiles = np.percentile(spectrogram, percentile, axis=0)
+    spectrogram[spectrogram < column_percentiles] = value
+
+
+class RunTable:
+    """
+    This class keeps the vertical runs of the columns of a spectrogram
+    slice, segmented once, so the objects of any part of a column are
+    looked up instead of labelling that part again.
+    """
+    def __init__(self, spectrogram, treshold, first_column=0):
+        """
+        Function segments the columns of the spectrogram slice.
+
+        Parameters
+        ----------
+        spectrogram : np.array
+            spectrogram slice, it is not kept by the table
+        treshold : float
+            binarization treshold, values strictly above it belong to a run
+        first_column : int, optional
+            column of the spectrogram the slice starts at, by default 0
+        """
+        self.n_rows, n_columns = spectrogram.shape
+        self.first_column = first_column
+
+        columns, starts, stops = get_column_runs(spectrogram > treshold)
+        self.starts = starts
+        self.stops = stops
+        # runs of column i are self.starts[offsets[i]:offsets[i + 1]]
+        self.offsets = np.zeros(n_columns + 1, dtype=np.int64)
+        np.cumsum(
+            np.bincount(columns, minlength=n_columns),
+            out=self.offsets[1:]
+        )
+
+    def get_objects(self, column, fmin, fmax):
+        """
+        Function gets the objects of the rows fmin to fmax of a column, as
+        ndimage.find_objects returns them for spectrogram[fmin:fmax, column].
+
+        Parameters
+        ----------
+        column : int
+            column of the spectrogram
+        fmin : int
+            start row of the column part, following the slicing rules
+            (negative values count from the last row)
+        fmax : int
+            stop row of the column part
+
+        Returns
+        -------
+        list
+            tuple with the row slice of each object, relative to the start
+            of the column part
+        """
+        start_row, stop_row, step = slice(fmin, fmax).indices(self.n_rows)
+        index = column - self.first_column
+        first, last = self.offsets[index], self.offsets[index + 1]
+
+        return [
+            (slice(max(start, start_row) - start_row,
+                   min(stop, stop_row) - start_row,
+                   None),)
+            for start, stop in zip(
+                self.starts[first:last].tolist(),
+                self.stops[first:last].tolist(),
+            )
+            if start < stop_row and stop > start_row
+        ]
@@ -1,9 +1,154 @@
 import numpy as np
-import matplotlib.pyplot as plt
 import math
 
 from scipy import signal, ndimage
 
+from ..psd.psd import find_stable_ridge
+from .morphology import (
+    filter_columns_by_percentile, set_column_runs, RunTable
+)
+
+
+# number of frames of the spectrogram calculated at once in lean mode
+LEAN_CHUNK_FRAMES = 64
+
+
+def get_block_means(row, width=3):
+    """
+    Function calculates the mean of each block of 'width' columns of a row,
+    the last block has less columns if the row length is not a multiple of
+    the width.
+
+    Parameters
+    ----------
+    row : np.array
+        the row
+    width : int, optional
+        number of columns of a block, by default 3
+
+    Returns
+    -------
+    np.array
+        mean of the block of each column of the row
+    """
+    full_length = len(row) - len(row) % width
+    means = np.repeat(row[:full_length].reshape(-1, width).mean(axis=1), width)
+
+    if full_length < len(row):
+        means = np.append(
+            means,
+            np.full(len(row) - full_length, row[full_length:].mean())
+        )
+
+    return means
+
+
+def replace_band(Pxx, start_row, end_row, width=3):
+    """
+    Function replaces the rows of a frequency band of a spectrogram by the
+    mean of the rows just below and above the band, calculated on blocks of
+    'width' columns.
+
+    Parameters
+    ----------
+    Pxx : np.array
+        the spectrogram, modified in place
+    start_row : int
+        first row of the band, the row before it must exist
+    end_row : int
+        last row of the band, the row after it must exist
+    width : int, optional
+        number of columns of a block, by default 3
+    """
+    Pxx[start_row:end_row + 1] = (
+        get_block_means(Pxx[start_row - 1], width)
+        + get_block_means(Pxx[end_row + 1], width)
+    ) / 2
+
+
+def sum_column_spans(Pxx, starts, stops):
+    """
+    Function sums the columns of several spans of a spectrogram, as the
+    differences of the cumulative sums of the columns covered by the spans.
+
+    Parameters
+    ----------
+    Pxx : np.array
+        the spectrogram
+    starts : list
+        first column of each span
+    stops : list
+        column upto which to sum each span (excluded)
+
+    Returns
+    -------
+    np.array
+        sum of the columns of each span, one span per row
+    """
+    starts = np.asarray(starts, dtype=np.int64)
+    stops = np.maximum(np.asarray(stops, dtype=np.int64), starts)
+
+    if not len(starts):
+        return np.zeros((0, Pxx.shape[0]))
+
+    # only the columns covered by the spans are summed
+    first, last = starts.min(), stops.max()
+    cumulative_sums = np.zeros((last - first + 1, Pxx.shape[0]))
+    np.cumsum(Pxx[:, first:last].T, axis=0, out=cumulative_sums[1:])
+
+    return cumulative_sums[stops - first] - cumulative_sums[starts - first]
+
+
+def find_edge(fft_slice, min_value, index, step):
+    """
+    Function walks a filtered fft from an index, in one direction, until 2
+    values equal to the minimum were met. When the minimum is positive, each
+    other value cancels a met minimum: the walk stops where the cumulative
+    sum of +1 (minimum) and -1 (other value) steps first reaches 2.
+
+    Parameters
+    ----------
+    fft_slice : np.array
+        the filtered fft
+    min_value : float
+        minimum of the fft
+    index : int
+        index to start from
+    step : int
+        -1 to walk down to the first bin (excluded), 1 to walk up to the last
+        bin
+
+    Returns
+    -------
+    int
+        index the walk stopped at (one step after the second minimum)
+    """
+    if step < 0:
+        if index <= 0:
+            return index
+
+        # bins from the index down to the first bin (excluded)
+        walked = fft_slice[index:0:-1]
+        end = 0
+    else:
+        if index >= len(fft_slice):
+            return index
+
+        walked = fft_slice[index:]
+        end = len(fft_slice)
+
+    is_minimum = walked == min_value
+
+    if min_value > 0:
+        reached = np.cumsum(np.where(is_minimum, 1, -1)) >= 2
+    else:
+        reached = np.cumsum(is_minimum) >= 2
+
+    if not reached.any():
+        return end
+
+    return index + (int(reached.argmax()) + 1) * step
+
 
 class Spectrogram:
     """
@@ -22,11 +167,26 @@ class Spectrogram:
         sample_frequency=5512,
         noverlap=14488,
         window='hamming',
-        max_normalization=1
+        max_normalization=1,
+        time_range=None,
+        frequency_band=None,
+        lean=False
     ):
         """
         Function prepares the class and initializes all of its properties.
-        It also generates the spectrogram from the given wav file
+        It also generates the spectrogram from the given wav file.
+        The spectrogram can be limited to a region of interest: only the
+        frames whose center lies in the time range are calculated and only
+        the rows in the frequency band are kept. The times and frequencies
+        arrays keep their absolute values, the column and row indices of the
+        methods are relative to the region of interest (see column_offset
+        and row_offset). The region of interest is normalized by its own
+        maximum and its transmitter signal is searched from its first
+        column, so its values can differ from those of the whole
+        spectrogram.
+        In lean mode, the spectrogram is calculated and stored as float32
+        and the spectrogram in dB is only calculated when it is used, from
+        the frames of the audio signal it needs.
 
         Parameters
         ----------
@@ -43,26 +203,70 @@ class Spectrogram:
             , by default 'hamming'
         max_normalization : int, optional
             maximum value after spectrogram normalization, by default 1
+        time_range : tuple, optional
+            start and end in seconds (from the start of the audio signal) of
+            the frames to calculate, by default None (all the frames)
+        frequency_band : tuple, optional
+            minimum and maximum frequency in Hz of the rows to keep,
+            by default None (all the rows)
+        lean : bool, optional
+            store the spectrogram as float32 and calculate the spectrogram in
+            dB lazily, by default False
         """
-        # generate the spectrogram from the init funtion arguments
-        self.frequencies, self.times, Pxx = signal.spectrogram(
-            audio_signal,
-            sample_frequency,
-            nperseg=nfft,
-            noverlap=noverlap,
-            window=window,
+        self.lean = lean
+        # the audio signal is only needed to calculate the spectrogram in dB
+        # lazily
+        self.audio_signal = audio_signal if lean else None
+        self.nfft = nfft
+        self.noverlap = noverlap
+        self.window = window
+        self.sample_frequency = sample_frequency
+        self.max_normalization = max_normalization
+
+        # number of frames of the whole signal and offset between 2 frames
+        step = nfft - noverlap
+        self.n_frames = max(0, (len(audio_signal) - nfft) // step + 1)
+        first_frame, last_frame = self.__get_frame_range(
+            time_range, nfft, step, sample_frequency
+        )
+        self.column_offset = first_frame
+
+        # generate the spectrogram of the frames in the time range, the
+        # frames are calculated independently of each other so they are the
+        # same as those of the whole signal
+        self.frequencies, self.times, Pxx = self.__get_frames(
+            audio_signal, first_frame, last_frame
         )
+        self.times += first_frame * step / sample_frequency
 
+        # resolution of the rows of the whole spectrogram
         self.frequency_resolution = (
             sample_frequency / 2 / len(self.frequencies)
         )
 
-        self.sample_frequency = sample_frequency
+        # keep the rows in the frequency band
+        self.row_offset = 0
+        self.n_rows = len(self.frequencies)
+        if frequency_band is not None:
+            rows = np.nonzero(
+                (self.frequencies >= frequency_band[0])
+                & (self.frequencies <= frequency_band[1])
+            )[0]
+            if not len(rows):
+                raise ValueError(
+                    f'No frequency in the band {frequency_band}'
+                )
+
+            self.row_offset = rows[0]
+            self.n_rows = len(rows)
+            self.frequencies = self.frequencies[rows[0]:rows[-1] + 1]
+            Pxx = Pxx[rows[0]:rows[-1] + 1]
 
         # normalize the spectrogram
-        Pxx = self.__normalize_spectrogram(max_normalization, Pxx)
-        # spectrogram in dB
-        self.Pxx_DB = 10. * np.log10(Pxx)
+        self.max_pxx = np.max(Pxx)
+        self.__normalize_spectrogram(Pxx)
+        # spectrogram in dB, calculated when it is used in lean mode
+        self._Pxx_DB = None if lean else 10. * np.log10(Pxx)
         # retrieve the frequency of the transmitter signal
         (
             self.start_transmitter_row,
@@ -77,6 +281,42 @@ class Spectrogram:
 
         self._default_treshold = None
 
+    def __get_frame_range(self, time_range, nfft, step, sample_frequency):
+        """
+        Function finds the first and the last frame whose center lies in a
+        time range.
+
+        Parameters
+        ----------
+        time_range : tuple
+            start and end of the range in seconds, None for all the frames
+        nfft : int
+            number of samples of a frame
+        step : int
+            number of samples between the start of 2 frames
+        sample_frequency : int
+            sample frequency of the audio signal
+
+        Returns
+        -------
+        tuple
+            index of the first and of the last frame
+        """
+        if time_range is None or not self.n_frames:
+            return 0, max(0, self.n_frames - 1)
+
+        # the center of frame k is at (k * step + nfft / 2) / fs seconds
+        first_frame = math.ceil(
+            (time_range[0] * sample_frequency - nfft / 2) / step
+        )
+        last_frame = math.floor(
+            (time_range[1] * sample_frequency - nfft / 2) / step
+        )
+        first_frame = min(max(first_frame, 0), self.n_frames - 1)
+        last_frame = min(max(last_frame, first_frame), self.n_frames - 1)
+
+        return first_frame, last_frame
+
     @property
     def __default_treshold(self):
         """
@@ -92,27 +332,129 @@ class Spectrogram:
 
         return self._default_treshold
 
-    def __normalize_spectrogram(self, max_normalization, Pxx):
+    def __normalize_spectrogram(self, Pxx):
         """
-        Function generates a normalized version of the spectrogram
+        Function normalizes the spectrogram in place, so its maximum value
+        (max_pxx, the maximum of the whole spectrogram) becomes
+        max_normalization
 
         Parameters
         ----------
-        max_normalization : float
-            max value of the normalized spectrogram
         Pxx : np.array
-            spectrogram to normalize
+            spectrogram (or frames of the spectrogram) to normalize
+        """
+        Pxx /= self.max_pxx
+        Pxx *= self.max_normalization
+
+    def __get_frames(self, audio_signal, first_frame, last_frame):
+        """
+        Function calculates the spectrogram of a range of frames of the
+        audio signal (as float32 in lean mode).
+
+        Parameters
+        ----------
+        audio_signal : BramsWavFile
+            wav from which to calculate the spectrogram
+        first_frame : int
+            index of the first frame
+        last_frame : int
+            index of the last frame
+
+        Returns
+        -------
+        tuple
+            frequencies, times (relative to the first frame) and spectrogram
+            of the frames
+        """
+        step = self.nfft - self.noverlap
+        samples = audio_signal[
+            first_frame * step:last_frame * step + self.nfft
+        ]
+        n_frames = max(0, (len(samples) - self.nfft) // step + 1)
+
+        if not self.lean or not n_frames:
+            return signal.spectrogram(
+                samples,
+                self.sample_frequency,
+                nperseg=self.nfft,
+                noverlap=self.noverlap,
+                window=self.window,
+            )
+
+        # the spectrogram of float32 samples is calculated as float32, by
+        # chunks of frames to limit the memory the transform needs
+        samples = np.asarray(samples, dtype=np.float32)
+        Pxx = None
+
+        for chunk_start in range(0, n_frames, LEAN_CHUNK_FRAMES):
+            frequencies, times, chunk = signal.spectrogram(
+                samples[
+                    chunk_start * step:
+                    (chunk_start + LEAN_CHUNK_FRAMES - 1) * step + self.nfft
+                ],
+                self.sample_frequency,
+                nperseg=self.nfft,
+                noverlap=self.noverlap,
+                window=self.window,
+            )
+
+            if Pxx is None:
+                Pxx = np.empty((len(frequencies), n_frames), dtype=chunk.dtype)
+
+            Pxx[:, chunk_start:chunk_start + chunk.shape[1]] = chunk
+
+        # times of the frame centers, as calculated for a single transform
+        times = np.arange(
+            self.nfft / 2, len(samples) - self.nfft / 2 + 1, step
+        ) / float(self.sample_frequency)
+
+        return frequencies, times, Pxx
+
+    @property
+    def Pxx_DB(self):
+        """
+        Represents the normalized spectrogram in dB, before the transmitter
+        signal was subtracted
 
         Returns
         -------
         np.array
-            normalized spectrogram
+            spectrogram in dB
         """
-        max_pxx = np.max(Pxx)
+        if self._Pxx_DB is None:
+            self._Pxx_DB = self.get_db_columns(0, len(self.times))
 
-        Pxx = Pxx / max_pxx * max_normalization
+        return self._Pxx_DB
 
-        return Pxx
+    def get_db_columns(self, start, end):
+        """
+        Function gets columns of the spectrogram in dB. In lean mode, when
+        the whole spectrogram in dB was not calculated, only the frames of
+        those columns are calculated again.
+
+        Parameters
+        ----------
+        start : int
+            first column
+        end : int
+            column upto which to get the spectrogram (excluded)
+
+        Returns
+        -------
+        np.array
+            columns of the spectrogram in dB
+        """
+        if self._Pxx_DB is not None:
+            return self._Pxx_DB[:, start:end]
+
+        Pxx = self.__get_frames(
+            self.audio_signal,
+            self.column_offset + start,
+            self.column_offset + end - 1,
+        )[2][self.row_offset:self.row_offset + self.n_rows]
+        self.__normalize_spectrogram(Pxx)
+
+        return 10. * np.log10(Pxx)
 
     def plot_original_spectrogram(
         self,
@@ -155,14 +497,16 @@ class Spectrogram:
             fmax = self.sample_frequency / 2
         else:
             fmin = (
-                (self.max_transmitter_row * self.frequency_resolution)
+                self.__get_row_frequency(self.max_transmitter_row)
                 - (interval / 2)
             )
             fmax = (
-                (self.max_transmitter_row * self.frequency_resolution)
+                self.__get_row_frequency(self.max_transmitter_row)
                 + (interval / 2)
             )
 
+        import matplotlib.pyplot as plt
+
         print('Preparing original spectrogram figure...')
         plt.figure(self.figure_n)    # create figure
         self.figure_n += 1
@@ -229,17 +573,19 @@ class Spectrogram:
             fmax = self.sample_frequency / 2
         else:
             fmin = (
-                (self.max_transmitter_row * self.frequency_resolution)
+                self.__get_row_frequency(self.max_transmitter_row)
                 - (interval / 2)
             )
             fmax = (
-                (self.max_transmitter_row * self.frequency_resolution)
+                self.__get_row_frequency(self.max_transmitter_row)
                 + (interval / 2)
             )
 
         # show the spectrogram in dB units
         Pxx_DB_modified = 10. * np.log10(self.Pxx_modified)
 
+        import matplotlib.pyplot as plt
+
         print('Preparing modified spectrogram figure...')
         plt.figure(self.figure_n)    # create figure
         self.figure_n += 1
@@ -263,6 +609,23 @@ class Spectrogram:
         if show:
             self.__show_figures()
 
+    def __get_row_frequency(self, row):
+        """
+        Function returns the frequency of a row, as calculated from the
+        frequency resolution.
+
+        Parameters
+        ----------
+        row : int
+            row of the spectrogram (relative to the frequency band)
+
+        Returns
+        -------
+        float
+            frequency of the row in Hz
+        """
+        return (row + self.row_offset) * self.frequency_resolution
+
     def __get_slice(
         self,
         start,
@@ -356,6 +719,8 @@ class Spectrogram:
         if not fmax:
             fmax = self.sample_frequency / 2
 
+        import matplotlib.pyplot as plt
+
         print('Preparing original spectre figure...')
         plt.figure(self.figure_n)    # create new figure
         self.figure_n += 1
@@ -419,6 +784,8 @@ class Spectrogram:
         if not fmax:
             fmax = self.sample_frequency / 2
 
+        import matplotlib.pyplot as plt
+
         print('Preparing modified spectre figure...')
         plt.figure(self.figure_n)    # create new figure
         self.figure_n += 1
@@ -449,6 +816,8 @@ class Spectrogram:
         After the plots are generated it waits for a user input to close the
         plots
         """
+        import matplotlib.pyplot as plt
+
         print('Showing figure(s)...')
         plt.show(block=False)
         input('Press any key to close the figures...')
@@ -529,10 +898,12 @@ class Spectrogram:
         """
         if filter_all:
             spectrogram_slice = self.Pxx_modified
-            spectrogram_slice_copy = self.Pxx_modified.copy()
         else:
             spectrogram_slice = self.__get_slice(start, end)
-            spectrogram_slice_copy = np.copy(spectrogram_slice)
+
+        # the convolution returns a new array, the slice is only overwritten
+        # with the result
+        spectrogram_slice_copy = spectrogram_slice
 
         # performing convolution as many times as requested by the user
         for i in range(coefficient):
@@ -566,48 +937,40 @@ class Spectrogram:
         Returns
         -------
         tuple
-            the upper, middle and lower frequency of the transmitter signal
+            the upper, middle and lower row of the transmitter signal
+            (relative to the frequency band)
         """
-        same_index = 0
-        previous_index = 0
-        index = 0
-        min_row = round(fmin / self.frequency_resolution)
-        max_row = round(fmax / self.frequency_resolution)
-
-        # while there is no row that has the highest value for 50 columns
-        while not same_index == 50 and index < len(self.times):
-            # find highest row value of a column
-            max_column_index = Pxx[min_row:max_row, index].argmax()
-
-            # check if it is close or the same frequency as the previous
-            # highest value
-            if max_column_index in [
-                previous_index - 1, previous_index, previous_index + 1
-            ]:
-                same_index += 1
-            else:
-                same_index = 0
-                previous_index = max_column_index
-
-            index += 1
+        # rows relative to the frequency band
+        min_row = max(
+            round(fmin / self.frequency_resolution) - self.row_offset, 0
+        )
+        max_row = round(fmax / self.frequency_resolution) - self.row_offset
+        default_row = min(max(
+            round(1000 / self.frequency_resolution) - self.row_offset, 0
+        ), len(self.frequencies) - 1)
+
+        # the band does not contain the searched frequencies
+        if max_row <= min_row:
+            return False, False, default_row
+
+        # search a row that has the highest value for 50 columns
+        ridge = find_stable_ridge(
+            Pxx, min_row, max_row, n_columns=len(self.times)
+        )
 
         # if no transmitter signal was found
-        if same_index < 50:
+        if ridge is None:
             # print(
             #     'Direct signal was not found, spectrogram will be '
             #     'shown around default value of 1000 Hz.'
             # )
-            return False, False, round(1000 / self.frequency_resolution)
+            return False, False, default_row
 
         # print(
         #     'Direct signal was found around '
-        #     f'{(previous_index + min_row) * self.frequency_resolution} Hz.'
+        #     f'{ridge[1] * self.frequency_resolution} Hz.'
         # )
-        return (
-            (previous_index + min_row - 2),
-            (previous_index + min_row + 3),
-            (previous_index + min_row)
-        )
+        return ridge[1] - 2, ridge[1] + 3, ridge[1]
 
     def __subtract_transmitter_signal(self, Pxx):
         """
@@ -624,26 +987,18 @@ class Spectrogram:
         np.array
             the spectrogram without the transmitter signal
         """
-        # check if the transmitter signal's frequency is known
-        if self.start_transmitter_row:
+        # check if the transmitter signal's frequency is known and if the
+        # rows around it are in the frequency band
+        if (
+            self.start_transmitter_row
+            and self.start_transmitter_row > 0
+            and self.end_transmitter_row + 1 < Pxx.shape[0]
+        ):
             # replace all the transmitter values with the values from the
             # upper and lower frequencies
-            for row in range(
-                self.start_transmitter_row, self.end_transmitter_row + 1
-            ):
-                start_col = 0
-                for end_col in range(3, Pxx.shape[0], 3):
-                    normal_mean_value = (
-                        np.mean(Pxx[
-                            self.start_transmitter_row - 1, start_col:end_col
-                        ])
-                        + np.mean(Pxx[
-                            self.end_transmitter_row + 1, start_col:end_col
-                        ])
-                    ) / 2
-
-                    Pxx[row, start_col:end_col] = normal_mean_value
-                    start_col = end_col
+            replace_band(
+                Pxx, self.start_transmitter_row, self.end_transmitter_row
+            )
 
             Pxx[Pxx <= 0] = 0.001
 
@@ -852,12 +1207,8 @@ class Spectrogram:
         else:
             spectrogram_slice = self.__get_slice(start, end)
 
-        # for each column of the given slice
-        for column in spectrogram_slice.T:
-            # get the percentile
-            column_percentile = np.percentile(column, percentile)
-            # filter all the values below that percentile
-            column[column < column_percentile] = 0.001
+        # filter all the values below the percentile of their column
+        filter_columns_by_percentile(spectrogram_slice, percentile)
 
     def get_potential_meteors(
         self,
@@ -912,13 +1263,35 @@ class Spectrogram:
             broad_end = end
 
         broad_spectrogram = self.__get_slice(broad_start, broad_end)
-        pxx_copy = self.Pxx_modified.copy()
+        search_spectrogram = self.__get_slice(start, end)
+
+        # segment, before deleting the small objects, the columns that can be
+        # searched for plane echoes (upto 22 columns around the slice to
+        # search)
+        table_start = max(start - 22, 0)
+        run_table = RunTable(
+            self.Pxx_modified[
+                :,
+                table_start:start + search_spectrogram.shape[1] + 22
+            ],
+            0.01,
+            table_start,
+        )
 
-        # for each column delete objects of small height
-        for i in range(len(broad_spectrogram.T)):
-            self.delete_area(
-                10 / self.frequency_resolution,
-                start=(i + broad_start)
+        # for each column delete objects of small height. The columns are
+        # those delete_area would get one by one: clamped to the first
+        # column, the last column of the spectrogram being never included
+        if broad_spectrogram.shape[1]:
+            first_column = max(broad_start, 0)
+            last_column = min(
+                max(broad_start + broad_spectrogram.shape[1], 1),
+                len(self.times) - 1
+            )
+            set_column_runs(
+                self.Pxx_modified[:, first_column:last_column],
+                0.01,
+                0.0000001,
+                shorter_than=10 / self.frequency_resolution,
             )
 
         # get all the objects from the slice to search (from start to end)
@@ -935,8 +1308,6 @@ class Spectrogram:
             # for plane echoes
             detection_start = (object[1].start - 22 + start)
             detection_stop = (object[1].stop + 22 + start)
-            fmax = object[0].stop + 3
-            fmin = object[0].start - 3
             pot_meteor_height = object[0].stop - object[0].start
             pot_meteor_width = object[1].stop - object[1].start
 
@@ -968,120 +1339,29 @@ class Spectrogram:
 
             # if the object is wider than 1
             elif pot_meteor_width > 1:
-                column = object[1].start - 1 + start
-                no_objects = 0
-                # iterate over the 20 columns coming before the start of the
-                # current object. This is done in order to detect plan echoes
-                while (
-                    column > detection_start
-                    and no_objects <= 2
-                    and total_width < 16
-                ):
-                    # get all the objects from the current column
-                    column_objects = self.__get_object_coords(
-                        # spectrogram=self.Pxx_modified[fmin:fmax, column]
-                        spectrogram=pxx_copy[fmin:fmax, column]
-                    )
-
-                    # if there are any objects
-                    if len(column_objects):
-                        slice_object = column_objects[0][0]
-
-                        # if there are several objects
-                        if len(column_objects) > 1:
-                            fstart = 0
-                            fstop = -4
-
-                            # check if all those objects lay close to each
-                            # other or not
-                            for column_object in column_objects:
-                                max_gap = 0.25 * (fmax - fmin)
-
-                                # check if 2 objects lay close or far form each
-                                # other
-                                if column_object[0].start > (fstop + max_gap):
-                                    # if they lay far from each other, reset
-                                    # the start
-                                    fstart = column_object[0].start
-
-                                # set new stop
-                                fstop = column_object[0].stop
-
-                            slice_object = slice(fstart, fstop, None)
-
-                        no_objects += 1
-                        # if the objects next to the detected meteor are
-                        # almost as big as the meteor itself
-                        if (
-                            (slice_object.stop - slice_object.start)
-                            > ((fmax - fmin) * 0.7)
-                        ):
-                            if no_objects > 0:
-                                no_objects -= 2
-                            total_width += 1
-                            fmax = fmin + slice_object.stop + 3
-                            fmin += slice_object.start - 3
-                    else:
-                        no_objects += 1
-                    column -= 1
-
-                column = object[1].stop + 1 + start
-                no_objects = 0
-
-                fmax = object[0].stop + 3
-                fmin = object[0].start - 3
-
-                # iterate over the 20 columns coming after the stop of the
-                # current object. This is done to detect plane echoes.
-                while (
-                    column < detection_stop
-                    and no_objects <= 2
-                    and total_width < 16
-                ):
-                    # get all the objects of the current column
-                    column_objects = self.__get_object_coords(
-                        spectrogram=pxx_copy[fmin:fmax, column]
-                    )
-
-                    # if there is an object found
-                    if len(column_objects):
-                        slice_object = column_objects[0][0]
-
-                        # if there are several objects
-                        if len(column_objects) > 1:
-                            fstart = 0
-                            fstop = -4
-
-                            # check if those objects lay close to each other
-                            for column_object in column_objects:
-                                max_gap = 0.25 * (fmax - fmin)
-
-                                # check if 2 objects lay clos or far form each
-                                # other
-                                if column_object[0].start > (fstop + max_gap):
-                                    # if they lay far from each other, reset
-                                    # the start
-                                    fstart = column_object[0].start
-
-                                # set new stop
-                                fstop = column_object[0].stop
-
-                            slice_object = slice(fstart, fstop, None)
-
-                        no_objects += 1
-                        # if the object is almost as big as the detected meteor
-                        if (
-                            (slice_object.stop - slice_object.start)
-                            > ((fmax - fmin) * 0.7)
-                        ):
-                            if no_objects > 0:
-                                no_objects -= 2
-                            total_width += 1
-                            fmax = fmin + slice_object.stop + 3
-                            fmin += slice_object.start - 3
-                    else:
-                        no_objects += 1
-                    column += 1
+                # follow the objects of the 20 columns coming before the
+                # start of the current object. This is done in order to
+                # detect plane echoes
+                total_width = self.__trace_plane_echo(
+                    run_table,
+                    object[1].start - 1 + start,
+                    detection_start,
+                    -1,
+                    object[0].start - 3,
+                    object[0].stop + 3,
+                    total_width,
+                )
+                # follow the objects of the 20 columns coming after the stop
+                # of the current object
+                total_width = self.__trace_plane_echo(
+                    run_table,
+                    object[1].stop + 1 + start,
+                    detection_stop,
+                    1,
+                    object[0].start - 3,
+                    object[0].stop + 3,
+                    total_width,
+                )
 
                 # if the width of the objects is eventually less than 16
                 # , consider it being a meteor
@@ -1102,6 +1382,97 @@ class Spectrogram:
         # get all the structured meteor coordinates and return the results
         return self.__get_structured_meteor_coords(pot_meteors)
 
+    def __trace_plane_echo(
+        self,
+        run_table,
+        column,
+        stop_column,
+        step,
+        fmin,
+        fmax,
+        total_width
+    ):
+        """
+        Function follows the objects of the columns next to a potential
+        meteor, in one direction, as long as they are almost as high as the
+        followed area. Plane echoes are wide, meteors are not.
+
+        Parameters
+        ----------
+        run_table : RunTable
+            objects of the columns of the spectrogram (before the small
+            objects were deleted)
+        column : int
+            first column to search
+        stop_column : int
+            column where the search stops (excluded)
+        step : int
+            -1 to search the columns before the meteor, 1 for those after it
+        fmin : int
+            start row of the followed area
+        fmax : int
+            stop row of the followed area
+        total_width : int
+            number of columns already followed
+
+        Returns
+        -------
+        int
+            number of columns followed
+        """
+        no_objects = 0
+
+        # (column - stop_column) * step is negative until the stop column
+        while (
+            (column - stop_column) * step < 0
+            and no_objects <= 2
+            and total_width < 16
+        ):
+            # get all the objects of the followed area of the current column
+            column_objects = run_table.get_objects(column, fmin, fmax)
+
+            # if there are any objects
+            if len(column_objects):
+                slice_object = column_objects[0][0]
+
+                # if there are several objects
+                if len(column_objects) > 1:
+                    fstart = 0
+                    fstop = -4
+
+                    # check if all those objects lay close to each other or
+                    # not
+                    for column_object in column_objects:
+                        max_gap = 0.25 * (fmax - fmin)
+
+                        # check if 2 objects lay close or far form each other
+                        if column_object[0].start > (fstop + max_gap):
+                            # if they lay far from each other, reset the start
+                            fstart = column_object[0].start
+
+                        # set new stop
+                        fstop = column_object[0].stop
+
+                    slice_object = slice(fstart, fstop, None)
+
+                no_objects += 1
+                # if the objects next to the detected meteor are almost as
+                # big as the meteor itself
+                if (
+                    (slice_object.stop - slice_object.start)
+                    > ((fmax - fmin) * 0.7)
+                ):
+                    if no_objects > 0:
+                        no_objects -= 2
+                    total_width += 1
+                    fmax = fmin + slice_object.stop + 3
+                    fmin += slice_object.start - 3
+            else:
+                no_objects += 1
+            column += step
+
+        return total_width
+
     def __get_object_coords(
         self,
         start=0,
@@ -1195,22 +1566,33 @@ class Spectrogram:
         list
             update list with the frequency extremities
         """
-        for meteor_info in meteor_coords:
-            # generate an fft of the found meteor's column
-            fft_slice = np.zeros(len(self.frequencies))
-            for i in range(
-                meteor_info['t_slice'].start,
-                meteor_info['t_slice'].stop
-            ):
-                fft_slice += self.Pxx_DB[:, i]
+        if not len(meteor_coords):
+            return meteor_coords
+
+        # generate an fft of the found meteors' columns, one meteor per row
+        # (only the columns of the meteors are needed in dB)
+        starts = [meteor['t_slice'].start for meteor in meteor_coords]
+        stops = [meteor['t_slice'].stop for meteor in meteor_coords]
+        first_column = min(starts)
+        fft_slices = sum_column_spans(
+            self.get_db_columns(first_column, max(stops)),
+            [start - first_column for start in starts],
+            [stop - first_column for stop in stops],
+        )
 
-            # filter all values below the 85th percentile of the fft
-            noise_percentile = np.percentile(fft_slice, 85)
-            min_value = fft_slice.min()
-            fft_slice[fft_slice <= noise_percentile] = min_value
+        # filter all values below the 85th percentile of each fft
+        noise_percentiles = np.percentile(fft_slices, 85, axis=1)
+        min_values = fft_slices.min(axis=1)
+        fft_slices = np.where(
+            fft_slices <= noise_percentiles[:, None],
+            min_values[:, None],
+            fft_slices
+        )
 
+        for fft_slice, min_value, meteor_info in zip(
+            fft_slices, min_values, meteor_coords
+        ):
             # set the boundaries for finding upper and lower frequency
-            min_value_count = 0
             slice_start_index = (
                 meteor_info['f_slice'].start
                 + math.floor(
@@ -1229,27 +1611,13 @@ class Spectrogram:
                     ) / 2
                 )
             )
-            # searching start (fmin) value
-            while min_value_count < 2 and slice_start_index > 0:
-                if fft_slice[slice_start_index] == min_value:
-                    min_value_count += 1
-                elif min_value > 0:
-                    min_value_count -= 1
-
-                slice_start_index -= 1
-
-            min_value_count = 0
-            # searching stop (fmax) value
-            while (
-                min_value_count < 2
-                and slice_stop_index < len(self.frequencies)
-            ):
-                if fft_slice[slice_stop_index] == min_value:
-                    min_value_count += 1
-                elif min_value > 0:
-                    min_value_count -= 1
-
-                slice_stop_index += 1
+            # searching start (fmin) and stop (fmax) values
+            slice_start_index = find_edge(
+                fft_slice, min_value, slice_start_index, -1
+            )
+            slice_stop_index = find_edge(
+                fft_slice, min_value, slice_stop_index, 1
+            )
 
             # add the values to the meteor coordinates list
             meteor_info['f_min'] = self.frequencies[slice_start_index - 1]
@@ -1295,19 +1663,6 @@ class Spectrogram:
 
         spectrogram_slice = self.__get_slice(start, end)
 
-        for i in range(len(spectrogram_slice.T)):
-            # get objects above the treshold
-            object_coords = self.__get_object_coords(
-                start=i + start,
-                get_all=False,
-                treshold=0.002,
-            )
-
-            # if the objects are higher than 12 rows, increase their value
-            for coords in object_coords:
-                if (coords[0].stop - coords[0].start) > 12:
-                    coords_corrected = (
-                        coords[0],
-                        slice(i + start, i + start + 1, None)
-                    )
-                    self.Pxx_modified[coords_corrected] = 10
+        # increase the value of the objects above the treshold that are
+        # higher than 12 rows, column by column
+        set_column_runs(spectrogram_slice, 0.002, 10, taller_than=12)
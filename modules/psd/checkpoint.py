@@ -0,0 +1,126 @@
+import json
+import os
+
+from datetime import datetime
+
+
+def get_run_key(start_date, interval, stations, directory, overwrite):
+    """
+    Function generates a key identifying a monitoring run. Two runs with the
+    same key compute the same psd values, which means that the second one can
+    resume the work of the first one.
+    Note that the end date is not part of the key, this way an automatic run
+    that was interrupted can be resumed by the next cron invocation.
+
+    Parameters
+    ----------
+    start_date : datetime.datetime
+        start date of the monitoring run
+    interval : int
+        interval in minutes between each file
+    stations : list
+        location codes requested by the user
+    directory : str
+        directory from which the wav files are read
+    overwrite : bool
+        value of the --overwrite flag
+
+    Returns
+    -------
+    str
+        key of the monitoring run
+    """
+    return (
+        f"{start_date.strftime('%Y-%m-%d %H:%M')}|{interval}|"
+        f"{','.join(sorted(stations))}|{directory}|{int(overwrite)}"
+    )
+
+
+def load_checkpoint(path, run_key):
+    """
+    Function loads the progress watermarks of a previous, interrupted run.
+    The watermarks are only returned if the checkpoint belongs to the same
+    run (see get_run_key).
+
+    Parameters
+    ----------
+    path : str
+        path of the checkpoint file
+    run_key : str
+        key of the current monitoring run
+
+    Returns
+    -------
+    dict
+        dictionary where the keys are the system ids and the values the
+        datetime up to which (excluded) psd values have been stored in the
+        database, empty if there is nothing to resume
+    """
+    try:
+        with open(path) as checkpoint_file:
+            data = json.load(checkpoint_file)
+    except FileNotFoundError:
+        return {}
+    except json.JSONDecodeError:
+        print(
+            f'Error while reading the {path} checkpoint file, the run will '
+            'start from the beginning.'
+        )
+        return {}
+
+    # the checkpoint was made by another run, it cannot be used
+    if data.get('run_key') != run_key:
+        return {}
+
+    return {
+        int(sys_id): datetime.fromisoformat(watermark)
+        for sys_id, watermark in data['watermarks'].items()
+    }
+
+
+def save_checkpoint(path, run_key, watermarks):
+    """
+    Function stores the progress watermarks of the current run. The file is
+    first written to a temporary file and then renamed, this way a crash
+    while writing never leaves a corrupted checkpoint behind.
+
+    Parameters
+    ----------
+    path : str
+        path of the checkpoint file
+    run_key : str
+        key of the current monitoring run
+    watermarks : dict
+        dictionary where the keys are the system ids and the values the
+        datetime up to which (excluded) psd values have been stored
+    """
+    tmp_path = f'{path}.tmp'
+
+    with open(tmp_path, 'w') as checkpoint_file:
+        json.dump(
+            {
+                'run_key': run_key,
+                'watermarks': {
+                    str(sys_id): watermark.isoformat()
+                    for sys_id, watermark in watermarks.items()
+                },
+            },
+            checkpoint_file
+        )
+
+    os.replace(tmp_path, path)
+
+
+def remove_checkpoint(path):
+    """
+    Function removes the checkpoint file once a run completed successfully.
+
+    Parameters
+    ----------
+    path : str
+        path of the checkpoint file
+    """
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
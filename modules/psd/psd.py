@@ -1,6 +1,11 @@
 import numpy as np
 
-from scipy import signal
+
+# version of the psd calculation, stored with each psd value. Increase it
+# whenever the frequency bands, the windowing or the calibrator search
+# change, the values stored with an older version can then be recalculated
+# with the --recompute-stale option of the monitoring program.
+PSD_VERSION = 1
 
 
 def get_psd(f, flow=800, fhigh=900):
@@ -125,6 +130,8 @@ def get_calibrator_f_old(
     fmax=1650
 ):
     # * currently not used
+    from scipy import signal
+
     frequencies, times, Pxx = signal.spectrogram(
             f.Isamples,
             f.fs,
@@ -134,28 +141,13 @@ def get_calibrator_f_old(
         )
     frequency_resolution = f.fs / 2 / len(frequencies)
 
-    same_index = 0
-    previous_index = 0
-    index = 0
-    min_row = round(fmin / frequency_resolution)
-    max_row = round(fmax / frequency_resolution)
-
-    # print(f'Searching direct signal between {fmin} Hz and {fmax} Hz...')
-
-    while not same_index == 50 and index < len(times):
-        max_column_index = Pxx[min_row:max_row, index].argmax()
-
-        if max_column_index in [
-            previous_index - 1, previous_index, previous_index + 1
-        ]:
-            same_index += 1
-        else:
-            same_index = 0
-            previous_index = max_column_index
-
-        index += 1
+    ridge = find_stable_ridge(
+        Pxx,
+        round(fmin / frequency_resolution),
+        round(fmax / frequency_resolution),
+    )
 
-    if same_index < 50:
+    if ridge is None:
         # print(
         #     'Calibrator signal was not found, therefore psd cannot be '
         #     'calculated.'
@@ -164,6 +156,71 @@ def get_calibrator_f_old(
 
     # print(
     #     'Direct signal was found around '
-    #     f'{(previous_index + min_row) * frequency_resolution} Hz.'
+    #     f'{ridge[1] * frequency_resolution} Hz.'
     # )
-    return (previous_index + min_row) * frequency_resolution
+    return ridge[1] * frequency_resolution
+
+
+def find_stable_ridge(Pxx, min_row, max_row, length=50, n_columns=None):
+    """
+    Function searches a stable ridge (the transmitter or the calibrator
+    signal) in the rows min_row to max_row of a spectrogram: the first
+    column after which the highest row of at least 'length' consecutive
+    columns stays within 1 row of the highest row of that column. The
+    highest rows are found by blocks of columns, as the ridge is usually
+    stable after a few columns, the run is then found by jumping from one
+    run start to the next.
+
+    Parameters
+    ----------
+    Pxx : np.array
+        the spectrogram
+    min_row : int
+        first row of the search
+    max_row : int
+        row upto which to search (excluded)
+    length : int, optional
+        number of stable columns needed after the first column of the run,
+        by default 50
+    n_columns : int, optional
+        number of columns to search, by default None (all the columns)
+
+    Returns
+    -------
+    tuple or None
+        first column and row of the ridge, None if there is no stable ridge
+    """
+    if n_columns is None:
+        n_columns = Pxx.shape[1]
+
+    n_columns = min(n_columns, Pxx.shape[1])
+    ridge = np.zeros(0, dtype=np.int64)
+
+    # the search starts with row 0 as reference before the first column
+    column = -1
+    row = 0
+
+    while column + length < n_columns:
+        window_end = column + 1 + length
+
+        if len(ridge) < window_end:
+            # highest rows of the next block of columns
+            block_end = min(
+                max(window_end, len(ridge) + 4 * length), n_columns
+            )
+            ridge = np.append(
+                ridge,
+                Pxx[min_row:max_row, len(ridge):block_end].argmax(axis=0)
+            )
+
+        window = ridge[column + 1:window_end]
+        unstable = np.flatnonzero(np.abs(window - row) > 1)
+
+        if not len(unstable):
+            return max(column, 0), row + min_row
+
+        # the first unstable column starts a new run
+        column += 1 + unstable[0]
+        row = ridge[column]
+
+    return None
@@ -0,0 +1,232 @@
+import numpy as np
+import sqlite3
+
+
+# rollup bucket sizes, weeks start on monday
+GRANULARITIES = ('hour', 'day', 'week')
+STATISTICS = ('count', 'min', 'p25', 'median', 'p75', 'max')
+
+
+def get_connection(path='psd_rollup.db'):
+    """
+    Function opens the local rollup store and creates its table if needed.
+
+    Parameters
+    ----------
+    path : str, optional
+        path of the sqlite file, by default 'psd_rollup.db'
+
+    Returns
+    -------
+    sqlite3.Connection
+        connection to the rollup store
+    """
+    connection = sqlite3.connect(path)
+    columns = ',\n'.join(
+        f'   {kind}_{statistic} '
+        + ('INTEGER' if statistic == 'count' else 'REAL')
+        for kind in ('noise', 'calibrator')
+        for statistic in STATISTICS
+    )
+
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS psd_rollup (\n"
+        "   system_id INTEGER NOT NULL,\n"
+        "   granularity TEXT NOT NULL,\n"
+        "   bucket_start INTEGER NOT NULL,\n"
+        f"{columns},\n"
+        "   PRIMARY KEY (system_id, granularity, bucket_start)\n"
+        ")"
+    )
+
+    return connection
+
+
+def get_buckets(dates, granularity):
+    """
+    Function calculates the bucket each date belongs to.
+
+    Parameters
+    ----------
+    dates : np.array
+        dates as np.datetime64[m] values
+    granularity : str
+        'hour', 'day' or 'week'
+
+    Returns
+    -------
+    np.array
+        start of the bucket of each date, in minutes since the epoch
+    """
+    minutes = dates.astype('datetime64[m]').astype(np.int64)
+
+    if granularity == 'hour':
+        return minutes - minutes % 60
+
+    days = minutes // 1440
+
+    if granularity == 'day':
+        return days * 1440
+
+    # 1970-01-01 was a thursday, shift the days to start the weeks on monday
+    return (days - (days + 3) % 7) * 1440
+
+
+def get_statistics(values):
+    """
+    Function calculates the statistics of the psd values of a bucket.
+
+    Parameters
+    ----------
+    values : np.array
+        psd values of the bucket, nan values are ignored
+
+    Returns
+    -------
+    list
+        count, minimum, 25th percentile, median, 75th percentile and
+        maximum of the values (None if there is no value)
+    """
+    values = values[~np.isnan(values)]
+
+    if not len(values):
+        return [0, None, None, None, None, None]
+
+    percentiles = np.percentile(values, [0, 25, 50, 75, 100])
+    return [len(values)] + [float(value) for value in percentiles]
+
+
+def update_rollups(psd_memory, since, path='psd_rollup.db'):
+    """
+    Function updates the rollups of the buckets containing new psd values.
+    The statistics of those buckets are calculated again from the psd values
+    kept in memory by the monitoring program, which contains at least 20
+    days of values before the new ones, so that every affected hour, day
+    and week is complete.
+
+    Parameters
+    ----------
+    psd_memory : dictionary
+        dictionary containing the dates ('x'), noise ('n_y') and
+        calibrator ('c_y') psd values of each system
+    since : datetime.datetime
+        date of the first new psd value
+    path : str, optional
+        path of the sqlite file, by default 'psd_rollup.db'
+
+    Returns
+    -------
+    int
+        number of updated buckets
+    """
+    rows = []
+    since = np.datetime64(since.strftime('%Y-%m-%dT%H:%M'), 'm')
+
+    for sys_id in psd_memory:
+        sys_psd = psd_memory[sys_id]
+
+        if not len(sys_psd['x']):
+            continue
+
+        dates = np.array(list(sys_psd['x']), dtype='datetime64[m]')
+        noise = np.array(list(sys_psd['n_y']), dtype=float)
+        calibrator = np.array(list(sys_psd['c_y']), dtype=float)
+        new = dates >= since
+
+        for granularity in GRANULARITIES:
+            buckets = get_buckets(dates, granularity)
+
+            # only the buckets with new values have to be updated
+            for bucket in np.unique(buckets[new]):
+                in_bucket = buckets == bucket
+                rows.append(
+                    [int(sys_id), granularity, int(bucket)]
+                    + get_statistics(noise[in_bucket])
+                    + get_statistics(calibrator[in_bucket])
+                )
+
+    if not len(rows):
+        return 0
+
+    connection = get_connection(path)
+    with connection:
+        connection.executemany(
+            "INSERT OR REPLACE INTO psd_rollup\n"
+            f"VALUES ({', '.join('?' for value in rows[0])})",
+            rows
+        )
+    connection.close()
+
+    return len(rows)
+
+
+def get_rollups(
+    stations,
+    granularity,
+    start_date,
+    end_date,
+    path='psd_rollup.db'
+):
+    """
+    Function gets the rollups of some systems between 2 dates.
+
+    Parameters
+    ----------
+    stations : list
+        list with the system ids to take rollups from
+    granularity : str
+        'hour', 'day' or 'week'
+    start_date : datetime.datetime
+        timezone aware date from which to take rollups
+    end_date : datetime.datetime
+        timezone aware date upto which to take rollups
+    path : str, optional
+        path of the sqlite file, by default 'psd_rollup.db'
+
+    Returns
+    -------
+    dict
+        dictionary where the keys are the system ids and the values
+        dictionaries of arrays: 'bucket' (np.datetime64[m]) and one array
+        per statistic ('noise_median', 'calibrator_p25', ...)
+    """
+    columns = ['bucket_start'] + [
+        f'{kind}_{statistic}'
+        for kind in ('noise', 'calibrator')
+        for statistic in STATISTICS
+    ]
+    arguments = ', '.join('?' for station in stations)
+    rollups = {}
+
+    connection = get_connection(path)
+    cursor = connection.execute(
+        f"SELECT system_id, {', '.join(columns)}\n"
+        "FROM psd_rollup\n"
+        "WHERE granularity = ?\n"
+        "AND bucket_start >= ?\n"
+        "AND bucket_start < ?\n"
+        f"AND system_id in ({arguments})\n"
+        "ORDER BY system_id, bucket_start",
+        [
+            granularity,
+            int(start_date.timestamp() // 60),
+            int(end_date.timestamp() // 60),
+        ] + list(stations)
+    )
+    records = cursor.fetchall()
+    connection.close()
+
+    for sys_id in stations:
+        sys_records = [record[1:] for record in records if record[0] == sys_id]
+        values = np.array(sys_records, dtype=float).reshape(-1, len(columns))
+
+        rollups[sys_id] = {
+            column: values[:, index]
+            for index, column in enumerate(columns[1:], start=1)
+        }
+        rollups[sys_id]['bucket'] = (
+            values[:, 0].astype(np.int64).astype('datetime64[m]')
+        )
+
+    return rollups
+
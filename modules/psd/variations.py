@@ -1,6 +1,5 @@
 import numpy as np
-
-from scipy.optimize import curve_fit
+import warnings
 
 
 def fit_func(x, a, b):
@@ -11,6 +10,8 @@ def fit_func(x, a, b):
 
 def detect_noise_decrease(x_data, y_data, index, interval=150):
     # * currently not used
+    from scipy.optimize import curve_fit
+
     if len(x_data) < interval:
         return False
 
@@ -194,3 +195,114 @@ def mad(array):
     # * currently not used
     median = np.median(array)
     return median, np.median(np.abs(array - median))
+
+
+def detect_network_variations(
+    psd_matrix,
+    start,
+    window,
+    threshold=6.0,
+    min_fraction=0.5,
+    min_systems=5,
+    chunk_size=20000000,
+):
+    """
+    This function detects variations that happen on many systems at the same
+    time (ionospheric disturbances, beacon outages, ...). Each row of the
+    psd matrix is normalized by a rolling robust baseline (median and median
+    absolute deviation of the previous 'window' values, in log scale). A
+    time slot is reported when enough systems deviate from their baseline in
+    the same direction during that slot.
+
+    Parameters
+    ----------
+    psd_matrix : np.array
+        systems x slots matrix of psd values, nan where there is no value
+    start : int
+        index of the first slot to check, the previous slots are only used
+        as baseline
+    window : int
+        number of previous slots forming the baseline of a slot
+    threshold : float, optional
+        number of (scaled) median absolute deviations from the median above
+        which a value deviates, by default 6.0
+    min_fraction : float, optional
+        minimum fraction of the systems with a value during the slot that
+        have to deviate, by default 0.5
+    min_systems : int, optional
+        minimum number of systems that have to deviate, by default 5
+    chunk_size : int, optional
+        maximum number of values in the intermediate baseline arrays, the
+        slots are checked by chunks to respect it, by default 20000000
+
+    Returns
+    -------
+    list
+        list of dictionaries with the slot index of the event, its
+        direction (1 for an increase, -1 for a decrease) and the row
+        indices of the systems that deviated
+    """
+    events = []
+    n_systems, n_slots = psd_matrix.shape
+
+    if start >= n_slots or not n_systems:
+        return events
+
+    # psd values vary multiplicatively, compare them in log scale
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_psd = np.log10(np.where(psd_matrix > 0, psd_matrix, np.nan))
+
+    # add missing history before the first slot
+    padding = max(0, window - start)
+    if padding:
+        log_psd = np.concatenate(
+            (np.full((n_systems, padding), np.nan), log_psd),
+            axis=1
+        )
+        start += padding
+
+    # windows[:, i] contains the slots i to i + window - 1
+    # (as_strided instead of sliding_window_view to support numpy < 1.20)
+    log_psd = np.ascontiguousarray(log_psd)
+    windows = np.lib.stride_tricks.as_strided(
+        log_psd,
+        shape=(n_systems, log_psd.shape[1] - window + 1, window),
+        strides=(log_psd.strides[0], log_psd.strides[1], log_psd.strides[1]),
+        writeable=False,
+    )
+    chunk = max(1, chunk_size // (n_systems * window))
+
+    for chunk_start in range(start, log_psd.shape[1], chunk):
+        chunk_stop = min(chunk_start + chunk, log_psd.shape[1])
+        # baseline of slot t is made of the slots t - window to t - 1
+        baseline = windows[:, chunk_start - window:chunk_stop - window]
+        values = log_psd[:, chunk_start:chunk_stop]
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            with warnings.catch_warnings():
+                # systems without any history give all nan windows
+                warnings.simplefilter('ignore', category=RuntimeWarning)
+                median = np.nanmedian(baseline, axis=2)
+                mad = np.nanmedian(
+                    np.abs(baseline - median[:, :, np.newaxis]), axis=2
+                )
+
+            # 1.4826 scales the mad to the standard deviation of a normal
+            # distribution
+            score = (values - median) / np.maximum(1.4826 * mad, 1e-12)
+
+        valid = ~np.isnan(score)
+        increase = valid & (score >= threshold)
+        decrease = valid & (score <= -threshold)
+        needed = np.maximum(min_systems, min_fraction * valid.sum(axis=0))
+
+        for direction, deviating in ((1, increase), (-1, decrease)):
+            for slot in np.nonzero(deviating.sum(axis=0) >= needed)[0]:
+                events.append({
+                    'slot': int(slot) + chunk_start - padding,
+                    'direction': direction,
+                    'systems': np.nonzero(deviating[:, slot])[0].tolist(),
+                })
+
+    events.sort(key=lambda event: event['slot'])
+    return events
@@ -1,18 +1,22 @@
 #! /usr/bin/env python3
 import argparse
-import simplejson as json
+import time
+import modules.database.database as db
 import modules.database.system as sys
 import modules.database.file as f
+import modules.database.writer as writer
+import modules.database.psd_cache as psd_cache
 import modules.psd.variations as variations
 import modules.psd.psd as psd
-import matplotlib.pyplot as plt
-import modules.mail.mail as mail
+import modules.psd.checkpoint as checkpoint
+import modules.psd.rollup as rollup
+import math
+import numpy as np
 
 from modules.brams_wav import BramsError, BramsWavFile, DirectoryNotFoundError
+from collections import deque
 from datetime import datetime, timedelta, timezone
-from tqdm import tqdm
 from decimal import Decimal
-from email.mime.text import MIMEText
 
 
 default_dir = '/bira-iasb/data/GROUNDBASED/BRAMS/wav/'
@@ -42,6 +46,8 @@ def get_dates(
     datetime
         start date and end date of the interval
     """
+    import simplejson as json
+
     # if the user gave no start date
     if start_date is None:
         # check if there is a program_data.json file
@@ -103,7 +109,7 @@ def get_dates(
     return start_date, end_date
 
 
-def send_summary(psd_memory, mail_destination):
+def send_summary(psd_memory, mail_destination, network_events=None):
     """
     Function generates a variations report from the program results. If a mail
     address is given, it also sends an email to that address
@@ -114,9 +120,31 @@ def send_summary(psd_memory, mail_destination):
         dictionary containing all the warnings detected by the program
     mail_destination : str
         destination mail address to send the report to
+    network_events : list, optional
+        variations detected on many systems at the same time
+        (see detect_network_events), by default None
     """
     summary_text = ""
 
+    if network_events is None:
+        network_events = []
+
+    if len(network_events):
+        summary_text += "\n\n----------NETWORK----------\n"
+
+    # add the network wide variations first, with the affected stations
+    for event in network_events:
+        if event['direction'] > 0:
+            variation = 'increase'
+        else:
+            variation = 'drop'
+
+        summary_text += (
+            f"There was a significative noise {variation} on "
+            f"{len(event['stations'])} stations at {event['date']} : "
+            f"{', '.join(event['stations'])}\n"
+        )
+
     # for each system id found in the psd_memory dictionary
     for system_id in psd_memory:
         warnings = False
@@ -126,10 +154,14 @@ def send_summary(psd_memory, mail_destination):
             "NOISE : \n"
         )
 
+        # onsets found by the adaptive mode
+        onsets = psd_memory[system_id].get('onsets', {})
+
         # add all the noise decrease warnings to the text
         for warning in psd_memory[system_id]['warnings']['noise']['desc']:
             tmp_text += (
-                f"There was a significative noise drop at {warning}\n"
+                f"There was a significative noise drop at {warning}"
+                f"{get_onset_text(onsets, warning)}\n"
             )
             warnings = True
 
@@ -138,7 +170,8 @@ def send_summary(psd_memory, mail_destination):
         # add all the noise increase warnings
         for warning in psd_memory[system_id]['warnings']['noise']['asc']:
             tmp_text += (
-                f" There was a significative noise increase at {warning}\n"
+                f" There was a significative noise increase at {warning}"
+                f"{get_onset_text(onsets, warning)}\n"
             )
             warnings = True
 
@@ -148,7 +181,7 @@ def send_summary(psd_memory, mail_destination):
         for warning in psd_memory[system_id]['warnings']['calibrator']:
             tmp_text += (
                 "There was a significative calibrator psd variation at "
-                f"{warning}\n"
+                f"{warning}{get_onset_text(onsets, warning)}\n"
             )
             warnings = True
 
@@ -159,6 +192,10 @@ def send_summary(psd_memory, mail_destination):
 
     # send an email if a mail destination is given
     if mail_destination is not None:
+        import modules.mail.mail as mail
+
+        from email.mime.text import MIMEText
+
         summary_text = MIMEText(summary_text)
         summary_text['subject'] = (
             f"Monitoring results {datetime.today().strftime('%B %d, %Y')}"
@@ -167,50 +204,655 @@ def send_summary(psd_memory, mail_destination):
         mail.send_mail(summary_text, receiver=mail_destination)
 
 
+def get_onset_text(onsets, str_date):
+    """
+    Function generates the text added to a warning when the adaptive mode
+    found an earlier onset for it.
+
+    Parameters
+    ----------
+    onsets : dict
+        onset of the variations, by date of their warning
+    str_date : str
+        date of the warning
+
+    Returns
+    -------
+    str
+        the onset text, empty if there is no earlier onset
+    """
+    onset = onsets.get(str_date)
+
+    if onset is None or onset == str_date:
+        return ''
+
+    return f' (onset at {onset})'
+
+
+def get_systems(stations, connection=None):
+    """
+    Function gets the system ids of the requested location codes.
+
+    Parameters
+    ----------
+    stations : list
+        location codes requested by the user, all the systems are taken if
+        the list is empty
+    connection : MySQLConnection, optional
+        open connection to use instead of a new one, by default None
+
+    Returns
+    -------
+    tuple
+        the system ids structured by location code and antenna
+        (see system.get_station_ids) and a flat list of those system ids
+    """
+    if len(stations) == 0:
+        systems = sys.get_station_ids(connection=connection)
+    else:
+        systems = sys.get_station_ids(stations, False, connection)
+
+    system_ids = [
+        systems[lcode][antenna]
+        for lcode in systems.keys()
+        for antenna in systems[lcode].keys()
+    ]
+
+    return systems, system_ids
+
+
+def get_system_names(systems):
+    """
+    Function gets the location code and the antenna of each system.
+
+    Parameters
+    ----------
+    systems : dict
+        system ids structured by location code and antenna
+        (see get_systems)
+
+    Returns
+    -------
+    dict
+        location code and antenna of each system id
+    """
+    return {
+        systems[lcode][antenna]: (lcode, antenna)
+        for lcode in systems.keys()
+        for antenna in systems[lcode].keys()
+    }
+
+
+def get_str_dates(starts):
+    """
+    Function formats dates as the monitoring program does.
+
+    Parameters
+    ----------
+    starts : np.array
+        dates in seconds since the epoch
+
+    Returns
+    -------
+    list
+        'YYYY-MM-DD hh:mm' strings
+    """
+    return np.char.replace(
+        np.datetime_as_string(
+            np.asarray(starts, dtype=np.int64).astype('datetime64[s]'),
+            unit='m'
+        ),
+        'T',
+        ' '
+    ).tolist()
+
+
+def get_slot_values(psd_values, first_date, interval, n_slots):
+    """
+    Function places the psd values of a system in the slots of a run.
+
+    Parameters
+    ----------
+    psd_values : dict or None
+        psd values of the system, as returned by file.get_previous_all_psd
+    first_date : datetime.datetime
+        date of the first slot
+    interval : int
+        interval in minutes between each slot
+    n_slots : int
+        number of slots
+
+    Returns
+    -------
+    tuple
+        arrays telling if a slot has a value, and the noise and the
+        calibrator psd values of each slot (nan if unknown)
+    """
+    known = np.zeros(n_slots, dtype=bool)
+    noise = np.full(n_slots, np.nan)
+    calibrator = np.full(n_slots, np.nan)
+
+    if psd_values is None:
+        return known, noise, calibrator
+
+    offsets = psd_values['start'] - int(first_date.timestamp())
+    slots = offsets // (interval * 60)
+    valid = (
+        (offsets % (interval * 60) == 0)
+        & (slots >= 0)
+        & (slots < n_slots)
+    )
+
+    known[slots[valid]] = True
+    noise[slots[valid]] = psd_values['noise'][valid]
+    calibrator[slots[valid]] = psd_values['calibrator'][valid]
+
+    return known, noise, calibrator
+
+
+def new_system_memory(title, x, n_y, c_y):
+    """
+    Function creates the dictionary holding the psd values and the warnings
+    of one system.
+
+    Parameters
+    ----------
+    title : str
+        location code followed by the antenna number
+    x : list
+        dates of the previous psd values
+    n_y : list
+        previous noise psd values
+    c_y : list
+        previous calibrator psd values
+
+    Returns
+    -------
+    dict
+        psd memory of the system
+    """
+    return {
+        "title": title,
+        "i": len(n_y) - 1,
+        "start_index": len(x),
+        "x": x,
+        "n_y": n_y,
+        "c_y": c_y,
+        "previous_f": None,
+        "warnings": new_warnings(),
+        "onsets": {},
+    }
+
+
+def new_warnings():
+    """
+    Function creates an empty warnings dictionary.
+
+    Returns
+    -------
+    dict
+        noise decrease, noise increase and calibrator warnings of a system
+    """
+    return {
+        "noise": {
+            "desc": [],
+            "asc": [],
+        },
+        "calibrator": [],
+    }
+
+
+def calculate_psd(wav):
+    """
+    Function calculates the noise and calibrator psd values of a wav file.
+
+    Parameters
+    ----------
+    wav : BramsWavFile
+        wav file to calculate the psd values of
+
+    Returns
+    -------
+    tuple
+        noise psd and calibrator psd as decimal.Decimal
+    """
+    noise_psd = Decimal(psd.get_noise_psd(wav))
+    calibrator_psd, calibrator_f = psd.get_calibrator_psd(wav)
+
+    return noise_psd, Decimal(calibrator_psd)
+
+
+def get_row(sys_id, str_date, noise_psd, calibrator_psd):
+    """
+    Function creates the row storing the psd values of a file in the
+    database (see file.insert_psd).
+
+    Parameters
+    ----------
+    sys_id : int
+        id of the system
+    str_date : str
+        start date of the file
+    noise_psd : decimal.Decimal
+        noise psd value of the file
+    calibrator_psd : decimal.Decimal
+        calibrator psd value of the file
+
+    Returns
+    -------
+    dict
+        the row, tagged with the current version of the psd calculation
+    """
+    return {
+        "system_id": sys_id,
+        "time": str_date,
+        "noise_psd": noise_psd,
+        "calibrator_psd": calibrator_psd,
+        "psd_version": psd.PSD_VERSION,
+    }
+
+
+def calculate_file_psd(date, location_code, system_code, directory):
+    """
+    Function calculates the noise and calibrator psd values of a file, it
+    is run by the worker processes recalculating stale psd values.
+
+    Parameters
+    ----------
+    date : datetime.datetime
+        start date of the file
+    location_code : str
+        location code of the system
+    system_code : str
+        system code ('SYS001', ...)
+    directory : str
+        directory containing the wav files
+
+    Returns
+    -------
+    tuple or None
+        noise psd and calibrator psd, None if the file cannot be read
+    """
+    try:
+        wav = get_wav_loader(directory)(date, location_code, system_code)
+    except (BramsError, DirectoryNotFoundError):
+        return None
+
+    return calculate_psd(wav)
+
+
+def check_variations(
+    warnings,
+    noise_y,
+    calibrator_y,
+    noise_psd,
+    calibrator_psd,
+    str_date,
+):
+    """
+    Function checks if new psd values are marginal compared to the previous
+    ones and, if so, adds a warning for their date.
+
+    Parameters
+    ----------
+    warnings : dict
+        warnings of the system (see new_system_memory)
+    noise_y : list
+        previous noise psd values, the new value included
+    calibrator_y : list
+        previous calibrator psd values, the new value included
+    noise_psd : decimal.Decimal
+        the new noise psd value
+    calibrator_psd : decimal.Decimal
+        the new calibrator psd value
+    str_date : str
+        date of the new psd values
+
+    Returns
+    -------
+    tuple
+        noise and calibrator variations (1 for a high increase, -1 for a
+        high decrease, 0 otherwise)
+    """
+    # values coming from the database, the cache or the calculation may
+    # have different types, compare them as floats
+    noise_variations = variations.detect_noise_variations(
+        np.array(noise_y, dtype=float),
+        float(noise_psd),
+    )
+    # detect high noise increases
+    if noise_variations > 0:
+        warnings['noise']['asc'].append(str_date)
+
+    # do the same, but this time check for high noise decreases
+    elif noise_variations < 0:
+        warnings['noise']['desc'].append(str_date)
+
+    calibrator_variations = variations.detect_calibrator_variations(
+        np.array(calibrator_y, dtype=float),
+        np.nan if calibrator_psd is None else float(calibrator_psd)
+    )
+
+    # check for high calibrator psd increase
+    # if calibrator_variations > 0:
+    #     warnings['calibrator'].append(str_date)
+
+    # check for high calibrator psd decrease
+    if calibrator_variations < 0:
+        warnings['calibrator'].append(str_date)
+
+    return noise_variations, calibrator_variations
+
+
+def refine_onset(
+    wav_loader,
+    sys_id,
+    lcode,
+    antenna,
+    start_date,
+    end_date,
+    fine_interval,
+    noise_y,
+    calibrator_y,
+    noise_variation,
+    calibrator_variation,
+    stored=None,
+):
+    """
+    Function calculates the psd values in between 2 coarse dates at a fine
+    interval in order to find when a variation detected at the second date
+    started. The psd values already stored are taken instead of being
+    calculated again.
+
+    Parameters
+    ----------
+    wav_loader : function
+        function loading the wav files (see get_wav_loader)
+    sys_id : int
+        id of the system
+    lcode : str
+        location code of the system
+    antenna : str
+        antenna of the system
+    start_date : datetime.datetime
+        previous coarse date, excluded
+    end_date : datetime.datetime
+        coarse date at which the variation was detected, excluded
+    fine_interval : int
+        interval in minutes in between the fine psd values
+    noise_y : list
+        noise psd values the variation was detected against
+    calibrator_y : list
+        calibrator psd values the variation was detected against
+    noise_variation : int
+        noise variation detected at the coarse date (see check_variations)
+    calibrator_variation : int
+        calibrator variation detected at the coarse date
+    stored : tuple, optional
+        stored psd values of the fine dates (see get_fine_values),
+        by default None (every value is calculated)
+
+    Returns
+    -------
+    tuple
+        date of the first fine psd value showing the same variation (None
+        if there is none) and the rows of the calculated fine psd values, to
+        be stored in the database
+    """
+    noise_y = np.array(noise_y, dtype=float)
+    calibrator_y = np.array(calibrator_y, dtype=float)
+    fine_delta = timedelta(minutes=fine_interval)
+    requested_date = start_date + fine_delta
+    slot = 0
+    onset = None
+    rows = []
+
+    while requested_date < end_date:
+        str_date = requested_date.strftime('%Y-%m-%d %H:%M')
+        known = stored is not None and stored[0][slot]
+
+        if known:
+            noise_psd = float(stored[1][slot])
+            calibrator_psd = float(stored[2][slot])
+        else:
+            try:
+                wav = wav_loader(
+                    requested_date,
+                    lcode,
+                    f"SYS{antenna.rjust(3, '0')}",
+                )
+            except (BramsError, DirectoryNotFoundError):
+                requested_date += fine_delta
+                slot += 1
+                continue
+
+            noise_psd, calibrator_psd = calculate_psd(wav)
+            rows.append(get_row(sys_id, str_date, noise_psd, calibrator_psd))
+
+        # the onset is the first value showing the same variation
+        if onset is None and (
+            (
+                noise_variation != 0
+                and variations.detect_noise_variations(
+                    noise_y, float(noise_psd)
+                ) == noise_variation
+            ) or (
+                calibrator_variation < 0
+                and variations.detect_calibrator_variations(
+                    calibrator_y, float(calibrator_psd)
+                ) < 0
+            )
+        ):
+            onset = str_date
+
+        requested_date += fine_delta
+        slot += 1
+
+    return onset, rows
+
+
+def get_fine_values(
+    sys_id,
+    start_date,
+    end_date,
+    fine_interval,
+    connection=None
+):
+    """
+    Function gets the stored psd values of a system in between 2 coarse
+    dates, at the fine interval used by refine_onset.
+
+    Parameters
+    ----------
+    sys_id : int
+        id of the system
+    start_date : datetime.datetime
+        previous coarse date, excluded
+    end_date : datetime.datetime
+        coarse date at which the variation was detected, excluded
+    fine_interval : int
+        interval in minutes in between the fine psd values
+    connection : MySQLConnection, optional
+        open connection used to read from the database, by default None
+
+    Returns
+    -------
+    tuple
+        arrays telling if each fine date has a stored value, and its noise
+        and calibrator psd values (see get_slot_values)
+    """
+    fine_delta = timedelta(minutes=fine_interval)
+    first_date = start_date + fine_delta
+    n_slots = max(0, math.ceil((end_date - first_date) / fine_delta))
+
+    fine_psd = f.get_previous_all_psd(
+        [sys_id],
+        first_date,
+        end_date,
+        fine_interval,
+        connection=connection,
+    )
+
+    return get_slot_values(
+        fine_psd.get(sys_id), first_date, fine_interval, n_slots
+    )
+
+
+def get_cache(args):
+    """
+    Function loads the local psd history cache matching the interval of the
+    run.
+
+    Parameters
+    ----------
+    args : namespace
+        contains all the arguments given by the user
+
+    Returns
+    -------
+    PsdCache or None
+        the cache, None if it is disabled
+    """
+    if not args.cache:
+        return None
+
+    return psd_cache.PsdCache(
+        f'{args.cache}_{args.interval}.npz',
+        args.interval,
+        psd.PSD_VERSION,
+    )
+
+
+def get_wav_loader(directory=default_dir):
+    """
+    Function creates the default wav file loader, which reads the files
+    from the given directory (or from the archive).
+
+    Parameters
+    ----------
+    directory : str, optional
+        directory containing the wav files, by default default_dir
+
+    Returns
+    -------
+    function
+        loader taking the date, the location code and the system code
+        ('SYS001', ...) of a file and returning the BramsWavFile, it raises
+        a BramsError or a DirectoryNotFoundError if the file is missing
+    """
+    from_archive = directory == default_dir
+
+    def load_wav(date, location_code, system_code):
+        return BramsWavFile(
+            date,
+            location_code,
+            system_code,
+            respect_date=True,
+            parent_directory=directory,
+            from_archive=from_archive,
+        )
+
+    return load_wav
+
+
+def get_config(config=None):
+    """
+    Function creates the configuration of a run from the default values of
+    the command line arguments.
+
+    Parameters
+    ----------
+    config : dict or namespace, optional
+        values replacing the default ones, the keys are the names of the
+        command line arguments ('start_date', 'stations', 'interval', ...),
+        by default None
+
+    Returns
+    -------
+    namespace
+        the configuration of the run
+
+    Raises
+    ------
+    ValueError
+        if a key is not the name of a command line argument
+    """
+    if isinstance(config, argparse.Namespace):
+        return config
+
+    args = arguments([])
+
+    for key, value in (config or {}).items():
+        if not hasattr(args, key):
+            raise ValueError(f'Unknown monitoring option : {key}')
+
+        setattr(args, key, value)
+
+    return args
+
+
 def round_interval(interval):
     # function rounds the interval to a number that can be divided by 5
     return interval - (interval % 5) if (interval - (interval % 5) > 0) else 5
 
 
-def main(args):
+def run_monitoring(config=None, connection=None, wav_loader=None, cache=None):
     """
-    This function orchestrates the whole program, it is the entrypoint to
-    calculate the psd values and to detect all the variations.
-    It also adapts the program's action according to the arguments given by
-    the user.
+    This function calculates the psd values of a period and detects their
+    variations. It can be called by a long-lived process to serve many
+    periods: the connection, the wav loader and the psd history cache can be
+    kept between calls.
 
     Parameters
     ----------
-    args : namespace
-        contains all the arguments given by the user
+    config : dict or namespace, optional
+        options of the run, named as the command line arguments, the other
+        options take their default value (see get_config), by default None
+    connection : MySQLConnection, optional
+        open connection used to read from the database, it should be in
+        autocommit mode to see the values stored by previous calls. The psd
+        values are stored by a background thread with its own connections.
+        By default None (new connections are made)
+    wav_loader : function, optional
+        function loading the wav files (see get_wav_loader), by default
+        the files are read from the configured directory
+    cache : PsdCache, optional
+        psd history cache with the same interval as the run, by default it
+        is loaded from the configured cache file
+
+    Returns
+    -------
+    dict
+        result of the run: the 'start_date' and 'end_date' of the period,
+        the psd values and warnings of each system ('psd', see
+        new_system_memory), the 'network_events', wether every psd value
+        was 'stored', the writer 'metrics' and the calculated 'rows'
+        (only kept with the json option)
     """
+    args = get_config(config)
+
     # days needed to calculate the upper and lower limits for the variation
     # detection program
     MEAN_DAYS_PERIOD = 20
-    files = []
+    json_files = []
+    # calculated psd values, added to the cache once they are stored
+    cached_rows = []
     psd_memory = {}
     stations = args.stations
 
     args.interval = round_interval(args.interval)
+    # the fine interval cannot be larger than the interval
+    fine_interval = min(round_interval(args.fine_interval), args.interval)
     # 1440 minutes per day (24 * 60)
     detection_condition_value = int((MEAN_DAYS_PERIOD * 1440) / args.interval)
 
     # get all the system ids from the requested locations
-    if len(stations) == 0:
-        systems = sys.get_station_ids()
-    else:
-        systems = sys.get_station_ids(stations, False)
+    systems, system_ids = get_systems(stations, connection)
 
-    system_ids = [
-        systems[lcode][antenna]
-        for lcode in systems.keys()
-        for antenna in systems[lcode].keys()
-    ]
+    if wav_loader is None:
+        wav_loader = get_wav_loader(args.directory)
 
-    if args.directory == default_dir:
-        from_archive = True
-    else:
-        from_archive = False
+    from tqdm import tqdm
 
     # get the start and end date
     start_date, end_date = get_dates(
@@ -221,6 +863,38 @@ def main(args):
     # calculate pre start to detect variations
     pre_start = start_date - timedelta(days=MEAN_DAYS_PERIOD)
 
+    # check if a previous run with the same parameters was interrupted
+    run_key = checkpoint.get_run_key(
+        start_date,
+        args.interval,
+        stations,
+        args.directory,
+        args.overwrite,
+    )
+    watermarks = (
+        checkpoint.load_checkpoint(args.checkpoint, run_key)
+        if args.checkpoint else {}
+    )
+    progress = dict(watermarks)
+
+    if len(watermarks):
+        print(f'Resuming the run interrupted with {args.checkpoint}')
+
+    # psd values are stored in the background while the next ones are
+    # calculated, the progress is saved once the values are stored
+    psd_writer = writer.PsdWriter(
+        batch_size=args.flush_size,
+        flush_interval=args.flush_interval,
+        strategy=args.write_strategy,
+        on_checkpoint=(
+            (lambda state: checkpoint.save_checkpoint(
+                args.checkpoint, run_key, state
+            ))
+            if args.checkpoint else None
+        ),
+    )
+    pending = 0
+
     print(f'Calculating from {start_date} to {end_date}')
 
     interval_delta = timedelta(minutes=args.interval)
@@ -230,13 +904,24 @@ def main(args):
         (end_date - start_date).total_seconds()
         / interval_sec
     )
+    # number of slots of the run, with and without the previous values
+    n_slots = math.ceil((end_date - pre_start).total_seconds() / interval_sec)
+    n_previous = math.ceil(
+        (start_date - pre_start).total_seconds() / interval_sec
+    )
+
+    # get previous psd values, only the values that are not in the local
+    # cache yet are fetched from the database
+    if cache is None:
+        cache = get_cache(args)
 
-    # get previous psd values
     pre_psd = f.get_previous_all_psd(
         system_ids,
         pre_start,
         end_date,
         args.interval,
+        cache=cache,
+        connection=connection,
     )
 
     # for each station location
@@ -248,30 +933,26 @@ def main(args):
         # for each antenna from a location
         for antenna in systems[lcode].keys():
             sys_id = systems[lcode][antenna]
-            requested_date = pre_start
-            previous_noise = []
-            previous_dates = []
-            previous_calibrator = []
-            sys_in_pre_psd = sys_id in pre_psd.keys()
-
-            if sys_in_pre_psd:
-                # first loop trough the previous psd values in order to get the
-                # requested dates
-                while requested_date < start_date:
-                    str_date = requested_date.strftime('%Y-%m-%d %H:%M')
-                    if str_date in pre_psd[sys_id].keys():
-                        previous_noise.append(
-                            pre_psd[sys_id][str_date]['noise']
-                        )
-                        previous_dates.append(str_date)
-                        previous_calibrator.append(
-                            pre_psd[sys_id][str_date]['calibrator']
-                        )
+            # psd values before the watermark were already stored by the
+            # interrupted run
+            watermark = watermarks.get(sys_id, start_date)
+            known, pre_noise, pre_calibrator = get_slot_values(
+                pre_psd.get(sys_id),
+                pre_start,
+                args.interval,
+                n_slots,
+            )
 
-                    requested_date += interval_delta
+            # first take the previous psd values in order to get the
+            # requested dates
+            previous = np.flatnonzero(known[:n_previous])
+            previous_dates = get_str_dates(
+                int(pre_start.timestamp()) + previous * int(interval_sec)
+            )
+            previous_noise = pre_noise[previous].tolist()
+            previous_calibrator = pre_calibrator[previous].tolist()
 
             requested_date = start_date
-            pre_psd_length = len(previous_dates)
 
             with tqdm(
                 total=difference,
@@ -287,75 +968,71 @@ def main(args):
                     if sys_id not in psd_memory.keys():
                         # add a dict to the noise_memory variable representing
                         # psd values for the current station
-                        psd_memory[sys_id] = {
-                            "title": f'{lcode}{antenna}',
-                            "i": len(previous_noise) - 1,
-                            "x": previous_dates,
-                            "n_y": previous_noise,
-                            "c_y": previous_calibrator,
-                            "previous_f": None,
-                            "warnings": {
-                                "noise": {
-                                    "desc": [],
-                                    "asc": [],
-                                },
-                                "calibrator": [],
-                            },
-                        }
+                        psd_memory[sys_id] = new_system_memory(
+                            f'{lcode}{antenna}',
+                            previous_dates,
+                            previous_noise,
+                            previous_calibrator,
+                        )
 
                     sys_psd = psd_memory[sys_id]
-
-                    if sys_in_pre_psd:
-                        # if the psd values was already stored in the database
-                        # and the --overwrite, -o flag is not set
-                        if (
-                            str_date in pre_psd[sys_id].keys()
-                            and not args.overwrite
-                        ):
-                            # just take that value and don't calculate the psd
-                            # again
-                            noise_psd = pre_psd[sys_id][str_date]['noise']
-                            calibrator_psd = (
-                                pre_psd[sys_id][str_date]['calibrator']
-                            )
-                            calculate = False
+                    resumed = requested_date < watermark
+                    slot = int((requested_date - pre_start) / interval_delta)
+
+                    # if the psd values was already stored in the database
+                    # and the --overwrite, -o flag is not set (or the
+                    # value was stored by the interrupted run)
+                    if known[slot] and (not args.overwrite or resumed):
+                        # just take that value and don't calculate the psd
+                        # again
+                        noise_psd = float(pre_noise[slot])
+                        calibrator_psd = float(pre_calibrator[slot])
+                        calculate = False
+
+                    if calculate and resumed:
+                        # the interrupted run did not find a file for this
+                        # date, don't search it again
+                        requested_date += interval_delta
+                        progress[sys_id] = requested_date
+                        pbar.update(1)
+                        continue
 
                     if calculate:
                         # try to get the wav file
                         try:
-                            wav = BramsWavFile(
+                            wav = wav_loader(
                                 requested_date,
                                 lcode,
                                 f"SYS{antenna.rjust(3, '0')}",
-                                respect_date=True,
-                                parent_directory=args.directory,
-                                from_archive=from_archive,
                             )
                         except BramsError:
                             requested_date += interval_delta
+                            progress[sys_id] = requested_date
                             pbar.update(1)
                             continue
                         except DirectoryNotFoundError:
                             requested_date += interval_delta
+                            progress[sys_id] = requested_date
                             pbar.update(1)
                             continue
 
-                            # get noise and calibrator psd values
-                        noise_psd = Decimal(psd.get_noise_psd(wav))
-                        calibrator_psd, calibrator_f = (
-                            psd.get_calibrator_psd(wav)
-                        )
-                        calibrator_psd = Decimal(calibrator_psd)
+                        # get noise and calibrator psd values
+                        noise_psd, calibrator_psd = calculate_psd(wav)
 
                         # add those values together with their system_id and
                         # time to the dictionary that will be inserted into
                         # the database
-                        files.append({
-                            "system_id": sys_id,
-                            "time": str_date,
-                            "noise_psd": noise_psd,
-                            "calibrator_psd": calibrator_psd
-                        })
+                        row = get_row(
+                            sys_id, str_date, noise_psd, calibrator_psd
+                        )
+                        psd_writer.push(row)
+                        pending += 1
+
+                        if args.json:
+                            json_files.append(row)
+
+                        if cache is not None:
+                            cached_rows.append(row)
 
                     # increment the counter, append an x value and append the
                     # psd value to the y array
@@ -367,59 +1044,152 @@ def main(args):
                     # if there is at least 12 days of psd data available
                     # check for marginal noise/calibrator variations
                     if sys_psd['i'] >= detection_condition_value:
-                        relevant_noise_y = (
-                            sys_psd
-                            ['n_y']
-                            [-detection_condition_value:]
-                        )
-                        noise_variations = variations.detect_noise_variations(
-                            relevant_noise_y,
-                            noise_psd,
+                        noise_y = sys_psd['n_y'][-detection_condition_value:]
+                        calibrator_y = (
+                            sys_psd['c_y'][-detection_condition_value:]
                         )
-                        # detect high noise increases
-                        if noise_variations > 0:
-                            sys_psd['warnings']['noise']['asc'].append(
-                                requested_date.strftime('%Y-%m-%d %H:%M')
+                        noise_variation, calibrator_variation = (
+                            check_variations(
+                                sys_psd['warnings'],
+                                noise_y,
+                                calibrator_y,
+                                noise_psd,
+                                calibrator_psd,
+                                str_date,
                             )
+                        )
 
-                        # do the same, but this time check for high noise
-                        # decreases
-                        elif noise_variations < 0:
-                            sys_psd['warnings']['noise']['desc'].append(
-                                requested_date.strftime('%Y-%m-%d %H:%M')
+                        # pinpoint the start of the variation in between
+                        # the previous and the current date
+                        if args.adaptive and (
+                            noise_variation != 0 or calibrator_variation < 0
+                        ):
+                            onset, rows = refine_onset(
+                                wav_loader,
+                                sys_id,
+                                lcode,
+                                antenna,
+                                requested_date - interval_delta,
+                                requested_date,
+                                fine_interval,
+                                noise_y,
+                                calibrator_y,
+                                noise_variation,
+                                calibrator_variation,
+                                # the stored fine values are only
+                                # calculated again with --overwrite
+                                None if args.overwrite else get_fine_values(
+                                    sys_id,
+                                    requested_date - interval_delta,
+                                    requested_date,
+                                    fine_interval,
+                                    connection,
+                                ),
                             )
 
-                        relevant_calibrator_y = (
-                            sys_psd
-                            ['c_y']
-                            [-detection_condition_value:]
-                        )
-                        calibrator_variations = (
-                            variations.detect_calibrator_variations(
-                                relevant_calibrator_y,
-                                calibrator_psd
-                            )
-                        )
+                            for row in rows:
+                                psd_writer.push(row)
 
-                        # check for high calibrator psd increase
-                        # if calibrator_variations > 0:
-                        #     sys_psd['warnings']['calibrator'].append(
-                        #         requested_date.strftime('%Y-%m-%d %H:%M'),
-                        #     )
+                            pending += len(rows)
+                            sys_psd['onsets'][str_date] = onset or str_date
+
+                            if args.json:
+                                json_files.extend(rows)
 
-                        # check for high calibrator psd decrease
-                        if calibrator_variations < 0:
-                            sys_psd['warnings']['calibrator'].append(
-                                requested_date.strftime('%Y-%m-%d %H:%M'),
-                            )
                     # increase the requested datetime by the interval
                     requested_date += interval_delta
+                    progress[sys_id] = requested_date
                     pbar.update(1)
 
-    # store the values into the database
-    f.insert_psd(files)
+                    # periodically save the progress in order to keep it on
+                    # crash
+                    if pending >= args.flush_size:
+                        psd_writer.checkpoint(dict(progress))
+                        pending = 0
+
+            # checkpoint at the end of each system
+            psd_writer.checkpoint(dict(progress))
+            pending = 0
+
+    # wait until the remaining values are stored into the database
+    stored = psd_writer.drain()
+    metrics = psd_writer.metrics
+    print(
+        f"Stored {metrics['rows_written']} psd values in "
+        f"{metrics['flushes']} flushes (mean flush latency "
+        f"{metrics['mean_flush_latency']:.3f} s, max "
+        f"{metrics['max_flush_latency']:.3f} s, max queue depth "
+        f"{metrics['max_queue_depth']}, "
+        f"{metrics['rows_per_second']:.0f} rows/s)."
+    )
+
+    if not stored:
+        print(
+            f"{metrics['rows_failed']} psd values could not be stored, run "
+            'the program again to resume from the last checkpoint.'
+        )
+    elif cache is not None:
+        # the cache is only updated when the database contains the values,
+        # the values taken from the database are already in the cache
+        cache.add([tuple(
+            [row[key] for row in cached_rows]
+            for key in (
+                'system_id', 'time', 'noise_psd', 'calibrator_psd',
+                'psd_version',
+            )
+        )])
+
+        cache.prune(pre_start)
+        cache.save()
+
+    if stored and args.checkpoint:
+        # the run is complete, nothing has to be resumed anymore
+        checkpoint.remove_checkpoint(args.checkpoint)
+
+    # update the hourly, daily and weekly statistics of the new values
+    if args.rollup:
+        rollup.update_rollups(psd_memory, start_date, args.rollup)
+
+    # group the variations happening on many systems at the same time
+    network_events = detect_network_events(
+        psd_memory,
+        pre_start,
+        start_date,
+        end_date,
+        args.interval,
+        detection_condition_value,
+        min_fraction=args.network_fraction,
+        min_systems=args.network_min_systems,
+    )
     # generate the summary
-    send_summary(psd_memory, args.email)
+    send_summary(psd_memory, args.email, network_events)
+
+    return {
+        'start_date': start_date,
+        'end_date': end_date,
+        'psd': psd_memory,
+        'network_events': network_events,
+        'stored': stored,
+        'metrics': metrics,
+        'rows': json_files,
+    }
+
+
+def main(args):
+    """
+    This function is the entrypoint of the program, it runs the monitoring
+    with the arguments given by the user and writes its output files.
+
+    Parameters
+    ----------
+    args : namespace
+        contains all the arguments given by the user
+    """
+    import simplejson as json
+
+    result = run_monitoring(args)
+    end_date = result['end_date']
+    psd_memory = result['psd']
 
     if args.start_date is None:
         # generate the program_data.json file for the next time this
@@ -436,36 +1206,525 @@ def main(args):
             json.dump(psd_memory, json_file)
 
         with open('file_data.json', 'w') as json_file:
-            json.dump(files, json_file)
+            json.dump(result['rows'], json_file)
 
     if args.plot or args.fmin is not None or args.fmax is not None:
         # if the option is set, generate plots of the calculated psd values
-        for i, sys_id in enumerate(psd_memory.keys()):
-            generate_plot(
-                psd_memory[sys_id]['x'][pre_psd_length:],
-                psd_memory[sys_id]['n_y'][pre_psd_length:],
-                f"{psd_memory[sys_id]['title']}_"
-                f"{args.start_date}_{args.end_date}_noise",
-                figure_n=i,
-                title=f"{psd_memory[sys_id]['title']} noise",
-                y_title='ADU²/Hz',
-                x_title='date',
-                y_min=args.fmin,
-                y_max=args.fmax,
+        plots = []
+        for sys_id in psd_memory.keys():
+            sys_psd = psd_memory[sys_id]
+            # only plot the requested dates, not the previous values
+            x = np.array(
+                sys_psd['x'][sys_psd['start_index']:],
+                dtype='datetime64[m]'
+            )
+
+            for name, key in (('noise', 'n_y'), ('calibrator', 'c_y')):
+                plots.append({
+                    'x': x,
+                    'y': np.array(
+                        sys_psd[key][sys_psd['start_index']:],
+                        dtype=float
+                    ),
+                    'im_name': (
+                        f"{sys_psd['title']}_"
+                        f"{args.start_date}_{args.end_date}_{name}"
+                    ),
+                    'dpi': args.dpi,
+                    'title': f"{sys_psd['title']} {name}",
+                    'y_title': 'ADU²/Hz',
+                    'x_title': 'date',
+                    'y_min': args.fmin,
+                    'y_max': args.fmax,
+                })
+
+        generate_plots(plots, args.plot_workers)
+
+
+def detect_network_events(
+    psd_memory,
+    pre_start,
+    start_date,
+    end_date,
+    interval,
+    window,
+    min_fraction=0.5,
+    min_systems=5,
+):
+    """
+    Function detects the noise variations happening on many systems at the
+    same time. The per system warnings of those variations are replaced by
+    a single network event listing the affected stations.
+
+    Parameters
+    ----------
+    psd_memory : dictionary
+        dictionary containing the psd values and warnings of each system
+    pre_start : datetime.datetime
+        date of the first previous psd value
+    start_date : datetime.datetime
+        date of the first calculated psd value
+    end_date : datetime.datetime
+        date upto which psd values were calculated
+    interval : int
+        interval in minutes between each psd value
+    window : int
+        number of previous psd values forming the baseline of a value
+    min_fraction : float, optional
+        minimum fraction of the systems that have to deviate,
+        by default 0.5
+    min_systems : int, optional
+        minimum number of systems that have to deviate, by default 5
+
+    Returns
+    -------
+    list
+        list of dictionaries with the date, the direction and the stations
+        of each network event
+    """
+    interval_delta = timedelta(minutes=interval)
+    sys_ids = list(psd_memory.keys())
+
+    # index of each slot in the psd matrix
+    slots = {}
+    slot_date = pre_start
+    while slot_date < end_date:
+        slots[slot_date.strftime('%Y-%m-%d %H:%M')] = len(slots)
+        slot_date += interval_delta
+
+    # build the systems x slots matrix
+    psd_matrix = np.full((len(sys_ids), len(slots)), np.nan)
+    for row, sys_id in enumerate(sys_ids):
+        sys_psd = psd_memory[sys_id]
+        for str_date, noise_psd in zip(sys_psd['x'], sys_psd['n_y']):
+            if str_date in slots and noise_psd is not None:
+                psd_matrix[row, slots[str_date]] = noise_psd
+
+    dates = list(slots.keys())
+    events = []
+
+    for event in variations.detect_network_variations(
+        psd_matrix,
+        slots.get(start_date.strftime('%Y-%m-%d %H:%M'), len(slots)),
+        window,
+        min_fraction=min_fraction,
+        min_systems=min_systems,
+    ):
+        str_date = dates[event['slot']]
+        direction = 'asc' if event['direction'] > 0 else 'desc'
+        stations = []
+
+        # the network event replaces the warnings of the affected systems
+        for row in event['systems']:
+            sys_psd = psd_memory[sys_ids[row]]
+            stations.append(sys_psd['title'])
+            noise_warnings = sys_psd['warnings']['noise'][direction]
+
+            if str_date in noise_warnings:
+                noise_warnings.remove(str_date)
+
+        events.append({
+            'date': str_date,
+            'direction': event['direction'],
+            'stations': stations,
+        })
+
+    return events
+
+
+def has_warnings(psd_memory):
+    """
+    Function checks if at least one warning was detected.
+
+    Parameters
+    ----------
+    psd_memory : dictionary
+        dictionary containing all the warnings detected by the program
+
+    Returns
+    -------
+    boolean
+        True if there is at least one warning, False otherwise
+    """
+    for system_id in psd_memory:
+        warnings = psd_memory[system_id]['warnings']
+        if (
+            len(warnings['noise']['desc'])
+            or len(warnings['noise']['asc'])
+            or len(warnings['calibrator'])
+        ):
+            return True
+
+    return False
+
+
+def run_daemon(args):
+    """
+    This function runs the monitoring continuously. The psd history of each
+    system is loaded once and kept in memory as rolling windows. The
+    database is then polled for newly arrived files, their psd values are
+    calculated and compared to the rolling windows within seconds. The
+    warnings are sent as a summary every --alert-period minutes.
+    The daemon stops on a keyboard interrupt (or SIGINT).
+
+    Parameters
+    ----------
+    args : namespace
+        contains all the arguments given by the user
+    """
+    # days needed to calculate the upper and lower limits for the variation
+    # detection program
+    MEAN_DAYS_PERIOD = 20
+    psd_memory = {}
+
+    args.interval = round_interval(args.interval)
+    # 1440 minutes per day (24 * 60)
+    detection_condition_value = int((MEAN_DAYS_PERIOD * 1440) / args.interval)
+
+    systems, system_ids = get_systems(args.stations)
+    system_names = get_system_names(systems)
+
+    load_wav = get_wav_loader(args.directory)
+
+    # load the history once
+    now = datetime.now(tz=timezone.utc)
+    print('Loading the psd history...')
+    cache = get_cache(args)
+    pre_psd = f.get_previous_all_psd(
+        system_ids,
+        now - timedelta(days=MEAN_DAYS_PERIOD),
+        now,
+        args.interval,
+        cache=cache,
+    )
+
+    if cache is not None:
+        cache.prune(now - timedelta(days=MEAN_DAYS_PERIOD))
+        cache.save()
+
+    # keep only the values needed to detect variations in memory
+    for sys_id, (lcode, antenna) in system_names.items():
+        history = pre_psd.get(sys_id)
+        if history is None:
+            history = {'start': [], 'noise': [], 'calibrator': []}
+
+        psd_memory[sys_id] = new_system_memory(
+            f'{lcode}{antenna}',
+            deque(
+                get_str_dates(history['start']),
+                maxlen=detection_condition_value,
+            ),
+            deque(
+                np.asarray(history['noise'], dtype=float).tolist(),
+                maxlen=detection_condition_value,
+            ),
+            deque(
+                np.asarray(history['calibrator'], dtype=float).tolist(),
+                maxlen=detection_condition_value,
+            ),
+        )
+
+    del pre_psd
+
+    psd_writer = writer.PsdWriter(
+        batch_size=args.flush_size,
+        flush_interval=args.flush_interval,
+        strategy=args.write_strategy,
+    )
+    # files being calculated or already calculated but not stored yet
+    seen = set()
+    last_summary = time.monotonic()
+    last_rollup = datetime.now(tz=timezone.utc)
+
+    print(f'Monitoring {len(system_ids)} systems, press Ctrl+C to stop...')
+
+    try:
+        while True:
+            since = (
+                datetime.now(tz=timezone.utc)
+                - timedelta(hours=args.lookback)
             )
-            generate_plot(
-                psd_memory[sys_id]['x'][pre_psd_length:],
-                psd_memory[sys_id]['c_y'][pre_psd_length:],
-                f"{psd_memory[sys_id]['title']}_"
-                f'{args.start_date}_{args.end_date}_calibrator',
-                figure_n=i + len(psd_memory.keys()),
-                title=f"{psd_memory[sys_id]['title']} calibrator",
-                y_title='ADU²/Hz',
-                x_title='date',
-                y_min=args.fmin,
-                y_max=args.fmax,
+            seen = {key for key in seen if key[1] >= since}
+
+            for new_file in f.get_new_files(system_ids, since):
+                sys_id = new_file['system_id']
+                start = new_file['start']
+
+                # only calculate the files respecting the interval
+                if (
+                    (sys_id, start) in seen
+                    or (start.hour * 60 + start.minute) % args.interval
+                ):
+                    continue
+
+                lcode, antenna = system_names[sys_id]
+
+                # the file may not be in the archive yet, it will be tried
+                # again during the next poll
+                try:
+                    wav = load_wav(start, lcode, f"SYS{antenna.rjust(3, '0')}")
+                except (BramsError, DirectoryNotFoundError):
+                    continue
+
+                seen.add((sys_id, start))
+                str_date = start.strftime('%Y-%m-%d %H:%M')
+                noise_psd, calibrator_psd = calculate_psd(wav)
+                psd_writer.push(
+                    get_row(sys_id, str_date, noise_psd, calibrator_psd)
+                )
+
+                # update the rolling windows and check the new values
+                sys_psd = psd_memory[sys_id]
+                sys_psd['i'] += 1
+                sys_psd['x'].append(str_date)
+                sys_psd['n_y'].append(noise_psd)
+                sys_psd['c_y'].append(calibrator_psd)
+
+                if sys_psd['i'] >= detection_condition_value:
+                    check_variations(
+                        sys_psd['warnings'],
+                        sys_psd['n_y'],
+                        sys_psd['c_y'],
+                        noise_psd,
+                        calibrator_psd,
+                        str_date,
+                    )
+
+            # send the batched warnings
+            if time.monotonic() - last_summary >= args.alert_period * 60:
+                # the rolling windows hold the complete buckets of the new
+                # values
+                if args.rollup:
+                    rollup.update_rollups(
+                        psd_memory,
+                        last_rollup - timedelta(hours=args.lookback),
+                        args.rollup
+                    )
+                    last_rollup = datetime.now(tz=timezone.utc)
+
+                if has_warnings(psd_memory):
+                    send_summary(psd_memory, args.email)
+
+                for sys_id in psd_memory:
+                    psd_memory[sys_id]['warnings'] = new_warnings()
+                last_summary = time.monotonic()
+
+            time.sleep(args.poll)
+    except KeyboardInterrupt:
+        print('Stopping the monitoring daemon...')
+
+    psd_writer.drain()
+
+    if has_warnings(psd_memory):
+        send_summary(psd_memory, args.email)
+
+
+def recompute_stale(args, connection=None):
+    """
+    This function recalculates the psd values stored with an older version
+    of the psd calculation (see psd.PSD_VERSION), the most recent ones
+    first. The files are calculated in parallel by worker processes, by
+    batches of --flush-size files.
+
+    Parameters
+    ----------
+    args : namespace
+        contains all the arguments given by the user
+    connection : MySQLConnection, optional
+        open connection used to read from the database, by default None
+
+    Returns
+    -------
+    dict
+        number of 'recalculated' psd values, of 'missing' files (their psd
+        values stay stale), wether every value was 'stored' and number of
+        stale psd values 'remaining'
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    from itertools import repeat
+    from tqdm import tqdm
+
+    if not db.has_column('file', 'psd_version', connection):
+        raise RuntimeError(
+            'The file table has no psd_version column, apply the '
+            'migrations first (utility/migrate.py).'
+        )
+
+    systems, system_ids = get_systems(args.stations, connection)
+    system_names = get_system_names(systems)
+    start_date = None
+    end_date = None
+
+    if args.start_date is not None:
+        start_date = datetime.strptime(args.start_date, '%Y-%m-%d')
+
+    if args.end_date is not None:
+        end_date = datetime.strptime(args.end_date, '%Y-%m-%d')
+
+    stale_files = f.get_stale_files(
+        system_ids,
+        psd.PSD_VERSION,
+        start_date,
+        end_date,
+        args.stale_limit,
+        connection,
+    )
+    print(
+        f'Recalculating {len(stale_files)} psd values older than version '
+        f'{psd.PSD_VERSION}'
+    )
+
+    psd_writer = writer.PsdWriter(
+        batch_size=args.flush_size,
+        flush_interval=args.flush_interval,
+        strategy=args.write_strategy,
+    )
+    recalculated = 0
+    missing = 0
+
+    with ProcessPoolExecutor(max_workers=args.workers) as executor, tqdm(
+        total=len(stale_files),
+        desc='Recalculating stale psd values...',
+    ) as pbar:
+        # the files are calculated by batches of flush_size files, so only
+        # one batch of tasks and results is held at once
+        for batch_start in range(0, len(stale_files), args.flush_size):
+            batch = stale_files[batch_start:batch_start + args.flush_size]
+            results = executor.map(
+                calculate_file_psd,
+                [stale_file['start'] for stale_file in batch],
+                [
+                    system_names[stale_file['system_id']][0]
+                    for stale_file in batch
+                ],
+                [
+                    'SYS'
+                    f"{system_names[stale_file['system_id']][1].rjust(3, '0')}"
+                    for stale_file in batch
+                ],
+                repeat(args.directory),
+                chunksize=16,
             )
 
+            # the results come in the order of the files, newest first
+            for stale_file, result in zip(batch, results):
+                pbar.update(1)
+
+                if result is None:
+                    missing += 1
+                    continue
+
+                psd_writer.push(get_row(
+                    stale_file['system_id'],
+                    stale_file['start'].strftime('%Y-%m-%d %H:%M'),
+                    *result
+                ))
+                recalculated += 1
+
+    stored = psd_writer.drain()
+    remaining = f.count_stale_files(
+        system_ids,
+        psd.PSD_VERSION,
+        start_date,
+        end_date,
+        connection,
+    )
+    print(
+        f'Recalculated {recalculated} psd values, {missing} files could not '
+        f'be read. {remaining} psd values remain stale.'
+    )
+
+    return {
+        'recalculated': recalculated,
+        'missing': missing,
+        'stored': stored,
+        'remaining': remaining,
+    }
+
+
+def decimate(x, y, n_buckets):
+    """
+    Function reduces the number of points of a series by keeping only the
+    minimum and the maximum value of each bucket of consecutive points.
+    With one bucket per pixel, the plotted line looks the same as the line
+    of the whole series.
+
+    Parameters
+    ----------
+    x : np.array
+        array with x axis values
+    y : np.array
+        array with y axis values, nan values are ignored
+    n_buckets : int
+        number of buckets (typically the width of the plot in pixels)
+
+    Returns
+    -------
+    tuple
+        decimated x and y arrays
+    """
+    if len(y) <= 2 * n_buckets:
+        return x, y
+
+    bucket_size = math.ceil(len(y) / n_buckets)
+    padding = math.ceil(len(y) / bucket_size) * bucket_size - len(y)
+
+    # ignore nan values and padding when searching the extrema
+    low_y = np.concatenate(
+        (np.where(np.isnan(y), np.inf, y), np.full(padding, np.inf))
+    ).reshape(-1, bucket_size)
+    high_y = np.concatenate(
+        (np.where(np.isnan(y), -np.inf, y), np.full(padding, -np.inf))
+    ).reshape(-1, bucket_size)
+    offsets = np.arange(0, len(y) + padding, bucket_size)
+
+    # keep the extrema in time order
+    indices = np.unique(np.concatenate((
+        low_y.argmin(axis=1) + offsets,
+        high_y.argmax(axis=1) + offsets,
+    )))
+    indices = indices[indices < len(y)]
+
+    return x[indices], y[indices]
+
+
+# figures reused from one plot to another, by size and dpi
+figures = {}
+
+
+def get_figure(width, height, dpi):
+    """
+    Function returns an empty figure with the requested size. The figures
+    are drawn with the Agg backend and reused from one plot to another.
+
+    Parameters
+    ----------
+    width : float
+        width of the figure in inches
+    height : float
+        height of the figure in inches
+    dpi : float
+        dpi of the figure
+
+    Returns
+    -------
+    matplotlib.figure.Figure
+        empty figure
+    """
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    key = (width, height, dpi)
+
+    if key not in figures:
+        figures[key] = Figure(figsize=(width, height), dpi=dpi)
+        FigureCanvasAgg(figures[key])
+
+    figure = figures[key]
+    figure.clear()
+
+    return figure
+
 
 def generate_plot(
     x,
@@ -473,7 +1732,6 @@ def generate_plot(
     im_name,
     width=26.5,
     height=14.4,
-    figure_n=0,
     dpi=350.0,
     title='',
     y_title='',
@@ -488,7 +1746,8 @@ def generate_plot(
     Parameters
     ----------
     x : np.array
-        array with x axis values
+        array with x axis values, dates as 'YYYY-MM-DD hh:mm' strings or
+        np.datetime64 values
     y : np.array
         array with y axis values
     im_name : str
@@ -497,8 +1756,6 @@ def generate_plot(
         width of the generated plot, by default 26.5
     height : float, optional
         height of the generated plot, by default 14.4
-    figure_n : int, optional
-        figure number of the plot, by default 0
     dpi : float, optional
         dpi of the stored plot image, by default 350.0
     title : str, optional
@@ -512,35 +1769,67 @@ def generate_plot(
     y_max : float, optional
         maximum y value to show on the plot, by default None
     """
+    import matplotlib.dates as mdates
+
     if not len(x) or not len(y) or not len(x) == len(y):
         return
 
+    # numeric dates are much faster to plot than categorical strings
+    x = mdates.date2num(np.array(x, dtype='datetime64[m]'))
+    y = np.array(y, dtype=float)
+    x, y = decimate(x, y, int(width * dpi))
+
     # generate the plot figure with correct dimensions
-    plt.figure(num=figure_n, figsize=(width, height), dpi=dpi)
-    plt.plot(x, y)
+    figure = get_figure(width, height, dpi)
+    axis = figure.add_subplot()
+    axis.plot(x, y)
 
     # set the titles and limits
-    axis = plt.gca()
     axis.set_ylim([y_min, y_max])
-    plt.title(title)
-    plt.xlabel(x_title)
-    plt.ylabel(y_title)
-
-    if len(x) > 10:
-        step = int(len(x) / 10)
-    else:
-        step = 1
+    axis.set_title(title)
+    axis.set_xlabel(x_title)
+    axis.set_ylabel(y_title)
 
     # set the x axis labels
-    plt.xticks([i for i in range(0, len(x), step)])
+    locator = mdates.AutoDateLocator()
+    axis.xaxis.set_major_locator(locator)
+    axis.xaxis.set_major_formatter(mdates.ConciseDateFormatter(locator))
 
     # generate the plot image
-    plt.savefig(f'{im_name}.png')
-    plt.close(figure_n)
+    figure.savefig(f'{im_name}.png')
+    figure.clear()
     print(im_name)
 
 
-def arguments():
+def generate_plot_from_dict(plot):
+    # function unpacks the plot arguments, used by the process pool
+    generate_plot(**plot)
+
+
+def generate_plots(plots, workers=None):
+    """
+    Function generates several plots in parallel, each worker process
+    reusing its own figures.
+
+    Parameters
+    ----------
+    plots : list
+        list of dictionaries with the arguments of generate_plot
+    workers : int, optional
+        number of worker processes, by default None (one per processor)
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    if workers == 1 or len(plots) <= 1:
+        for plot in plots:
+            generate_plot(**plot)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(generate_plot_from_dict, plots))
+
+
+def arguments(argv=None):
     parser = argparse.ArgumentParser(
         description="""
             This program has two purposes. The first is to calculate and store
@@ -624,6 +1913,27 @@ def arguments():
         """,
         action='store_true'
     )
+    parser.add_argument(
+        '-a', '--adaptive',
+        help="""
+            If this flag is set, the psd values in between the previous date
+            and the date of a detected variation are calculated at the
+            --fine-interval in order to find when the variation started.
+            Those psd values are stored in the database as well. This flag
+            is ignored in daemon mode.
+        """,
+        action='store_true'
+    )
+    parser.add_argument(
+        '--fine-interval',
+        help="""
+            Interval in minutes in between the psd values calculated by the
+            adaptive mode. Defaults to 5 (the length of a file).
+        """,
+        default=5,
+        type=int,
+        nargs='?'
+    )
     parser.add_argument(
         '-p', '--plot',
         help="""
@@ -657,6 +1967,26 @@ def arguments():
         type=int,
         nargs='?'
     )
+    parser.add_argument(
+        '--dpi',
+        help="""
+            Resolution of the generated plots in dots per inch, lower it to
+            generate the plots faster. Defaults to 350.
+        """,
+        default=350.0,
+        type=float,
+        nargs='?'
+    )
+    parser.add_argument(
+        '--plot-workers',
+        help="""
+            Number of processes generating the plots in parallel. Defaults
+            to the number of processors.
+        """,
+        default=None,
+        type=int,
+        nargs='?'
+    )
     parser.add_argument(
         '-j', '--json',
         help="""
@@ -678,7 +2008,184 @@ def arguments():
         nargs='?'
     )
 
-    args = parser.parse_args()
+    parser.add_argument(
+        '-c', '--checkpoint',
+        help="""
+            Path of the checkpoint file. The progress of the run is stored in
+            this file each time psd values are flushed to the database. If
+            the program is interrupted, running it again with the same
+            arguments resumes the run where it stopped. The file is removed
+            once the run completes. By default, no checkpoint is kept.
+        """,
+        default=None,
+        type=str,
+        nargs='?'
+    )
+    parser.add_argument(
+        '--flush-size',
+        help="""
+            Number of psd values stored in the database at once. The
+            progress of the run is saved every time this number of values
+            has been calculated. Defaults to 500.
+        """,
+        default=500,
+        type=int,
+        nargs='?'
+    )
+    parser.add_argument(
+        '--flush-interval',
+        help="""
+            Maximum number of seconds a calculated psd value waits before it
+            is stored in the database. Defaults to 30.
+        """,
+        default=30.0,
+        type=float,
+        nargs='?'
+    )
+
+    parser.add_argument(
+        '--write-strategy',
+        help="""
+            How the psd values are stored in the database. 'update' runs one
+            UPDATE per value. 'staging' inserts each batch in a temporary
+            MEMORY table and updates the files with a single joined UPDATE,
+            which needs the CREATE TEMPORARY TABLES privilege. 'upsert' runs
+            a single INSERT ... ON DUPLICATE KEY UPDATE per batch, it needs a
+            unique key on (system_id, start) (the run stops without it) and
+            inserts a new file row (without path nor precise dates) for each
+            value whose file is not in the database, only use it when every
+            file exists.
+            Defaults to update.
+        """,
+        default='update',
+        choices=f.WRITE_STRATEGIES,
+        type=str,
+    )
+
+    parser.add_argument(
+        '-r', '--rollup',
+        help="""
+            Path of the local sqlite file holding the hourly, daily and
+            weekly statistics (count, minimum, quartiles, median, maximum)
+            of the noise and calibrator psd values of each system. These
+            statistics are updated with the new psd values at the end of
+            each run (for instance psd_rollup.db). By default, no
+            statistics are kept.
+        """,
+        default=None,
+        type=str,
+        nargs='?'
+    )
+    parser.add_argument(
+        '--cache',
+        help="""
+            Prefix of the local psd history cache files (one per interval).
+            Only the psd values that are not in the cache yet are fetched
+            from the database (for instance psd_cache, which gives
+            psd_cache_60.npz for 60 minutes intervals). Delete the cache
+            files to fetch everything again. By default, no cache is used.
+        """,
+        default=None,
+        type=str,
+        nargs='?'
+    )
+    parser.add_argument(
+        '--network-fraction',
+        help="""
+            Minimum fraction of the systems that have to show a noise
+            variation at the same time for it to be reported as a single
+            network event. Defaults to 0.5.
+        """,
+        default=0.5,
+        type=float,
+        nargs='?'
+    )
+    parser.add_argument(
+        '--network-min-systems',
+        help="""
+            Minimum number of systems that have to show a noise variation
+            at the same time for it to be reported as a single network
+            event. Defaults to 5.
+        """,
+        default=5,
+        type=int,
+        nargs='?'
+    )
+    parser.add_argument(
+        '--daemon',
+        help="""
+            If this flag is set, the program runs continuously. It loads the
+            psd history once, then polls the database for new files and
+            calculates their psd values as soon as they arrive. The START
+            DATE, END DATE, --overwrite, --plot and --json arguments are
+            ignored in this mode.
+        """,
+        action='store_true'
+    )
+    parser.add_argument(
+        '--recompute-stale',
+        help="""
+            If this flag is set, the program recalculates the psd values
+            that were calculated by an older version of the psd calculation,
+            the most recent ones first, and reports how many remain stale.
+            The START DATE and END DATE arguments limit the files to
+            recalculate. The other modes are not run.
+        """,
+        action='store_true'
+    )
+    parser.add_argument(
+        '--stale-limit',
+        help="""
+            Maximum number of stale psd values recalculated by
+            --recompute-stale. Defaults to no limit.
+        """,
+        default=None,
+        type=int,
+        nargs='?'
+    )
+    parser.add_argument(
+        '--workers',
+        help="""
+            Number of processes recalculating stale psd values in parallel.
+            Defaults to the number of processors.
+        """,
+        default=None,
+        type=int,
+        nargs='?'
+    )
+    parser.add_argument(
+        '--poll',
+        help="""
+            Number of seconds between each poll for new files in daemon
+            mode. Defaults to 30.
+        """,
+        default=30.0,
+        type=float,
+        nargs='?'
+    )
+    parser.add_argument(
+        '--alert-period',
+        help="""
+            Number of minutes between each warnings summary in daemon mode.
+            Defaults to 60.
+        """,
+        default=60.0,
+        type=float,
+        nargs='?'
+    )
+    parser.add_argument(
+        '--lookback',
+        help="""
+            Number of hours the daemon looks back for files without psd
+            values, files arriving late are still calculated within this
+            period. Defaults to 6.
+        """,
+        default=6.0,
+        type=float,
+        nargs='?'
+    )
+
+    args = parser.parse_args(argv)
     return args
 
 
@@ -690,7 +2197,15 @@ if __name__ == '__main__':
     #     directory=default_dir,
     # )
     args = arguments()
-    main(args)
+    # fail before calculating anything if the values cannot be stored
+    f.check_write_strategy(args.write_strategy)
+
+    if args.recompute_stale:
+        recompute_stale(args)
+    elif args.daemon:
+        run_daemon(args)
+    else:
+        main(args)
     # test_methods(args)
 
     # print(
@@ -0,0 +1,68 @@
+import modules.database.mirror as mirror
+import pytest
+
+from datetime import datetime, timedelta, timezone
+from modules.database.interval_index import FileIndex
+
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+FILE_DURATION = 300 * 1000000
+
+
+@pytest.fixture
+def local_mirror(tmp_path):
+    """
+    Mirror with the files of system 1, one every 5 minutes during an hour.
+    The file of 00:30 is a bare row without precise dates.
+    """
+    connection = mirror.get_connection(str(tmp_path / 'mirror.db'))
+    mirror.replace_rows(
+        connection, 'location', mirror.LOCATION_COLUMNS,
+        [(1, 'BEHUMA', 5.0, 50.0)]
+    )
+    mirror.replace_rows(
+        connection, 'system', mirror.SYSTEM_COLUMNS, [(1, 1, 1)]
+    )
+    rows = []
+
+    for i in range(12):
+        start = mirror.get_timestamp(START + timedelta(minutes=5 * i))
+        precise = (start * 1000000, start * 1000000 + FILE_DURATION)
+
+        if i == 6:
+            precise = (None, None)
+
+        rows.append((i + 1, 1, start, *precise, f'{i}.wav', None, None, 1))
+
+    mirror.replace_rows(connection, 'file', mirror.FILE_COLUMNS, rows)
+    connection.commit()
+
+    yield connection
+
+    connection.close()
+
+
+def test_rows_without_precise_dates_are_ignored():
+    index = FileIndex([
+        (1, 'BEHUMA', 1, None, None, 0, 5.0, 50.0, 'bare.wav'),
+        (1, 'BEHUMA', 1, 0, FILE_DURATION, 0, 5.0, 50.0, 'file.wav'),
+    ])
+
+    assert [row[-1] for row in index.rows] == ['file.wav']
+    assert index.search([1000], [2000])[0].tolist() == [0]
+
+
+def test_load_skips_bare_files(local_mirror):
+    index = FileIndex.load(
+        [1], START, START + timedelta(hours=1), connection=local_mirror
+    )
+    paths = [row[-1] for row in index.rows]
+
+    assert len(paths) == 11
+    assert '6.wav' not in paths
+
+    # no other file covers the interval of the bare file
+    start_time = mirror.get_timestamp(START + timedelta(minutes=31))
+    files = index.search([start_time * 1000000], [start_time * 1000000])
+
+    assert [index.rows[i][-1] for i in files[0]] == []
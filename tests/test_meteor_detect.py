@@ -0,0 +1,108 @@
+import numpy as np
+import pytest
+
+from datetime import datetime, timezone
+from meteor_detect import get_meteor_coords
+from modules.meteor_detect.spectrogram import Spectrogram
+
+
+FILE_START = datetime(2022, 4, 23, tzinfo=timezone.utc)
+SAMPLE_FREQUENCY = 5512
+DURATION = 300
+METEOR_TIMES = (100.0, 150.2, 220.7)
+
+
+class SyntheticWav:
+    """
+    Wav file of 5 minutes with noise, the transmitter signal at 1000 Hz and
+    a short decaying chirp for each meteor.
+    """
+    def __init__(self):
+        rng = np.random.default_rng(0)
+        t = np.arange(DURATION * SAMPLE_FREQUENCY) / SAMPLE_FREQUENCY
+        self.fs = SAMPLE_FREQUENCY
+        self.Isamples = rng.normal(0, 1, len(t)) + 20 * np.sin(
+            2 * np.pi * 1000.3 * t
+        )
+
+        for meteor_time in METEOR_TIMES:
+            meteor = (t > meteor_time) & (t < meteor_time + 0.3)
+            elapsed = t[meteor] - meteor_time
+            self.Isamples[meteor] += 200 * np.exp(-elapsed * 5) * np.sin(
+                2 * np.pi * (1000 + 300 * elapsed) * t[meteor]
+            )
+
+
+@pytest.fixture(scope='module')
+def wav():
+    return SyntheticWav()
+
+
+def find_meteors(wav, detection_time, roi_margin, lean=False):
+    """
+    Function searches the meteors of the synthetic file around a detection
+    time, in seconds from the start of the file.
+    """
+    file_start = int(FILE_START.timestamp() * 1000000)
+    stations = {'BEHUMA': {'sys': {'1': {
+        FILE_START.strftime('%Y%m%d%H%M'): {
+            'start': file_start,
+            'end': file_start + DURATION * 1000000,
+            'file_path': 'synthetic.wav',
+        },
+    }}}}
+    interval = {
+        'start_time': file_start + (detection_time - 3) * 1000000,
+        'end_time': file_start + (detection_time + 3) * 1000000,
+    }
+
+    stations = get_meteor_coords(
+        stations,
+        interval,
+        wav_loader=lambda *args: wav,
+        roi_margin=roi_margin,
+        lean=lean,
+    )
+    system_file = next(iter(stations['BEHUMA']['sys']['1'].values()))
+
+    return [
+        (round(float(meteor['t']), 3), meteor['f_min'], meteor['f_max'])
+        for meteor in system_file['meteors']
+    ]
+
+
+def test_region_of_interest_finds_the_same_meteors(wav):
+    found = 0
+
+    for meteor_time in METEOR_TIMES:
+        whole_file = find_meteors(wav, meteor_time + 0.1, None)
+
+        assert find_meteors(wav, meteor_time + 0.1, 15) == whole_file
+        found += len(whole_file)
+
+    assert found
+
+
+def test_lean_mode_finds_the_same_meteors(wav):
+    found = 0
+
+    for meteor_time in METEOR_TIMES:
+        default = find_meteors(wav, meteor_time + 0.1, None)
+
+        assert find_meteors(wav, meteor_time + 0.1, None, True) == default
+        found += len(default)
+
+    assert found
+
+
+def test_lean_mode_keeps_the_audio_signal_only(wav):
+    default = Spectrogram(wav.Isamples, time_range=(90, 110))
+    lean = Spectrogram(wav.Isamples, time_range=(90, 110), lean=True)
+
+    assert default.audio_signal is None
+    assert lean.audio_signal is wav.Isamples
+    assert lean.Pxx_modified.dtype == np.float32
+    # the spectrogram in dB only differs by the float32 rounding
+    np.testing.assert_allclose(
+        lean.get_db_columns(2, 5), default.get_db_columns(2, 5), rtol=1e-4
+    )
@@ -0,0 +1,78 @@
+import modules.database.database as db
+import modules.database.file as fil
+import modules.database.migrate as migrate
+import modules.database.mirror as mirror
+import pytest
+
+from datetime import datetime, timedelta, timezone
+
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def local_mirror(tmp_path):
+    """
+    Mirror with the files of system 1, one every 10 minutes during a day.
+    """
+    connection = mirror.get_connection(str(tmp_path / 'mirror.db'))
+    mirror.replace_rows(connection, 'file', mirror.FILE_COLUMNS, [
+        (
+            i + 1,
+            1,
+            mirror.get_timestamp(START + timedelta(minutes=10 * i)),
+            None,
+            None,
+            None,
+            float(i),
+            None,
+            1,
+        )
+        for i in range(144)
+    ])
+    connection.commit()
+
+    yield connection
+
+    connection.close()
+
+
+@pytest.mark.parametrize('first_minute', [0, 10, 50])
+def test_slots_start_at_start_date(local_mirror, first_minute):
+    start_date = START + timedelta(minutes=first_minute)
+    psd = fil.select_previous_psd(
+        [1], start_date, START + timedelta(days=1), 60, local_mirror
+    )
+
+    expected = [
+        mirror.get_timestamp(start_date + timedelta(hours=hour))
+        for hour in range(24)
+        if start_date + timedelta(hours=hour) < START + timedelta(days=1)
+    ]
+    assert psd[1]['start'].tolist() == expected
+
+
+@pytest.mark.parametrize('start_minute', [True, False])
+def test_mysql_query_aligns_slots_to_start_date(start_minute):
+    start_date = START + timedelta(minutes=10)
+    sql_query, sql_args = fil.get_previous_psd_query(
+        [1], start_date, START + timedelta(days=1), 60, 'mysql', start_minute
+    )
+
+    assert sql_args[-2:] == (mirror.get_timestamp(start_date) // 60, 60)
+    assert ('start_minute' in sql_query) == start_minute
+
+
+def has_database():
+    """
+    Function tells wether a mysql database is configured.
+    """
+    return db.get_config()['host'] is not None
+
+
+@pytest.mark.skipif(not has_database(), reason='no mysql database')
+@pytest.mark.parametrize('name', sorted(migrate.QUERY_INDEXES))
+def test_queries_use_indexes(name):
+    uses_index, plan = migrate.check_indexes()[name]
+
+    assert uses_index, plan
@@ -0,0 +1,107 @@
+import numpy as np
+import pytest
+
+from modules.psd.psd import find_stable_ridge
+
+
+def stable_ridge_loop(Pxx, min_row, max_row, length=50, n_columns=None):
+    """
+    Function searches the stable ridge column by column, as the transmitter
+    and calibrator searches did before find_stable_ridge.
+    """
+    if n_columns is None:
+        n_columns = Pxx.shape[1]
+
+    same_index = 0
+    previous_index = 0
+    index = 0
+
+    while not same_index == length and index < n_columns:
+        max_column_index = Pxx[min_row:max_row, index].argmax()
+
+        if abs(max_column_index - previous_index) <= 1:
+            same_index += 1
+        else:
+            same_index = 0
+            previous_index = max_column_index
+
+        index += 1
+
+    if same_index < length:
+        return None
+
+    return previous_index + min_row
+
+
+def get_ridge_spectrogram(rows, n_rows=40):
+    """
+    Function generates a spectrogram whose highest row of each column is
+    given, on a constant background.
+    """
+    Pxx = np.ones((n_rows, len(rows)))
+    Pxx[rows, np.arange(len(rows))] = 10
+
+    return Pxx
+
+
+def test_constant_ridge():
+    Pxx = get_ridge_spectrogram([12] * 60)
+
+    assert find_stable_ridge(Pxx, 5, 30) == (0, 12)
+
+
+def test_ridge_within_one_row_of_its_first_column():
+    # the rows alternate around the anchor of the run
+    Pxx = get_ridge_spectrogram([12, 13, 11, 12, 13] * 12)
+
+    assert find_stable_ridge(Pxx, 5, 30) == (0, 12)
+
+
+def test_drifting_ridge_starts_a_new_run():
+    # 13 then 14 are within 1 row of their neighbour, not of the anchor 12
+    Pxx = get_ridge_spectrogram([12] * 10 + [13] * 10 + [14] * 60)
+
+    assert find_stable_ridge(Pxx, 5, 30) == (20, 14)
+
+
+def test_unstable_start():
+    rows = [3, 30, 8, 25, 17, 5, 33, 20] + [22] * 60
+    Pxx = get_ridge_spectrogram(rows)
+
+    assert find_stable_ridge(Pxx, 0, 40) == (8, 22)
+
+
+def test_ties_take_the_lowest_row():
+    Pxx = get_ridge_spectrogram([12] * 60)
+    Pxx[20] = 10
+
+    assert find_stable_ridge(Pxx, 5, 30) == (0, 12)
+    # the tied row below min_row is not searched
+    assert find_stable_ridge(Pxx, 15, 30) == (0, 20)
+
+
+def test_no_stable_ridge():
+    Pxx = get_ridge_spectrogram([12] * 50)
+
+    # the first column only sets the anchor of the run
+    assert find_stable_ridge(Pxx, 5, 30) is None
+    assert find_stable_ridge(Pxx, 5, 30, length=49) == (0, 12)
+    assert find_stable_ridge(
+        get_ridge_spectrogram([12] * 60), 5, 30, n_columns=50
+    ) is None
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_same_row_as_the_loop(seed):
+    rng = np.random.default_rng(seed)
+
+    for i in range(200):
+        n_columns = int(rng.integers(1, 120))
+        # a few rows only, so stable runs and ties happen
+        Pxx = rng.integers(0, 4, (8, n_columns)).astype(float)
+        length = int(rng.integers(1, 10))
+        ridge = find_stable_ridge(Pxx, 2, 8, length)
+
+        assert (None if ridge is None else ridge[1]) == stable_ridge_loop(
+            Pxx, 2, 8, length
+        )
@@ -0,0 +1,123 @@
+import modules.database.file as fil
+import modules.database.mirror as mirror
+import modules.database.psd_cache as psd_cache
+import numpy as np
+import pytest
+
+from datetime import datetime, timedelta, timezone
+
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def local_mirror(tmp_path):
+    """
+    Mirror with the files of systems 1 and 2, one every 10 minutes during
+    30 days, calculated by version 1 of the psd calculation.
+    """
+    connection = mirror.get_connection(str(tmp_path / 'mirror.db'))
+    n_files = 30 * 144
+    mirror.replace_rows(connection, 'file', mirror.FILE_COLUMNS, [
+        (
+            sys_id * n_files + i,
+            sys_id,
+            mirror.get_timestamp(START + timedelta(minutes=10 * i)),
+            None,
+            None,
+            None,
+            float(sys_id * n_files + i),
+            float(i),
+            1,
+        )
+        for sys_id in (1, 2)
+        for i in range(n_files)
+    ])
+    connection.commit()
+
+    yield connection
+
+    connection.close()
+
+
+def get_psd(connection, start_days, end_days, cache=None):
+    """
+    Function gets the psd values of both systems between 2 days of the
+    mirror.
+    """
+    return fil.get_previous_all_psd(
+        [1, 2],
+        START + timedelta(days=start_days),
+        START + timedelta(days=end_days),
+        60,
+        cache=cache,
+        connection=connection,
+    )
+
+
+def assert_same_psd(psd, expected):
+    assert sorted(psd) == sorted(expected)
+
+    for sys_id in expected:
+        for key in ('start', 'noise', 'calibrator'):
+            np.testing.assert_array_equal(
+                psd[sys_id][key], expected[sys_id][key]
+            )
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return psd_cache.PsdCache(str(tmp_path / 'cache_60.npz'), 60, 1)
+
+
+def test_backfill_before_the_covered_range(local_mirror, cache):
+    get_psd(local_mirror, 10, 20, cache)
+    cache.prune(START + timedelta(days=15))
+
+    assert_same_psd(
+        get_psd(local_mirror, 5, 25, cache), get_psd(local_mirror, 5, 25)
+    )
+    assert cache.ranges[1] == (
+        psd_cache.get_slot(START + timedelta(days=5)),
+        psd_cache.get_slot(START + timedelta(days=25)),
+    )
+
+
+def test_saved_cache_is_reloaded(local_mirror, cache):
+    get_psd(local_mirror, 10, 20, cache)
+    cache.save()
+
+    loaded = psd_cache.PsdCache(cache.path, 60, 1)
+
+    assert loaded.ranges == cache.ranges
+    assert_same_psd(
+        get_psd(local_mirror, 12, 18, loaded), get_psd(local_mirror, 12, 18)
+    )
+
+
+def test_other_slots_replace_the_cached_values(local_mirror, cache):
+    get_psd(local_mirror, 10, 20, cache)
+    start_days = 10 + 10 / 1440
+
+    assert_same_psd(
+        get_psd(local_mirror, start_days, 20, cache),
+        get_psd(local_mirror, start_days, 20),
+    )
+
+
+def test_recalculated_values_are_fetched_again(local_mirror, tmp_path):
+    cache = psd_cache.PsdCache(str(tmp_path / 'cache_60.npz'), 60, 2)
+    get_psd(local_mirror, 10, 20, cache)
+
+    recalculated = mirror.get_timestamp(START + timedelta(days=12))
+    local_mirror.execute(
+        "UPDATE file SET noise = -1, psd_version = 2\n"
+        "WHERE system_id = 1 AND start = ?",
+        (recalculated,)
+    )
+    local_mirror.commit()
+
+    psd = get_psd(local_mirror, 10, 20, cache)
+
+    assert_same_psd(psd, get_psd(local_mirror, 10, 20))
+    assert -1 in psd[1]['noise']
@@ -0,0 +1,498 @@
+import numpy as np
+import pytest
+
+from modules.meteor_detect.morphology import (
+    filter_columns_by_percentile, set_column_runs
+)
+from modules.meteor_detect.spectrogram import (
+    find_edge, replace_band, Spectrogram, sum_column_spans
+)
+from scipy import ndimage
+
+
+def replace_band_loop(Pxx, start_row, end_row, width=3):
+    """
+    Function replaces the rows of a frequency band block by block, as the
+    spectrogram did before replace_band.
+    """
+    for row in range(start_row, end_row + 1):
+        for start_col in range(0, Pxx.shape[1], width):
+            end_col = start_col + width
+            Pxx[row, start_col:end_col] = (
+                np.mean(Pxx[start_row - 1, start_col:end_col])
+                + np.mean(Pxx[end_row + 1, start_col:end_col])
+            ) / 2
+
+
+@pytest.mark.parametrize('n_columns', [1, 2, 3, 104, 105, 871])
+def test_replace_band_as_the_loop(n_columns):
+    rng = np.random.default_rng(n_columns)
+    Pxx = rng.lognormal(0, 1, (64, n_columns))
+    expected = Pxx.copy()
+
+    replace_band(Pxx, 20, 25)
+    replace_band_loop(expected, 20, 25)
+
+    np.testing.assert_allclose(Pxx, expected, rtol=1e-12, atol=0)
+    # the rows around the band are kept
+    np.testing.assert_array_equal(Pxx[:20], expected[:20])
+    np.testing.assert_array_equal(Pxx[26:], expected[26:])
+
+
+def sum_column_spans_loop(Pxx, starts, stops):
+    """
+    Function sums the columns of each span one by one, as get_meteor_specs
+    did before sum_column_spans.
+    """
+    sums = np.zeros((len(starts), Pxx.shape[0]))
+
+    for span_sums, start, stop in zip(sums, starts, stops):
+        for column in range(start, stop):
+            span_sums += Pxx[:, column]
+
+    return sums
+
+
+def find_edge_loop(fft_slice, min_value, index, step):
+    """
+    Function walks the fft bin by bin, as get_meteor_specs did before
+    find_edge.
+    """
+    min_value_count = 0
+
+    while min_value_count < 2 and (
+        index > 0 if step < 0 else index < len(fft_slice)
+    ):
+        if fft_slice[index] == min_value:
+            min_value_count += 1
+        elif min_value > 0:
+            min_value_count -= 1
+
+        index += step
+
+    return index
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_sum_column_spans_as_the_loop(seed):
+    rng = np.random.default_rng(seed)
+    Pxx = rng.lognormal(0, 1, (64, 120))
+    # empty spans, spans reaching the last column and overlapping spans
+    starts = [0, 10, 10, 119, 50, 115, 0, 30]
+    stops = [5, 10, 40, 120, 50, 120, 120, 25]
+
+    sums = sum_column_spans(Pxx, starts, stops)
+
+    np.testing.assert_allclose(
+        sums, sum_column_spans_loop(Pxx, starts, stops), rtol=1e-12
+    )
+    assert not sums[1].any() and not sums[4].any() and not sums[7].any()
+
+
+def test_sum_column_spans_without_spans():
+    assert sum_column_spans(np.ones((64, 10)), [], []).shape == (0, 64)
+
+
+@pytest.mark.parametrize('seed', range(8))
+@pytest.mark.parametrize('step', [-1, 1])
+def test_find_edge_as_the_loop(seed, step):
+    rng = np.random.default_rng(seed)
+    fft_slice = rng.random(200)
+    # a positive and a negative minimum
+    fft_slice[rng.random(200) < 0.4] = 0.1
+    fft_slice[0] = 0.1
+
+    for min_value in (0.1, -fft_slice.max()):
+        filtered = fft_slice if min_value > 0 else np.where(
+            fft_slice == 0.1, min_value, fft_slice
+        )
+
+        # the walks start inside the rows of the meteor
+        for index in list(range(0, 200, 7)) + [199]:
+            assert find_edge(filtered, min_value, index, step) == (
+                find_edge_loop(filtered, min_value, index, step)
+            )
+
+
+@pytest.mark.parametrize('step, edge', [(-1, 0), (1, 50)])
+@pytest.mark.parametrize('min_value', [0.1, -1.0])
+def test_find_edge_without_edge(step, edge, min_value):
+    # a single minimum is met, the walk reaches the end of the fft
+    fft_slice = np.ones(50)
+    fft_slice[25] = min_value
+
+    assert find_edge(fft_slice, min_value, 25, step) == edge
+    assert find_edge_loop(fft_slice, min_value, 25, step) == edge
+
+
+def set_column_runs_loop(
+    spectrogram,
+    treshold,
+    value,
+    shorter_than=None,
+    taller_than=None
+):
+    """
+    Function sets the value of the objects of each column by labelling the
+    columns one by one, as delete_area and increase_object_value did before
+    set_column_runs.
+    """
+    for column in range(spectrogram.shape[1]):
+        column_slice = spectrogram[:, column:column + 1]
+        labeled_spectrogram, num_labels = ndimage.label(
+            np.where(column_slice > treshold, 1, 0)
+        )
+
+        for object in ndimage.find_objects(labeled_spectrogram):
+            height = object[0].stop - object[0].start
+
+            if shorter_than is not None and not height < shorter_than:
+                continue
+
+            if taller_than is not None and not height > taller_than:
+                continue
+
+            column_slice[object] = value
+
+
+def filter_by_percentile_loop(spectrogram, percentile, value=0.001):
+    """
+    Function filters the columns one by one, as filter_by_percentile did
+    before filter_columns_by_percentile.
+    """
+    for column in spectrogram.T:
+        column_percentile = np.percentile(column, percentile)
+        column[column < column_percentile] = value
+
+
+def get_runs_spectrogram(seed):
+    """
+    Function generates a spectrogram with runs of every height, an all-zero
+    column, runs touching the first and the last row and runs exactly as
+    high as the height tresholds (12 and 30 rows).
+    """
+    rng = np.random.default_rng(seed)
+    spectrogram = rng.random((80, 60)) * (rng.random((80, 60)) > 0.3)
+    spectrogram[:, 5] = 0
+    spectrogram[:, 6] = 1
+    spectrogram[:15, 7] = 1
+    spectrogram[15:, 7] = 0
+    spectrogram[-20:, 8] = 1
+    spectrogram[:-20, 8] = 0
+
+    for column, height in ((9, 12), (10, 13), (11, 30), (12, 29)):
+        spectrogram[:, column] = 0
+        spectrogram[20:20 + height, column] = 1
+
+    return spectrogram
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+@pytest.mark.parametrize('shorter_than, taller_than', [
+    (30, None), (None, 12), (30, 12), (None, None),
+])
+def test_set_column_runs_as_the_loop(seed, shorter_than, taller_than):
+    spectrogram = get_runs_spectrogram(seed)
+    expected = spectrogram.copy()
+
+    set_column_runs(spectrogram, 0.5, 10, shorter_than, taller_than)
+    set_column_runs_loop(expected, 0.5, 10, shorter_than, taller_than)
+
+    np.testing.assert_array_equal(spectrogram, expected)
+
+
+def test_set_column_runs_of_a_binary_spectrogram():
+    rng = np.random.default_rng(3)
+    spectrogram = (rng.random((50, 40)) > 0.5).astype(float)
+    spectrogram[:, 0] = 0
+    expected = spectrogram.copy()
+
+    set_column_runs(spectrogram, 0, 0.0000001, shorter_than=3)
+    set_column_runs_loop(expected, 0, 0.0000001, shorter_than=3)
+
+    np.testing.assert_array_equal(spectrogram, expected)
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+@pytest.mark.parametrize('percentile', [0, 50, 95, 100])
+def test_filter_columns_by_percentile_as_the_loop(seed, percentile):
+    spectrogram = get_runs_spectrogram(seed)
+    expected = spectrogram.copy()
+
+    filter_columns_by_percentile(spectrogram, percentile)
+    filter_by_percentile_loop(expected, percentile)
+
+    np.testing.assert_array_equal(spectrogram, expected)
+
+
+def test_filter_columns_by_percentile_of_an_empty_slice():
+    spectrogram = np.zeros((80, 0))
+
+    filter_columns_by_percentile(spectrogram, 95)
+
+    assert spectrogram.shape == (80, 0)
+
+
+def get_objects_loop(spectrogram, treshold=0.01):
+    """
+    Function labels a binarized spectrogram slice, as the spectrogram did
+    for each column followed before the run table.
+    """
+    # a negative fmin can give an empty column slice, without objects
+    if not spectrogram.size:
+        return []
+
+    labeled_spectrogram, num_labels = ndimage.label(
+        np.where(spectrogram > treshold, 1, 0)
+    )
+
+    return ndimage.find_objects(labeled_spectrogram)
+
+
+def get_slice_loop(spectrogram, start, end):
+    """
+    Function takes columns of the modified spectrogram with the clamping of
+    the spectrogram slices.
+    """
+    start = max(start, 0)
+
+    if end is None:
+        end = start + 1
+
+    if end >= len(spectrogram.times):
+        end = len(spectrogram.times) - 1
+
+    return spectrogram.Pxx_modified[:, start:end]
+
+
+def trace_plane_echo_loop(
+    pxx_copy,
+    column,
+    stop_column,
+    step,
+    fmin,
+    fmax,
+    total_width
+):
+    """
+    Function follows the objects of the columns next to a potential meteor
+    by labelling each column, as get_potential_meteors did before the run
+    table.
+    """
+    no_objects = 0
+
+    while (
+        (column > stop_column if step < 0 else column < stop_column)
+        and no_objects <= 2
+        and total_width < 16
+    ):
+        column_objects = get_objects_loop(pxx_copy[fmin:fmax, column])
+
+        if len(column_objects):
+            slice_object = column_objects[0][0]
+
+            if len(column_objects) > 1:
+                fstart = 0
+                fstop = -4
+
+                for column_object in column_objects:
+                    max_gap = 0.25 * (fmax - fmin)
+
+                    if column_object[0].start > (fstop + max_gap):
+                        fstart = column_object[0].start
+
+                    fstop = column_object[0].stop
+
+                slice_object = slice(fstart, fstop, None)
+
+            no_objects += 1
+            if (
+                (slice_object.stop - slice_object.start)
+                > ((fmax - fmin) * 0.7)
+            ):
+                if no_objects > 0:
+                    no_objects -= 2
+                total_width += 1
+                fmax = fmin + slice_object.stop + 3
+                fmin += slice_object.start - 3
+        else:
+            no_objects += 1
+        column += step
+
+    return total_width
+
+
+def get_potential_meteors_loop(
+    spectrogram,
+    start=0,
+    end=None,
+    get_all=False,
+    broad_start=None,
+    broad_end=None
+):
+    """
+    Function finds the potential meteors as get_potential_meteors did before
+    the column runs and the run table: the small objects are deleted and the
+    plane echoes are followed column by column.
+    """
+    pot_meteors = []
+    n_times = len(spectrogram.times)
+
+    if get_all:
+        start = 0
+        end = n_times
+        broad_start = 0
+        broad_end = end
+
+    if start < 0:
+        start = 0
+
+    if broad_start is None:
+        broad_start = start
+
+    if broad_end is None:
+        broad_end = end
+
+    broad_spectrogram = get_slice_loop(spectrogram, broad_start, broad_end)
+    pxx_copy = spectrogram.Pxx_modified.copy()
+
+    # delete the small objects column by column, as delete_area did
+    for i in range(len(broad_spectrogram.T)):
+        column_slice = get_slice_loop(spectrogram, i + broad_start, None)
+
+        for object in get_objects_loop(column_slice):
+            height, width = column_slice[object].shape
+
+            if height < 10 / spectrogram.frequency_resolution:
+                column_slice[object] = 0.0000001
+
+    for object in get_objects_loop(get_slice_loop(spectrogram, start, end)):
+        total_width = 0
+        detection_start = max(object[1].start - 22 + start, 0)
+        detection_stop = object[1].stop + 22 + start
+        pot_meteor_height = object[0].stop - object[0].start
+        pot_meteor_width = object[1].stop - object[1].start
+        meteor = (
+            object[0],
+            slice(object[1].start + start, object[1].stop + start, None)
+        )
+
+        if detection_stop > n_times:
+            detection_stop = n_times - 1
+
+        if (
+            spectrogram.frequencies[object[0].start] < 800
+            or spectrogram.frequencies[object[0].stop] > 1400
+        ):
+            continue
+        elif pot_meteor_width < 6 and pot_meteor_height > 50:
+            pot_meteors.append(meteor)
+        elif pot_meteor_width > 1:
+            total_width = trace_plane_echo_loop(
+                pxx_copy,
+                object[1].start - 1 + start,
+                detection_start,
+                -1,
+                object[0].start - 3,
+                object[0].stop + 3,
+                total_width,
+            )
+            total_width = trace_plane_echo_loop(
+                pxx_copy,
+                object[1].stop + 1 + start,
+                detection_stop,
+                1,
+                object[0].start - 3,
+                object[0].stop + 3,
+                total_width,
+            )
+
+            if total_width < 16:
+                pot_meteors.append(meteor)
+
+    return pot_meteors
+
+
+def get_echoes_spectrogram(seed, frequency_band=None):
+    """
+    Function generates a spectrogram of 30 s whose modified spectrogram has
+    short meteors, plane echoes (long drifting bands, some of them dashed)
+    and noise, some of them at the first and the last column and, with a
+    frequency band, at the first rows.
+    """
+    rng = np.random.default_rng(seed)
+    spectrogram = Spectrogram(
+        rng.normal(0, 1, 30 * 5512),
+        nfft=1024,
+        noverlap=512,
+        frequency_band=frequency_band,
+    )
+    n_rows, n_columns = spectrogram.Pxx_modified.shape
+    first_row = int(np.searchsorted(spectrogram.frequencies, 800))
+    last_row = int(np.searchsorted(spectrogram.frequencies, 1400)) - 1
+    Pxx = rng.random((n_rows, n_columns)) * 0.012
+
+    for i in range(40):
+        width = int(rng.integers(1, 8))
+        height = int(rng.integers(5, 90))
+        row = int(rng.integers(first_row, last_row - 5))
+        column = int(rng.choice([0, n_columns - width, rng.integers(
+            0, n_columns - width
+        )]))
+        Pxx[row:row + height, column:column + width] = 0.5
+
+    for i in range(8):
+        length = int(rng.integers(10, 60))
+        height = int(rng.integers(4, 40))
+        row = float(rng.integers(first_row, last_row - 40))
+        column = int(rng.integers(-10, n_columns - 10))
+        drift = rng.normal(0, 0.5)
+        gap = int(rng.integers(0, 4))
+
+        for offset in range(length):
+            if gap and offset % (gap + 2) == 0:
+                continue
+
+            if 0 <= column + offset < n_columns:
+                band_row = min(max(int(row), 0), n_rows - 1)
+                Pxx[band_row:band_row + height, column + offset] = 0.5
+            row += drift
+
+    # the objects never reach the last row (its frequency is looked up)
+    Pxx[-1] = 0.001
+    spectrogram.Pxx_modified = Pxx
+
+    return spectrogram
+
+
+@pytest.mark.parametrize('seed', range(6))
+@pytest.mark.parametrize('frequency_band', [None, (799, 1500)])
+def test_potential_meteors_as_the_loop(seed, frequency_band):
+    spectrogram = get_echoes_spectrogram(seed, frequency_band)
+    n_columns = len(spectrogram.times)
+    windows = [(None, None, True, None, None)] + [
+        (start, start + 20, False, start - 20, start + 40)
+        for start in (-5, 0, 30, n_columns // 2, n_columns - 25)
+    ]
+    found = 0
+
+    for start, end, get_all, broad_start, broad_end in windows:
+        expected_pxx = spectrogram.Pxx_modified.copy()
+        expected = get_potential_meteors_loop(
+            spectrogram, start or 0, end, get_all, broad_start, broad_end
+        )
+        expected_pxx, spectrogram.Pxx_modified = (
+            spectrogram.Pxx_modified, expected_pxx
+        )
+
+        meteors = spectrogram.get_potential_meteors(
+            start or 0, end, get_all, broad_start, broad_end
+        )
+
+        assert [
+            (meteor['f_slice'], meteor['t_slice']) for meteor in meteors
+        ] == expected
+        np.testing.assert_array_equal(spectrogram.Pxx_modified, expected_pxx)
+        found += len(expected)
+
+    assert found
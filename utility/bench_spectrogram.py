@@ -0,0 +1,477 @@
+import argparse
+import math
+import multiprocessing
+import numpy as np
+import os
+import resource
+import sys
+import time
+
+
+def replace_band_loop(Pxx, start_row, end_row, width=3):
+    """
+    Function replaces the rows of a frequency band block by block, as the
+    spectrogram did before it was vectorized (with the block loop bounded
+    by the number of columns). It is the reference of the regression check.
+
+    Parameters
+    ----------
+    Pxx : np.array
+        the spectrogram, modified in place
+    start_row : int
+        first row of the band
+    end_row : int
+        last row of the band
+    width : int, optional
+        number of columns of a block, by default 3
+    """
+    for row in range(start_row, end_row + 1):
+        for start_col in range(0, Pxx.shape[1], width):
+            end_col = start_col + width
+            Pxx[row, start_col:end_col] = (
+                np.mean(Pxx[start_row - 1, start_col:end_col])
+                + np.mean(Pxx[end_row + 1, start_col:end_col])
+            ) / 2
+
+
+def check_replace_band(shapes, repeat=3, seed=0):
+    """
+    Function checks the vectorized band replacement against the reference
+    loop and times both on spectrograms of the given shapes.
+
+    Parameters
+    ----------
+    shapes : list
+        (rows, columns) of the spectrograms
+    repeat : int, optional
+        number of timed runs, the best one is kept, by default 3
+    seed : int, optional
+        seed of the random generator, by default 0
+
+    Returns
+    -------
+    bool
+        True if the results are the same for every shape
+    """
+    rng = np.random.default_rng(seed)
+    all_equal = True
+
+    for rows, columns in shapes:
+        Pxx = rng.lognormal(0, 1, (rows, columns))
+        # transmitter band around 1000 Hz as found by the spectrogram
+        start_row = rows * 1000 // 2756 - 2
+        end_row = start_row + 5
+        timings = {}
+        results = {}
+
+        for name, replace in (
+            ('loop', replace_band_loop),
+            ('vectorized', spectrogram.replace_band),
+        ):
+            durations = []
+            for i in range(repeat):
+                result = Pxx.copy()
+                run_start = time.perf_counter()
+                replace(result, start_row, end_row)
+                durations.append(time.perf_counter() - run_start)
+
+            timings[name] = min(durations)
+            results[name] = result
+
+        equal = np.allclose(
+            results['loop'], results['vectorized'], rtol=1e-12, atol=0
+        )
+        all_equal &= equal
+        print(
+            f"{rows}x{columns}: loop {timings['loop'] * 1000:.2f} ms, "
+            f"vectorized {timings['vectorized'] * 1000:.3f} ms "
+            f"({timings['loop'] / timings['vectorized']:.0f}x), "
+            f"{'same result' if equal else 'DIFFERENT RESULT'}"
+        )
+
+    return all_equal
+
+
+def stable_ridge_loop(Pxx, min_row, max_row, length=50, n_columns=None):
+    """
+    Function searches the transmitter row column by column, as the
+    spectrogram did before psd.find_stable_ridge. It is the reference of
+    the regression check.
+
+    Parameters
+    ----------
+    Pxx : np.array
+        the spectrogram
+    min_row : int
+        first row of the search
+    max_row : int
+        row upto which to search (excluded)
+    length : int, optional
+        number of stable columns needed, by default 50
+    n_columns : int, optional
+        number of columns to search, by default None (all the columns)
+
+    Returns
+    -------
+    int or None
+        row of the ridge, None if there is no stable ridge
+    """
+    if n_columns is None:
+        n_columns = Pxx.shape[1]
+
+    same_index = 0
+    previous_index = 0
+    index = 0
+
+    while not same_index == length and index < n_columns:
+        max_column_index = Pxx[min_row:max_row, index].argmax()
+
+        if max_column_index in [
+            previous_index - 1, previous_index, previous_index + 1
+        ]:
+            same_index += 1
+        else:
+            same_index = 0
+            previous_index = max_column_index
+
+        index += 1
+
+    if same_index < length:
+        return None
+
+    return previous_index + min_row
+
+
+def check_stable_ridge(shapes, repeat=3, seed=0):
+    """
+    Function checks the transmitter search of psd.find_stable_ridge against
+    the reference loop and times both on spectrograms of the given shapes,
+    whose transmitter signal only becomes stable after a tenth of the
+    columns.
+
+    Parameters
+    ----------
+    shapes : list
+        (rows, columns) of the spectrograms
+    repeat : int, optional
+        number of timed runs, the best one is kept, by default 3
+    seed : int, optional
+        seed of the random generator, by default 0
+
+    Returns
+    -------
+    bool
+        True if the rows found are the same for every shape
+    """
+    from modules.psd.psd import find_stable_ridge
+
+    rng = np.random.default_rng(seed)
+    all_equal = True
+
+    for rows, columns in shapes:
+        Pxx = rng.lognormal(0, 1, (rows, columns))
+        # transmitter band of the spectrogram (900 to 1200 Hz)
+        min_row = rows * 900 // 2756
+        max_row = rows * 1200 // 2756
+        transmitter_row = rows * 1000 // 2756
+        stable = columns // 10
+        Pxx[transmitter_row, stable:] = 100
+        Pxx[transmitter_row + 1, stable::2] = 100
+        timings = {}
+        results = {}
+
+        for name, search in (
+            ('loop', stable_ridge_loop),
+            ('vectorized', find_stable_ridge),
+        ):
+            durations = []
+            for i in range(repeat):
+                run_start = time.perf_counter()
+                results[name] = search(Pxx, min_row, max_row)
+                durations.append(time.perf_counter() - run_start)
+
+            timings[name] = min(durations)
+
+        # the vectorized search also returns the first column of the ridge
+        ridge = results['vectorized']
+        equal = results['loop'] == (None if ridge is None else ridge[1])
+        all_equal &= equal
+        print(
+            f"transmitter search {rows}x{columns}: loop "
+            f"{timings['loop'] * 1000:.2f} ms, vectorized "
+            f"{timings['vectorized'] * 1000:.3f} ms "
+            f"({timings['loop'] / timings['vectorized']:.0f}x), "
+            f"{'same row' if equal else 'DIFFERENT ROW'}"
+        )
+
+    return all_equal
+
+
+def get_peak_rss():
+    """
+    Function gets the peak resident set size of the current process.
+
+    Returns
+    -------
+    float
+        peak resident set size in MB
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def generate_signal(
+    duration=300,
+    sample_frequency=5512,
+    meteor_times=(),
+    seed=0
+):
+    """
+    Function generates the audio signal of a file: noise, the transmitter
+    signal at 1000 Hz and a short decaying chirp for each meteor.
+
+    Parameters
+    ----------
+    duration : int, optional
+        duration of the signal in seconds, by default 300
+    sample_frequency : int, optional
+        sample frequency of the signal, by default 5512
+    meteor_times : tuple, optional
+        start of each meteor in seconds, by default ()
+    seed : int, optional
+        seed of the random generator, by default 0
+
+    Returns
+    -------
+    np.array
+        the audio signal
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(duration * sample_frequency) / sample_frequency
+    audio_signal = rng.normal(0, 1, len(t)) + 20 * np.sin(
+        2 * np.pi * 1000.3 * t
+    )
+
+    for meteor_time in meteor_times:
+        meteor = (t > meteor_time) & (t < meteor_time + 0.3)
+        elapsed = t[meteor] - meteor_time
+        audio_signal[meteor] += 200 * np.exp(-elapsed * 5) * np.sin(
+            2 * np.pi * (1000 + 300 * elapsed) * t[meteor]
+        )
+
+    return audio_signal
+
+
+def detect_file(
+    lean,
+    roi_margin,
+    meteor_times,
+    duration=300,
+    sample_frequency=5512
+):
+    """
+    Function runs the meteor detection of meteor_detect.get_meteor_coords on
+    a synthetic file, around each meteor, and measures the peak memory it
+    needs. It is run in its own process.
+
+    Parameters
+    ----------
+    lean : bool
+        use the lean mode of the spectrogram
+    roi_margin : float
+        seconds of signal before and after the interval the spectrogram is
+        calculated on, None for the whole file
+    meteor_times : tuple
+        start of each meteor in seconds
+    duration : int, optional
+        duration of the file in seconds, by default 300
+    sample_frequency : int, optional
+        sample frequency of the file, by default 5512
+
+    Returns
+    -------
+    dict
+        peak resident set size before and after the detection (in MB), its
+        duration and the meteors found (time, minimum and maximum frequency)
+    """
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+    from modules.meteor_detect.spectrogram import Spectrogram
+
+    kernel = np.zeros((27, 7))
+    kernel[12:15, 0] = -1.5
+    kernel[12:15, -1] = -1.5
+    kernel[0:2, 3] = 50
+    kernel[-1, 3] = 50
+    kernel[-2, 3] = 50
+
+    audio_signal = generate_signal(duration, sample_frequency, meteor_times)
+    baseline = get_peak_rss()
+    run_start = time.perf_counter()
+    meteors = []
+
+    for meteor_time in meteor_times:
+        # interval of 3 seconds around the detection, as get_interval
+        start_time = meteor_time + 0.1 - 3
+        end_time = meteor_time + 0.1 + 3
+        spectrogram = Spectrogram(
+            audio_signal,
+            sample_frequency=sample_frequency,
+            time_range=None if roi_margin is None else (
+                start_time - roi_margin, end_time + roi_margin
+            ),
+            lean=lean,
+        )
+        spectrogram_res = spectrogram.n_frames / duration
+        interval_start = math.floor(
+            start_time * spectrogram_res
+        ) - spectrogram.column_offset
+        interval_end = math.ceil(
+            end_time * spectrogram_res
+        ) - spectrogram.column_offset
+        broad_start = interval_start - 23
+        broad_end = interval_end + 23
+
+        spectrogram.filter_with_kernel(
+            start=broad_start, end=broad_end, kernel=kernel
+        )
+        spectrogram.filter_by_percentile(
+            start=broad_start, end=broad_end, percentile=95
+        )
+        spectrogram.delete_area(
+            6 / spectrogram.frequency_resolution,
+            start=broad_start,
+            end=broad_end,
+        )
+        spectrogram.filter_with_kernel(start=broad_start, end=broad_end)
+        coords = spectrogram.get_potential_meteors(
+            start=interval_start,
+            end=interval_end,
+            broad_start=broad_start,
+            broad_end=broad_end,
+        )
+        meteors += [
+            (
+                round(float(meteor['t']), 3),
+                float(meteor['f_min']),
+                float(meteor['f_max']),
+            )
+            for meteor in spectrogram.get_meteor_specs(coords)
+        ]
+        del spectrogram
+
+    return {
+        'baseline': baseline,
+        'peak': get_peak_rss(),
+        'duration': time.perf_counter() - run_start,
+        'meteors': meteors,
+    }
+
+
+def check_memory(roi_margins, meteor_times):
+    """
+    Function runs the detection of a synthetic file in the default and in
+    the lean mode of the spectrogram, each in a new process, and reports
+    their peak resident set size.
+
+    Parameters
+    ----------
+    roi_margins : list
+        margins of the region of interest, None for the whole file
+    meteor_times : tuple
+        start of each meteor in seconds
+
+    Returns
+    -------
+    bool
+        True if both modes find the same meteors (at the same frequency
+        bins)
+    """
+    context = multiprocessing.get_context('spawn')
+    all_equal = True
+
+    for roi_margin in roi_margins:
+        results = {}
+
+        for lean in (False, True):
+            with context.Pool(1) as pool:
+                results[lean] = pool.apply(
+                    detect_file, (lean, roi_margin, meteor_times)
+                )
+
+            result = results[lean]
+            region = (
+                'whole file' if roi_margin is None
+                else f'region of interest +-{roi_margin} s'
+            )
+            print(
+                f"{region}, {'lean' if lean else 'default'}: peak RSS "
+                f"{result['peak']:.0f} MB "
+                f"(+{result['peak'] - result['baseline']:.0f} MB for the "
+                f"detection), {result['duration']:.2f} s, "
+                f"{len(result['meteors'])} meteors"
+            )
+
+        equal = results[False]['meteors'] == results[True]['meteors']
+        all_equal &= equal
+        print(f"    {'same meteors' if equal else 'DIFFERENT METEORS'}")
+
+    return all_equal
+
+
+def arguments():
+    parser = argparse.ArgumentParser(
+        description="""
+            Checks the vectorized subtraction of the transmitter signal of
+            the spectrograms and the transmitter search against the loops
+            they replaced and times both on full-size (5 minutes, nfft
+            16384) and region of interest spectrograms. With --memory,
+            reports instead the peak memory of the detection of a synthetic
+            file in the default and the lean mode of the spectrogram. Exits
+            with a non-zero status if the results differ.
+        """
+    )
+    parser.add_argument(
+        '-c', '--columns',
+        type=int,
+        nargs='+',
+        default=[870, 871, 872, 105, 2],
+        help='numbers of columns of the spectrograms',
+    )
+    parser.add_argument('--rows', type=int, default=8193)
+    parser.add_argument('-r', '--repeat', type=int, default=3)
+    parser.add_argument(
+        '-m', '--memory',
+        action='store_true',
+        help="""
+            report the peak resident set size of the detection of a 5
+            minutes file, per mode of the spectrogram
+        """,
+    )
+    parser.add_argument(
+        '--meteor-times',
+        type=float,
+        nargs='+',
+        default=[100.0, 150.2, 220.7],
+        help='start in seconds of the meteors of the synthetic file',
+    )
+
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+    import modules.meteor_detect.spectrogram as spectrogram
+    args = arguments()
+
+    if args.memory:
+        sys.exit(0 if check_memory(
+            [None, 15], tuple(args.meteor_times)
+        ) else 1)
+
+    shapes = [(args.rows, columns) for columns in args.columns]
+    same_band = check_replace_band(shapes, args.repeat)
+    same_ridge = check_stable_ridge(shapes, args.repeat)
+
+    sys.exit(0 if same_band and same_ridge else 1)
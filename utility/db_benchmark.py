@@ -0,0 +1,547 @@
+import argparse
+import numpy as np
+import os
+import sys
+import time
+
+from datetime import datetime, timedelta, timezone
+
+
+# first day of the synthetic file table
+FIRST_DAY = datetime(2022, 1, 1, tzinfo=timezone.utc)
+
+
+def generate_dataset(path, n_systems, days, interval=5, seed=0):
+    """
+    Function generates a synthetic location/system/file dataset in a local
+    sqlite database (see mirror.get_connection): one file every 'interval'
+    minutes for each system, with noise and calibrator psd values (some of
+    them unknown, as for the files not calculated yet).
+
+    Parameters
+    ----------
+    path : str
+        path of the sqlite file, it is replaced if it exists
+    n_systems : int
+        number of systems, 2 antennas per location
+    days : int
+        number of days of files
+    interval : int, optional
+        duration of the files in minutes, by default 5
+    seed : int, optional
+        seed of the random generator, by default 0
+
+    Returns
+    -------
+    int
+        number of files generated
+    """
+    if os.path.isfile(path):
+        os.remove(path)
+
+    rng = np.random.default_rng(seed)
+    connection = mirror.get_connection(path)
+    n_locations = (n_systems + 1) // 2
+
+    mirror.replace_rows(
+        connection,
+        'location',
+        mirror.LOCATION_COLUMNS,
+        [
+            (
+                location_id + 1,
+                f'BE{location_id:04d}',
+                float(rng.uniform(2.5, 6.5)),
+                float(rng.uniform(49.5, 51.5)),
+            )
+            for location_id in range(n_locations)
+        ]
+    )
+    mirror.replace_rows(
+        connection,
+        'system',
+        mirror.SYSTEM_COLUMNS,
+        [
+            (sys_id + 1, sys_id // 2 + 1, sys_id % 2 + 1)
+            for sys_id in range(n_systems)
+        ]
+    )
+
+    # files are generated day by day to bound the memory
+    first = mirror.get_timestamp(FIRST_DAY)
+    slots_per_day = 1440 // interval
+    system_id = np.repeat(np.arange(1, n_systems + 1), slots_per_day)
+    slot = np.tile(np.arange(slots_per_day), n_systems)
+    n_files = 0
+
+    for day in range(days):
+        start = first + day * 86400 + slot * interval * 60
+        precise_start = start * 1000000 + rng.integers(
+            0, 1000000, len(start)
+        )
+        precise_end = precise_start + interval * 60 * 1000000
+        noise = rng.lognormal(10, 0.5, len(start))
+        calibrator = rng.lognormal(12, 0.3, len(start))
+        noise[rng.random(len(start)) < 0.02] = np.nan
+        calibrator[rng.random(len(start)) < 0.02] = np.nan
+
+        file_id = n_files + 1 + np.arange(len(start))
+        paths = [
+            f'SYS{sys_id:03d}/{date}.wav'
+            for sys_id, date in zip(system_id.tolist(), start.tolist())
+        ]
+        rows = zip(
+            file_id.tolist(),
+            system_id.tolist(),
+            start.tolist(),
+            precise_start.tolist(),
+            precise_end.tolist(),
+            paths,
+            [None if np.isnan(value) else value for value in noise.tolist()],
+            [
+                None if np.isnan(value) else value
+                for value in calibrator.tolist()
+            ],
+            [1] * len(start),
+        )
+        n_files += mirror.replace_rows(
+            connection, 'file', mirror.FILE_COLUMNS, list(rows)
+        )
+        connection.commit()
+
+    connection.close()
+
+    return n_files
+
+
+def get_statistics(durations, n_rows):
+    """
+    Function calculates the statistics of a workload.
+
+    Parameters
+    ----------
+    durations : list
+        duration of each call in seconds
+    n_rows : int
+        total number of rows read or written by the calls
+
+    Returns
+    -------
+    dict
+        number of calls, rows/s, mean and percentile latencies (ms)
+    """
+    durations = np.array(durations)
+    p50, p95, p99 = np.percentile(durations * 1000, (50, 95, 99))
+
+    return {
+        'calls': len(durations),
+        'rows_per_second': n_rows / max(durations.sum(), 1e-9),
+        'mean': durations.mean() * 1000,
+        'p50': p50,
+        'p95': p95,
+        'p99': p99,
+    }
+
+
+def time_calls(call, arguments):
+    """
+    Function times a function called with different arguments.
+
+    Parameters
+    ----------
+    call : function
+        function returning the number of rows it read or wrote
+    arguments : list
+        arguments of each call
+
+    Returns
+    -------
+    dict
+        statistics of the calls (see get_statistics)
+    """
+    durations = []
+    n_rows = 0
+
+    for argument in arguments:
+        call_start = time.perf_counter()
+        n_rows += call(argument)
+        durations.append(time.perf_counter() - call_start)
+
+    return get_statistics(durations, n_rows)
+
+
+def bench_previous_psd(
+    connection,
+    system_ids,
+    days,
+    history,
+    interval,
+    repeat,
+    rng
+):
+    """
+    Function replays the psd history query of the monitoring program
+    (file.get_previous_all_psd) for random end dates.
+
+    Parameters
+    ----------
+    connection : sqlite3.Connection
+        connection to the synthetic dataset
+    system_ids : list
+        ids of the systems to query
+    days : int
+        number of days of the dataset
+    history : int
+        number of days of history queried
+    interval : int
+        interval between the psd values in minutes
+    repeat : int
+        number of queries
+    rng : np.random.Generator
+        random generator
+
+    Returns
+    -------
+    dict
+        statistics of the queries (see get_statistics)
+    """
+    def call(end_date):
+        psd = fil.get_previous_all_psd(
+            system_ids,
+            end_date - timedelta(days=history),
+            end_date,
+            interval,
+            connection=connection,
+        )
+        return sum(len(values['start']) for values in psd.values())
+
+    return time_calls(call, [
+        FIRST_DAY + timedelta(days=float(day))
+        for day in rng.uniform(min(history, days), days, repeat)
+    ])
+
+
+def get_detection_times(days, repeat, rng):
+    """
+    Function draws random detection intervals of 6 seconds.
+
+    Parameters
+    ----------
+    days : int
+        number of days of the dataset
+    repeat : int
+        number of intervals
+    rng : np.random.Generator
+        random generator
+
+    Returns
+    -------
+    list
+        intervals as returned by meteor_detect.get_interval
+    """
+    first = mirror.get_timestamp(FIRST_DAY) * 1000000
+
+    return [
+        {
+            'start_time': first + time_offset - 3000000,
+            'occurence_time': first + time_offset,
+            'end_time': first + time_offset + 3000000,
+        }
+        for time_offset in rng.integers(
+            3000000, days * 86400000000 - 3000000, repeat
+        ).tolist()
+    ]
+
+
+def bench_file_by_interval(connection, system_ids, days, repeat, rng):
+    """
+    Function replays the file lookup of the meteor detection program
+    (file.get_file_by_interval) for random detection times.
+
+    Parameters
+    ----------
+    connection : sqlite3.Connection
+        connection to the synthetic dataset
+    system_ids : list
+        ids of the systems to query
+    days : int
+        number of days of the dataset
+    repeat : int
+        number of queries
+    rng : np.random.Generator
+        random generator
+
+    Returns
+    -------
+    dict
+        statistics of the queries (see get_statistics)
+    """
+    def call(interval):
+        files = fil.get_file_by_interval(
+            system_ids, interval, connection=connection
+        )
+        return sum(
+            len(antenna_files)
+            for location in files.values()
+            for antenna_files in location['sys'].values()
+        )
+
+    return time_calls(call, get_detection_times(days, repeat, rng))
+
+
+def bench_file_index(connection, system_ids, days, repeat, rng):
+    """
+    Function replays the batch file lookup of the meteor detection program
+    (interval_index.FileIndex) for random detection times of one day, the
+    loading of the index is included in the timing.
+
+    Parameters
+    ----------
+    connection : sqlite3.Connection
+        connection to the synthetic dataset
+    system_ids : list
+        ids of the systems to query
+    days : int
+        number of days of the dataset
+    repeat : int
+        number of detection times
+    rng : np.random.Generator
+        random generator
+
+    Returns
+    -------
+    dict
+        statistics of the batch (see get_statistics), a single call
+    """
+    intervals = get_detection_times(1, repeat, rng)
+
+    def call(intervals):
+        index = interval_index.FileIndex.load(
+            system_ids,
+            datetime.fromtimestamp(
+                intervals[0]['start_time'] // 86400000000 * 86400,
+                tz=timezone.utc
+            ),
+            datetime.fromtimestamp(
+                max(interval['end_time'] for interval in intervals)
+                / 1000000,
+                tz=timezone.utc
+            ),
+            connection=connection,
+        )
+        return sum(
+            len(indices) for indices in index.search(
+                [interval['start_time'] for interval in intervals],
+                [interval['end_time'] for interval in intervals],
+                system_ids,
+            )
+        )
+
+    return time_calls(call, [intervals])
+
+
+def bench_insert_psd(
+    connection,
+    system_ids,
+    days,
+    interval,
+    batch_size,
+    repeat,
+    rng
+):
+    """
+    Function replays the psd writes of the monitoring program
+    (file.insert_psd with the update strategy) on random files.
+
+    Parameters
+    ----------
+    connection : sqlite3.Connection
+        connection to the synthetic dataset
+    system_ids : list
+        ids of the systems to update
+    days : int
+        number of days of the dataset
+    interval : int
+        duration of the files in minutes
+    batch_size : int
+        number of psd values stored per call
+    repeat : int
+        number of calls
+    rng : np.random.Generator
+        random generator
+
+    Returns
+    -------
+    dict
+        statistics of the writes (see get_statistics)
+    """
+    n_slots = days * 1440 // interval
+
+    def call(batch):
+        fil.insert_psd(batch, verbose=False, connection=connection)
+        return len(batch)
+
+    batches = []
+    for i in range(repeat):
+        slots = rng.integers(0, n_slots, batch_size)
+        batches.append([
+            {
+                'system_id': int(sys_id),
+                'time': (
+                    FIRST_DAY + timedelta(minutes=int(slot) * interval)
+                ).strftime('%Y-%m-%d %H:%M'),
+                'noise_psd': float(noise),
+                'calibrator_psd': float(calibrator),
+                'psd_version': 1,
+            }
+            for sys_id, slot, noise, calibrator in zip(
+                rng.choice(system_ids, batch_size),
+                slots,
+                rng.lognormal(10, 0.5, batch_size),
+                rng.lognormal(12, 0.3, batch_size),
+            )
+        ])
+
+    return time_calls(call, batches)
+
+
+def print_statistics(name, statistics):
+    print(
+        f"{name:<40} {statistics['calls']:>6} "
+        f"{statistics['rows_per_second']:>12.0f} "
+        f"{statistics['mean']:>9.2f} {statistics['p50']:>9.2f} "
+        f"{statistics['p95']:>9.2f} {statistics['p99']:>9.2f}"
+    )
+
+
+def main(args):
+    rng = np.random.default_rng(args.seed)
+
+    if args.generate or not os.path.isfile(args.path):
+        generate_start = time.perf_counter()
+        n_files = generate_dataset(
+            args.path, args.systems, args.days, args.interval, args.seed
+        )
+        print(
+            f'Generated {n_files} files in '
+            f'{time.perf_counter() - generate_start:.1f} s'
+        )
+
+    connection = mirror.get_connection(args.path)
+    all_systems = [
+        sys_id for (sys_id,) in connection.execute("SELECT id FROM system")
+    ]
+    days = connection.execute(
+        "SELECT (MAX(start) - MIN(start)) / 86400 + 1 FROM file"
+    ).fetchone()[0]
+
+    print(
+        f"{'workload':<40} {'calls':>6} {'rows/s':>12} {'mean ms':>9} "
+        f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+    )
+
+    # scaling of the psd history query with the history length and the
+    # number of systems
+    for history in args.histories:
+        for n_systems in args.system_counts:
+            system_ids = all_systems[:n_systems]
+            print_statistics(
+                f'previous psd {history}d {len(system_ids)} systems',
+                bench_previous_psd(
+                    connection,
+                    system_ids,
+                    days,
+                    history,
+                    args.psd_interval,
+                    args.repeat,
+                    rng,
+                )
+            )
+
+    for n_systems in args.system_counts:
+        system_ids = all_systems[:n_systems]
+        print_statistics(
+            f'file by interval {len(system_ids)} systems',
+            bench_file_by_interval(
+                connection, system_ids, days, args.repeat, rng
+            )
+        )
+        print_statistics(
+            f'file index {args.repeat} times {len(system_ids)} systems',
+            bench_file_index(connection, system_ids, days, args.repeat, rng)
+        )
+
+    print_statistics(
+        f'insert psd {args.write_batch} values',
+        bench_insert_psd(
+            connection,
+            all_systems,
+            days,
+            args.interval,
+            args.write_batch,
+            args.repeat,
+            rng,
+        )
+    )
+
+    connection.close()
+
+
+def arguments():
+    parser = argparse.ArgumentParser(
+        description="""
+            Generates a synthetic location/system/file dataset in a local
+            sqlite database and replays the queries and the writes of the
+            monitoring and meteor detection programs on it, reporting the
+            throughput and the latency percentiles of each workload and
+            how they scale with the history length and the number of
+            systems.
+        """
+    )
+    parser.add_argument('-p', '--path', default='db_benchmark.db')
+    parser.add_argument(
+        '-g', '--generate',
+        action='store_true',
+        help='generate the dataset even if the database exists',
+    )
+    parser.add_argument('-s', '--systems', type=int, default=40)
+    parser.add_argument('-d', '--days', type=int, default=60)
+    parser.add_argument(
+        '-i', '--interval',
+        type=int,
+        default=5,
+        help='duration of the files in minutes, by default 5',
+    )
+    parser.add_argument(
+        '--psd-interval',
+        type=int,
+        default=60,
+        help='interval of the psd history queries in minutes',
+    )
+    parser.add_argument(
+        '--histories',
+        type=int,
+        nargs='+',
+        default=[1, 7, 30],
+        help='history lengths (days) of the psd history queries',
+    )
+    parser.add_argument(
+        '--system-counts',
+        type=int,
+        nargs='+',
+        default=[5, 20, 40],
+        help='numbers of systems queried',
+    )
+    parser.add_argument('-r', '--repeat', type=int, default=20)
+    parser.add_argument('-w', '--write-batch', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+    import modules.database.file as fil
+    import modules.database.interval_index as interval_index
+    import modules.database.mirror as mirror
+    main(arguments())
@@ -0,0 +1,129 @@
+import argparse
+import os
+import subprocess
+import sys
+
+
+# import time budgets in seconds, measured with a warm disk cache on the
+# monitoring server (monitoring: 0.17s, meteor_detect: 1.1s) plus a margin.
+# meteor_detect still needs scipy.signal to build its spectrograms.
+BUDGETS = {
+    'monitoring': 0.5,
+    'meteor_detect': 1.5,
+}
+
+
+def get_import_time(module, python=sys.executable):
+    """
+    Function measures the cumulative import time of a module with the
+    -X importtime option of the python interpreter.
+
+    Parameters
+    ----------
+    module : str
+        name of the module to import
+    python : str, optional
+        python interpreter to use, by default the current one
+
+    Returns
+    -------
+    tuple
+        cumulative import time of the module in seconds and the 10 slowest
+        imported modules as (seconds, name) tuples
+    """
+    root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+    process = subprocess.run(
+        [python, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=root,
+        stderr=subprocess.PIPE,
+        stdout=subprocess.DEVNULL,
+        universal_newlines=True,
+        check=True,
+    )
+
+    # lines have the form 'import time: self [us] | cumulative | name'
+    times = []
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+
+        fields = line[len('import time:'):].split('|')
+
+        try:
+            cumulative = int(fields[1]) / 1e6
+        except ValueError:
+            # header line
+            continue
+
+        times.append((cumulative, fields[2].strip()))
+
+    total = next(
+        cumulative for cumulative, name in reversed(times) if name == module
+    )
+    slowest = sorted(
+        (time for time in times if time[1] != module), reverse=True
+    )[:10]
+
+    return total, slowest
+
+
+def check_import_times(modules, verbose=False):
+    """
+    Function checks the import time of each module against its budget.
+
+    Parameters
+    ----------
+    modules : list
+        names of the modules to check
+    verbose : bool, optional
+        print the slowest imports of each module, by default False
+
+    Returns
+    -------
+    bool
+        True if every module is imported within its budget
+    """
+    within_budget = True
+
+    for module in modules:
+        total, slowest = get_import_time(module)
+        budget = BUDGETS[module]
+        status = 'ok' if total <= budget else 'OVER BUDGET'
+        print(f'{module}: {total:.3f}s (budget {budget:.3f}s) {status}')
+
+        if verbose:
+            for cumulative, name in slowest:
+                print(f'    {cumulative:.3f}s {name}')
+
+        within_budget &= total <= budget
+
+    return within_budget
+
+
+def arguments():
+    parser = argparse.ArgumentParser(
+        description="""
+            Measures the import time of the entry point modules and exits
+            with a non-zero status if one of them exceeds its budget.
+        """
+    )
+    parser.add_argument(
+        'modules',
+        metavar='MODULES',
+        nargs='*',
+        help=f"modules to check, by default {', '.join(BUDGETS)}",
+    )
+    parser.add_argument('-v', '--verbose', action='store_true')
+
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = arguments()
+    unknown = [module for module in args.modules if module not in BUDGETS]
+    if unknown:
+        sys.exit(f"no import budget for {', '.join(unknown)}")
+
+    sys.exit(0 if check_import_times(
+        args.modules or list(BUDGETS), args.verbose
+    ) else 1)
@@ -0,0 +1,60 @@
+import argparse
+import os
+import sys
+
+
+def run_migrations(args):
+    pending = migrate.apply_migrations(dry_run=args.dry_run)
+
+    if not pending:
+        print('The database is up to date.')
+    elif args.dry_run:
+        print(f"Pending migrations: {', '.join(pending)}")
+
+    if not args.explain:
+        return True
+
+    # check the read queries use their index
+    all_indexed = True
+    for name, (indexed, plan) in migrate.check_indexes().items():
+        print(f"{name}: {'index used' if indexed else 'NOT INDEXED'}")
+
+        for row in plan:
+            print(
+                f"    table {row.get('table')}, type {row.get('type')}, "
+                f"key {row.get('key')}, rows {row.get('rows')}"
+            )
+
+        all_indexed &= indexed
+
+    return all_indexed
+
+
+def arguments():
+    parser = argparse.ArgumentParser(
+        description="""
+            Applies the migration scripts of modules/database/migrations
+            that were not applied yet to the database.
+        """
+    )
+    parser.add_argument(
+        '-n', '--dry-run',
+        action='store_true',
+        help='only list the pending migrations',
+    )
+    parser.add_argument(
+        '-e', '--explain',
+        action='store_true',
+        help="""
+            check with EXPLAIN that the psd history and the file interval
+            queries use their index, exits with a non-zero status if not
+        """,
+    )
+
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+    import modules.database.migrate as migrate
+    sys.exit(0 if run_migrations(arguments()) else 1)
@@ -0,0 +1,72 @@
+import argparse
+import os
+import sys
+import matplotlib.pyplot as plt
+
+from datetime import datetime, timezone
+
+
+def plot_rollup(args):
+    system_ids = [int(sys_id) for sys_id in args.system_ids]
+    rollups = rollup.get_rollups(
+        system_ids,
+        args.granularity,
+        datetime.strptime(args.start_date, '%Y-%m-%d')
+        .replace(tzinfo=timezone.utc),
+        datetime.strptime(args.end_date, '%Y-%m-%d')
+        .replace(tzinfo=timezone.utc),
+        args.rollup,
+    )
+
+    for sys_id in system_ids:
+        for kind in ('noise', 'calibrator'):
+            values = rollups[sys_id]
+            plt.figure(figsize=(16, 9))
+            # median with the interquartile range and the extrema around it
+            plt.fill_between(
+                values['bucket'],
+                values[f'{kind}_min'],
+                values[f'{kind}_max'],
+                alpha=0.15,
+            )
+            plt.fill_between(
+                values['bucket'],
+                values[f'{kind}_p25'],
+                values[f'{kind}_p75'],
+                alpha=0.4,
+            )
+            plt.plot(values['bucket'], values[f'{kind}_median'])
+            plt.title(f'system {sys_id} {kind} ({args.granularity})')
+            plt.ylabel('ADU²/Hz')
+            plt.savefig(
+                f'{sys_id}_{args.start_date}_{args.end_date}_'
+                f'{args.granularity}_{kind}.png'
+            )
+            plt.close()
+
+
+def arguments():
+    parser = argparse.ArgumentParser(
+        description="""
+            Plots the noise and calibrator psd rollups stored by the
+            monitoring program, this is much faster than plotting each psd
+            value for long periods.
+        """
+    )
+    parser.add_argument('start_date', metavar='START DATE')
+    parser.add_argument('end_date', metavar='END DATE')
+    parser.add_argument('system_ids', metavar='SYSTEM IDS', nargs='+')
+    parser.add_argument(
+        '-g', '--granularity',
+        choices=['hour', 'day', 'week'],
+        default='day',
+    )
+    parser.add_argument('-r', '--rollup', default='psd_rollup.db')
+
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+    import modules.psd.rollup as rollup
+    plot_rollup(arguments())
@@ -0,0 +1,62 @@
+import argparse
+import os
+import sys
+
+from datetime import datetime, timezone
+
+
+def sync_mirror(args):
+    counts = mirror.sync(
+        args.mirror,
+        datetime.strptime(args.start_date, '%Y-%m-%d')
+        .replace(tzinfo=timezone.utc) if args.start_date else None,
+        datetime.strptime(args.end_date, '%Y-%m-%d')
+        .replace(tzinfo=timezone.utc) if args.end_date else None,
+        args.refresh_days,
+        args.batch_size,
+    )
+
+    print(
+        f"Mirrored {counts['locations']} locations, {counts['systems']} "
+        f"systems, {counts['new_files']} new files and refreshed "
+        f"{counts['refreshed_files']} files in {counts['duration']:.2f} s"
+    )
+
+
+def arguments():
+    parser = argparse.ArgumentParser(
+        description="""
+            Synchronises the local sqlite mirror of the system, location and
+            file tables with the database. The mirror can then be used by
+            the read functions of the database modules (DB_BACKEND=sqlite
+            or the --mirror option of meteor_detect.py).
+        """
+    )
+    parser.add_argument(
+        '-m', '--mirror',
+        default=os.getenv('MIRROR_PATH', 'brams_mirror.db'),
+        help='path of the mirror, by default brams_mirror.db',
+    )
+    parser.add_argument(
+        '-s', '--start-date',
+        help='only mirror the files from this date (YYYY-MM-DD)',
+    )
+    parser.add_argument(
+        '-e', '--end-date',
+        help='only mirror the files before this date (YYYY-MM-DD)',
+    )
+    parser.add_argument(
+        '--refresh-days',
+        type=int,
+        default=2,
+        help='days of files copied again to update their psd values',
+    )
+    parser.add_argument('--batch-size', type=int, default=10000)
+
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+    import modules.database.mirror as mirror
+    sync_mirror(arguments())